@@ -2,6 +2,7 @@ export declare class OrchestraHandler {
     private scriptsDir;
     private orchestraDir;
     private templateDir;
+    private registryFile;
     constructor();
     runScript(args: any): Promise<{
         content: {
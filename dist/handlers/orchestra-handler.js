@@ -1,18 +1,23 @@
 import * as fs from 'fs-extra';
 import * as path from 'path';
+import * as os from 'os';
 import { fileURLToPath } from 'url';
-import { exec, spawn } from 'child_process';
+import { exec, execFile, spawn } from 'child_process';
 import { promisify } from 'util';
 const execAsync = promisify(exec);
+const execFileAsync = promisify(execFile);
 export class OrchestraHandler {
     scriptsDir;
     orchestraDir;
     templateDir;
+    registryFile;
     constructor() {
         const __dirname = path.dirname(fileURLToPath(import.meta.url));
         this.templateDir = path.join(__dirname, '../templates');
         this.scriptsDir = path.join(__dirname, '../scripts');
         this.orchestraDir = path.join(this.templateDir, 'orchestra');
+        // Shared with the Python scripts (instance_registry.py), which keep it fresh
+        this.registryFile = path.join(os.homedir(), '.config', 'nvim', 'orchestra', 'instances.json');
     }
     async runScript(args) {
         const { scriptName, args: scriptArgs = [], async = false } = args;
@@ -303,8 +308,15 @@ export class OrchestraHandler {
     // Additional utility methods for advanced orchestra features
     async getActiveInstances() {
         try {
-            // This would typically query active nvim instances
-            // For now, we'll simulate by checking state
+            // The registry is written atomically (rename), so a plain read never
+            // sees a partial file and needs no lock
+            if (await fs.pathExists(this.registryFile)) {
+                const registry = await fs.readJson(this.registryFile);
+                const instances = Object.values(registry.instances || {});
+                if (instances.length > 0) {
+                    return instances.sort((a, b) => String(a.name).localeCompare(String(b.name)));
+                }
+            }
             const status = await this.getOrchestraStatus();
             return status.state.activeInstances || [];
         }
@@ -318,11 +330,12 @@ export class OrchestraHandler {
             if (!await fs.pathExists(claudeScript)) {
                 throw new Error('Claude integration script not found');
             }
-            const args = [command];
+            // An argv array, not a shell string, so the JSON context arrives intact
+            const args = [claudeScript, ...command.split(/\s+/).filter(Boolean)];
             if (context) {
                 args.push('--context', JSON.stringify(context));
             }
-            const { stdout, stderr } = await execAsync(`python3 "${claudeScript}" ${args.join(' ')}`);
+            const { stdout, stderr } = await execFileAsync('python3', args);
             return {
                 command,
                 result: stdout || 'Claude integration executed',
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Block-wise buffer fingerprints for skipping no-op syncs
+
+Buffers are split into fixed-size line blocks and each block is hashed inside
+Neovim (orchestra_helpers.lua), so comparing two instances only moves a list of hashes over RPC.
+Syncs whose fingerprints match are skipped; otherwise only the differing
+blocks are fetched from the source and written to the target.
+"""
+
+import hashlib
+from typing import Dict, List, Tuple
+from orchestra_lua import helper_call
+
+BLOCK_SIZE = 64
+
+def block_hashes(lines: List[str], size: int = BLOCK_SIZE) -> List[str]:
+    """Hash lines exactly the way OrchestraHelpers.block_hashes does inside Neovim"""
+    return [
+        hashlib.sha256(('\n'.join(lines[i:i + size]) + '\n')
+                       .encode('utf-8', 'surrogateescape')).hexdigest()
+        for i in range(0, len(lines), size)
+    ]
+
+
+class Fingerprint:
+    """Block hashes of one buffer at a given changedtick"""
+
+    __slots__ = ('bufnr', 'tick', 'count', 'hashes')
+
+    def __init__(self, bufnr: int, tick: int, count: int, hashes: List[str]):
+        self.bufnr = bufnr
+        self.tick = tick
+        self.count = count
+        self.hashes = hashes
+
+    def __eq__(self, other):
+        return self.count == other.count and self.hashes == other.hashes
+
+
+# Unknown target content (e.g. a freshly created buffer): replace everything
+UNKNOWN = Fingerprint(0, -1, -1, [])
+
+
+class FingerprintCache:
+    """Per-(instance, buffer) fingerprints, refreshed only when changedtick moves"""
+
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self.entries: Dict[Tuple[str, int], Fingerprint] = {}
+
+    def args(self, instance: str, buf=0) -> Tuple:
+        """Arguments for the block_hashes helper; buffer 0 is the current buffer"""
+        bufnr = getattr(buf, 'id', buf)
+        if bufnr:
+            fp = self.entries.get((instance, bufnr))
+            known = {} if fp is None else {str(bufnr): fp.tick}
+        else:
+            # Which buffer is current is only known inside Neovim
+            known = {str(n): fp.tick for (inst, n), fp in self.entries.items() if inst == instance}
+        return (bufnr, self.block_size, known)
+
+    def request(self, instance: str, buf=0) -> Tuple:
+        """RPC call (method, *args) that fingerprints a buffer, for pipelines"""
+        return helper_call('block_hashes', *self.args(instance, buf))
+
+    def update(self, instance: str, result) -> Fingerprint:
+        """Record the reply to request() and return the buffer's fingerprint"""
+        bufnr, tick, count, hashes = result
+        if hashes is None:
+            fp = self.entries[(instance, bufnr)]
+            fp.count = count
+            return fp
+        fp = Fingerprint(bufnr, tick, count, hashes)
+        self.entries[(instance, bufnr)] = fp
+        return fp
+
+    def store(self, instance: str, bufnr: int, tick: int, source: Fingerprint):
+        """Remember that a buffer now holds the same content as `source`"""
+        self.entries[(instance, bufnr)] = Fingerprint(bufnr, tick, source.count,
+                                                      list(source.hashes))
+
+    def forget(self, instance: str):
+        """Drop every fingerprint of an instance, e.g. after it disconnects"""
+        for key in [k for k in self.entries if k[0] == instance]:
+            del self.entries[key]
+
+
+def plan_edits(source: Fingerprint, target: Fingerprint,
+               size: int = BLOCK_SIZE) -> List[Tuple[int, int, int, int]]:
+    """Return (target_start, target_end, source_start, source_end) line ranges to copy
+
+    Blocks that are full on both sides are replaced in place, which never
+    shifts line numbers. Everything from the first possibly-partial block to
+    the end of the buffer is replaced as one tail edit. Adjacent differing
+    blocks are merged so each range costs one get and one set call.
+    """
+    if source == target:
+        return []
+
+    ns, nt = len(source.hashes), len(target.hashes)
+    tail = max(min(ns, nt) - 1, 0)
+    edits: List[Tuple[int, int, int, int]] = []
+    for i in range(tail):
+        if source.hashes[i] != target.hashes[i]:
+            start, end = i * size, (i + 1) * size
+            if edits and edits[-1][1] == start:
+                edits[-1] = (edits[-1][0], end, edits[-1][2], end)
+            else:
+                edits.append((start, end, start, end))
+
+    if ns != nt or source.count != target.count or source.hashes[tail:] != target.hashes[tail:]:
+        start = tail * size
+        if edits and edits[-1][1] == start:
+            start = edits.pop()[0]
+        edits.append((start, target.count, start, source.count))
+    return edits
+
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""Convergent concurrent editing of one buffer across Neovim instances
+
+Each shared buffer is a line-level RGA (replicated growable array): every
+line has a unique (lamport, site) id and an insert names the line it follows,
+so inserts from different instances never overwrite each other and
+deletions are tombstones. Instances report their own edits through
+nvim_buf_attach line events; the session turns them into operations on the
+shared document and ships only those operations to the other instances.
+
+Remote operations are applied inside Neovim only if the buffer is still at
+the changedtick they were computed against. If the user typed in between,
+the apply is refused and retried once that edit has been merged, so an
+instance never receives line numbers for a state it no longer has. Changing a
+line is a delete plus an insert, so two agents editing the same line keep
+both versions instead of one silently clobbering the other.
+"""
+
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from nvim_rpc import RpcError
+
+# The shared buffer in this instance (its current one when unnamed), with
+# the changedtick its lines correspond to
+SNAPSHOT_LUA = """
+local name = ...
+local buf = vim.api.nvim_get_current_buf()
+if name ~= '' then
+  buf = vim.fn.bufadd(name)
+  vim.fn.bufload(buf)
+  vim.bo[buf].buflisted = true
+end
+return {buf, vim.api.nvim_buf_get_changedtick(buf), vim.api.nvim_buf_get_name(buf),
+        vim.api.nvim_buf_get_lines(buf, 0, -1, false)}
+"""
+
+# Apply line edits only if nobody changed the buffer since `tick`
+APPLY_LUA = """
+local buf, tick, edits = ...
+if vim.api.nvim_buf_get_changedtick(buf) ~= tick then
+  return vim.NIL
+end
+for _, e in ipairs(edits) do
+  vim.api.nvim_buf_set_lines(buf, e[1], e[2], false, e[3])
+end
+return vim.api.nvim_buf_get_changedtick(buf)
+"""
+
+Id = Tuple[int, str]   # (lamport clock, site)
+
+
+class Line:
+    __slots__ = ('id', 'text', 'deleted')
+
+    def __init__(self, id: Id, text: str):
+        self.id = id
+        self.text = text
+        self.deleted = False
+
+
+class LineRGA:
+    """Sequence CRDT over lines"""
+
+    def __init__(self):
+        self.lines: List[Line] = []
+        self.by_id: Dict[Id, Line] = {}
+        self.positions: Dict[Id, int] = {}    # id -> index in lines, rebuilt when found stale
+        self.clock = 0
+
+    def next_id(self, site: str) -> Id:
+        self.clock += 1
+        return (self.clock, site)
+
+    def position(self, id: Id) -> int:
+        i = self.positions.get(id)
+        if i is None or i >= len(self.lines) or self.lines[i].id != id:
+            # Inserts shift everything after them; one pass fixes every entry
+            self.positions = {line.id: i for i, line in enumerate(self.lines)}
+            i = self.positions[id]
+        return i
+
+    def insert(self, after: Optional[Id], id: Id, text: str):
+        """Insert after `after` (None: at the start), ordering concurrent siblings by id"""
+        if id in self.by_id:
+            return
+        self.clock = max(self.clock, id[0])
+        i = 0 if after is None else self.position(after) + 1
+        while i < len(self.lines) and self.lines[i].id > id:
+            i += 1
+        line = Line(id, text)
+        self.lines.insert(i, line)
+        self.by_id[id] = line
+
+    def insert_run(self, after: Optional[Id], site: str, texts: Iterable[str]) -> List[Id]:
+        """Insert new lines from `site` one after another following `after`; returns their ids"""
+        i = 0 if after is None else self.position(after) + 1
+        # Fresh ids are newer than every line in the document, so no sibling is skipped
+        lines = [Line(self.next_id(site), text) for text in texts]
+        self.lines[i:i] = lines
+        for line in lines:
+            self.by_id[line.id] = line
+        return [line.id for line in lines]
+
+    def delete(self, id: Id) -> bool:
+        line = self.by_id.get(id)
+        if line is None or line.deleted:
+            return False
+        line.deleted = True
+        return True
+
+    def text(self) -> List[str]:
+        return [line.text for line in self.lines if not line.deleted]
+
+
+class Replica:
+    """One instance's buffer and which document lines it currently shows"""
+
+    def __init__(self, name: str, client):
+        self.name = name
+        self.client = client
+        self.buf = None
+        self.tick = -1
+        self.view: List[Id] = []     # ids of the buffer's lines, in buffer order
+        self.outbox: List[tuple] = []
+        self.synced = False          # has received its initial copy
+        self.flushing = False
+        self.held = None             # events that arrived while an apply was in flight
+        self.refused = 0
+
+
+class CollabSession:
+    """Keeps one buffer convergent across several instances"""
+
+    def __init__(self):
+        self.doc = LineRGA()
+        self.replicas: Dict[str, Replica] = {}
+        self.name = ''
+        self.ops_in = self.ops_out = self.lines_sent = 0
+        self.tasks = set()
+
+    async def attach(self, replica: Replica):
+        """Subscribe to the instance's buffer; returns (buffer name, lines)"""
+        client = replica.client
+        client.on_notification('nvim_buf_lines_event', lambda args, r=replica: self.on_lines(r, args))
+        client.on_notification('nvim_buf_changedtick_event', lambda args, r=replica: self.on_tick(r, args))
+        client.on_notification('nvim_buf_detach_event', lambda args, r=replica: self.on_detach(r, args))
+        buf = (await client.request('nvim_exec_lua', SNAPSHOT_LUA, [self.name]))[0]
+        # Attach, then snapshot: events up to the snapshot's tick are ignored
+        _, snapshot = await client.pipeline([
+            ('nvim_buf_attach', buf, False, {}),
+            ('nvim_exec_lua', SNAPSHOT_LUA, [self.name]),
+        ])
+        buf, tick, name, lines = snapshot
+        replica.buf = getattr(buf, 'id', buf)
+        replica.tick = tick
+        return name, lines
+
+    async def start(self, source: str, targets: List[str], clients: Dict[str, object]):
+        """Seed the document from source's current buffer and bring targets in line"""
+        origin = Replica(source, clients[source])
+        self.name, lines = await self.attach(origin)
+        origin.view = self.doc.insert_run(None, source, lines)
+        origin.synced = True
+        self.replicas[source] = origin
+
+        async def join(target):
+            replica = Replica(target, clients[target])
+            # One full copy to start from; everything after is operations
+            replica.outbox = [('reset',)]
+            self.replicas[target] = replica
+            await self.attach(replica)
+            await self.flush(replica)
+
+        await asyncio.gather(*[join(t) for t in targets if t != source])
+
+    def on_lines(self, replica: Replica, args):
+        buf, tick, first, last, data = args[:5]
+        if getattr(buf, 'id', buf) != replica.buf or replica.name not in self.replicas:
+            return
+        if replica.held is not None:
+            replica.held.append((self.on_lines, args))
+            return
+        if tick is not None and tick <= replica.tick:
+            return   # our own apply echoing back, or already in the snapshot
+        if tick is not None:
+            replica.tick = tick
+        if not replica.synced:
+            self.schedule(replica)   # the pending copy overwrites this edit anyway
+            return
+
+        ops = []
+        for id in replica.view[first:last]:
+            if self.doc.delete(id):
+                ops.append(('del', id))
+        previous = replica.view[first - 1] if first > 0 else None
+        inserted = self.doc.insert_run(previous, replica.name, data)
+        ops.extend(('ins', id) for id in inserted)
+        replica.view[first:last] = inserted
+        self.ops_in += len(ops)
+
+        for other in self.replicas.values():
+            if other is not replica and ops:
+                other.outbox.extend(ops)
+                self.schedule(other)
+            elif other is replica and other.outbox:
+                # Its pending apply was refused because of this edit; retry now
+                self.schedule(other)
+
+    def on_tick(self, replica: Replica, args):
+        buf, tick = args[:2]
+        if replica.held is not None:
+            replica.held.append((self.on_tick, args))
+        elif getattr(buf, 'id', buf) == replica.buf and tick > replica.tick:
+            replica.tick = tick
+            if replica.outbox:
+                self.schedule(replica)
+
+    def on_detach(self, replica: Replica, args):
+        if getattr(args[0], 'id', args[0]) == replica.buf:
+            self.replicas.pop(replica.name, None)
+            print(f"- {replica.name} left the collaboration session")
+
+    def schedule(self, replica: Replica):
+        task = asyncio.ensure_future(self.flush(replica))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def plan(self, replica: Replica):
+        """Turn queued operations into nvim_buf_set_lines edits and the view they produce
+
+        A view is always a subsequence of the document in document order, so
+        the new view is the old one minus deleted ids plus inserted ones, and
+        one walk over the document turns the difference into edits (top to
+        bottom, each in the coordinates left by the previous one).
+
+        Both walks cover the whole document, tombstones included, so a flush
+        costs O(document) CPU however small the change (a few milliseconds per
+        10k lines), which bounds how often a large buffer can be flushed.
+        """
+        old = set(replica.view)
+        new = set(old)
+        for op in replica.outbox:
+            if op[0] == 'reset':
+                old = None
+                new = {line.id for line in self.doc.lines if not line.deleted}
+            elif op[0] == 'del':
+                new.discard(op[1])
+            elif not self.doc.by_id[op[1]].deleted:
+                new.add(op[1])
+
+        view = [line.id for line in self.doc.lines if line.id in new]
+        if old is None:
+            return [(0, -1, [self.doc.by_id[id].text for id in view])], view
+
+        edits = []
+        cursor = start = removed = 0
+        added: List[str] = []
+        for line in self.doc.lines:
+            was, now = line.id in old, line.id in new
+            if was and now:
+                if removed or added:
+                    edits.append((start, start + removed, added))
+                    cursor = start + len(added)
+                    removed, added = 0, []
+                cursor += 1
+            elif was or now:
+                if not (removed or added):
+                    start = cursor
+                if was:
+                    removed += 1
+                else:
+                    added.append(line.text)
+        if removed or added:
+            edits.append((start, start + removed, added))
+        return edits, view
+
+    async def flush(self, replica: Replica):
+        """Apply queued operations unless the instance moved on; then retry after its edit"""
+        if replica.flushing:
+            return
+        replica.flushing = True
+        try:
+            while replica.outbox and replica.buf is not None and replica.name in self.replicas:
+                pending = len(replica.outbox)
+                edits, view = self.plan(replica)
+                if not edits:
+                    del replica.outbox[:pending]
+                    break
+                tick = replica.tick
+                # Our own line events arrive before the response; hold them until
+                # the response says which ticks were ours
+                replica.held = []
+                try:
+                    result = await replica.client.request(
+                        'nvim_exec_lua', APPLY_LUA, [replica.buf, tick, [list(e) for e in edits]])
+                finally:
+                    held, replica.held = replica.held, None
+                if result is None:
+                    replica.refused += 1
+                else:
+                    replica.view = view
+                    replica.tick = result
+                    replica.synced = True
+                    del replica.outbox[:pending]
+                    self.ops_out += pending
+                    self.lines_sent += sum(len(lines) for _, _, lines in edits)
+                for handler, args in held:
+                    handler(replica, args)
+                if result is None and replica.tick == tick:
+                    break   # its edit has not arrived yet; on_lines retries
+        except (ConnectionError, OSError, RpcError) as e:
+            print(f"✗ {replica.name}: {e}")
+            self.replicas.pop(replica.name, None)
+        finally:
+            replica.flushing = False
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*[
+            r.client.request('nvim_buf_detach', r.buf) for r in self.replicas.values()
+        ], return_exceptions=True)
+        self.replicas.clear()
+
+    def status(self) -> Dict:
+        return {
+            'buffer': self.name or '[current]',
+            'lines': len(self.doc.text()),
+            'instances': {name: {'tick': r.tick, 'pending': len(r.outbox), 'refused': r.refused}
+                          for name, r in self.replicas.items()},
+            'ops_in': self.ops_in, 'ops_out': self.ops_out, 'lines_sent': self.lines_sent,
+        }
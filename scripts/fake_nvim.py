@@ -0,0 +1,945 @@
+#!/usr/bin/env python3
+"""In-process fake Neovim instances speaking msgpack-RPC
+
+Testing or benchmarking the orchestrator, controller and swarm used to need
+real editors on ports 7777-7779. A FakeNvim is a few buffers in a Python
+object behind a socket: it serves the part of the API the scripts use
+(nvim_command for a handful of Ex commands, buffer lines/name/changedtick,
+nvim_call_atomic, nvim_buf_attach line events, options, namespaces) plus the
+Lua chunks they send through nvim_exec_lua. Those chunks are recognised by
+their exact source and answered by Python ports of the same logic; any other
+Lua is an error, so a script that grows new Lua fails loudly here until the
+fake learns it.
+
+Each instance handles requests one at a time in arrival order, like
+Neovim's main loop. `service` seconds per request make load show up as
+queueing, `latency` (± `jitter`) delays every response and event, and
+`failure_rate` answers a fraction of requests (optionally only
+`fail_methods`) with an error instead of running them. Responses on one
+connection always leave in order.
+
+A FakeFleet of 1,000 instances runs comfortably in one process, and
+`python3 fake_nvim.py --count N` serves a fleet for other processes.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import os
+import random
+import re
+import resource
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from nvim_rpc import NOTIFICATION, REQUEST, RESPONSE, Handle, make_packer, make_unpacker
+
+VERSION = (0, 10, 0)          # what the fake reports as its Neovim version
+VIM_VERSION = 800             # v:version
+FAKE_PORT = 7777              # first port of a CLI fleet: where the scripts look for instances
+INJECTED = "fake_nvim: injected failure"
+
+# Ex commands accepted without doing anything (windows, display, writes)
+NO_OP_COMMANDS = {
+    'vsplit', 'vs', 'split', 'sp', 'new', 'vnew', 'only', 'close', 'q', 'quit', 'tabnew',
+    'w', 'write', 'wa', 'wall', 'update', 'redraw', 'echo', 'echom', 'echomsg', 'highlight',
+    'hi', 'syntax', 'filetype', 'normal', 'norm', 'let', 'unlet', 'undo', 'u', 'redo',
+    'lua', 'autocmd', 'augroup', 'doautocmd', 'NvimTreeToggle', 'Lexplore',
+}
+MODIFIERS = {'silent', 'silent!', 'keepalt', 'keepjumps', 'noautocmd', 'lockmarks'}
+EX_COMMAND = re.compile(r'(\w+!?)\s*(.*)', re.S)
+SUBSTITUTE = re.compile(r'%s(\W)(.*?)\1(.*?)(?:\1(\w*))?$', re.S)   # :%s/pat/rep/flags
+URL_NAME = re.compile(r'\w+://')      # buffer names Neovim does not turn into paths
+
+
+class NvimError(Exception):
+    """Error returned to the client as an RPC error response"""
+
+
+class FakeBuffer:
+    """One buffer: lines, changedtick and the options the scripts read"""
+
+    __slots__ = ('id', 'name', 'lines', 'tick', 'listed', 'loaded', 'options', 'attached')
+
+    def __init__(self, id: int, name: str = '', lines: Optional[List[str]] = None,
+                 listed: bool = True, loaded: bool = True):
+        self.id = id
+        self.name = name
+        self.lines = lines or ['']
+        self.tick = 2
+        self.listed = listed
+        self.loaded = loaded
+        self.options: Dict[str, Any] = {'buftype': '', 'filetype': '', 'modified': False}
+        self.attached = set()      # sessions receiving nvim_buf_lines_event
+
+    @property
+    def handle(self) -> Handle:
+        return Handle('Buffer', self.id)
+
+
+class Session(asyncio.Protocol):
+    """One client connection (an RPC channel)"""
+
+    def __init__(self, nvim: 'FakeNvim'):
+        self.nvim = nvim
+        self.channel = 0
+        self.transport = None
+        self.unpacker = make_unpacker()
+        self.packer = make_packer()
+        self.outbox = []           # (due, message) waiting for their latency to pass
+        self.timer = None
+        self.last_due = 0.0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.channel = self.nvim.open_channel(self)
+
+    def connection_lost(self, exc):
+        self.nvim.close_channel(self)
+        if self.timer is not None:
+            self.timer.cancel()
+        self.transport = None
+
+    def data_received(self, data: bytes):
+        self.unpacker.feed(data)
+        for message in self.unpacker:
+            self.nvim.receive(self, message)
+
+    def send(self, message: list, due: float):
+        """Queue message to leave at loop time `due` (never before earlier ones)"""
+        if self.transport is None:
+            return
+        due = max(due, self.last_due)
+        self.last_due = due
+        loop = asyncio.get_running_loop()
+        if not self.outbox and due <= loop.time():
+            self.transport.write(self.packer.pack(message))
+            return
+        self.outbox.append((due, message))
+        if self.timer is None:
+            self.timer = loop.call_at(self.outbox[0][0], self.flush)
+
+    def flush(self):
+        self.timer = None
+        if self.transport is None:
+            return
+        now = asyncio.get_running_loop().time()
+        i = 0
+        while i < len(self.outbox) and self.outbox[i][0] <= now:
+            i += 1
+        if i:
+            self.transport.write(b''.join(self.packer.pack(m) for _, m in self.outbox[:i]))
+            del self.outbox[:i]
+        if self.outbox:
+            self.timer = asyncio.get_running_loop().call_at(self.outbox[0][0], self.flush)
+
+
+class FakeNvim:
+    """A fake Neovim: buffers plus the API and Lua chunks the scripts use"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, service: float = 0.0,
+                 failure_rate: float = 0.0, fail_methods: Tuple[str, ...] = (),
+                 seed: Optional[int] = None, name: str = ''):
+        self.latency = latency
+        self.jitter = jitter
+        self.service = service
+        self.failure_rate = failure_rate
+        self.fail_methods = set(fail_methods)
+        self.random = random.Random(seed)
+        self.name = name
+        self.buffers: Dict[int, FakeBuffer] = {}
+        self.current = self.create_buffer('').id
+        self.sessions: Dict[int, Session] = {}
+        self.channels = 0
+        self.caller: Optional[Session] = None
+        self.busy_until = 0.0
+        self.namespaces: Dict[str, int] = {}
+        self.namespace_ids = itertools.count(1)
+        self.diagnostics: Dict[str, Dict[int, list]] = {}    # agent -> buf -> items
+        self.virtual_text: Dict[Tuple[int, int], list] = {}
+        self.autocmd: Optional[Tuple[int, str]] = None      # VimSwarmDiagnostics (channel, event)
+        self.helpers = False                                 # orchestra_helpers.lua installed
+        self.collab: Dict[str, int] = {}                     # session buffers by name
+        self.index: Dict[str, Tuple[int, int, int]] = {}
+        self.requests = 0
+        self.failures = 0
+        self.server = None
+        self.endpoint = None
+
+    # Serving
+
+    async def listen(self, host: str = '127.0.0.1', port: int = 0,
+                     path: Optional[str] = None) -> 'FakeNvim':
+        """Accept connections on host:port (0: any free port) or a unix socket"""
+        loop = asyncio.get_running_loop()
+        if path:
+            self.server = await loop.create_unix_server(lambda: Session(self), path)
+            self.endpoint = ('socket', path)
+        else:
+            self.server = await loop.create_server(lambda: Session(self), host, port)
+            self.endpoint = ('tcp', host, self.server.sockets[0].getsockname()[1])
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            for session in list(self.sessions.values()):
+                if session.transport is not None:
+                    session.transport.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def open_channel(self, session: Session) -> int:
+        self.channels += 1
+        self.sessions[self.channels] = session
+        return self.channels
+
+    def close_channel(self, session: Session):
+        self.sessions.pop(session.channel, None)
+        for buf in self.buffers.values():
+            buf.attached.discard(session)
+        if self.autocmd and self.autocmd[0] == session.channel:
+            self.autocmd = None
+
+    def due(self) -> float:
+        """When a response to a request arriving now leaves: after queueing and latency"""
+        now = asyncio.get_running_loop().time()
+        self.busy_until = max(now, self.busy_until) + self.service
+        delay = self.latency
+        if self.jitter:
+            delay = max(0.0, delay + self.random.uniform(-self.jitter, self.jitter))
+        return self.busy_until + delay
+
+    def receive(self, session: Session, message: list):
+        kind = message[0]
+        if kind == REQUEST:
+            _, msgid, method, args = message
+        elif kind == NOTIFICATION:
+            _, method, args = message
+        else:
+            return     # the fake never sends requests, so never expects responses
+        if isinstance(method, bytes):
+            method = method.decode()     # pynvim sends method names as bin
+        self.caller = session
+        due = self.due()
+        error, result = self.handle(method, args)
+        self.caller = None
+        if kind == REQUEST:
+            session.send([RESPONSE, msgid, error, result], due)
+
+    def handle(self, method: str, args: list) -> Tuple[Optional[list], Any]:
+        """(error, result) of one call, after failure injection"""
+        self.requests += 1
+        if self.failure_rate and (not self.fail_methods or method in self.fail_methods) \
+                and self.random.random() < self.failure_rate:
+            self.failures += 1
+            return [0, INJECTED], None
+        try:
+            return None, self.call(method, args)
+        except NvimError as e:
+            return [0, str(e)], None
+        except Exception as e:
+            return [1, f"{method}: {type(e).__name__}: {e}"], None
+
+    def call(self, method: str, args: list) -> Any:
+        if not method.startswith('nvim_') or not hasattr(self, method):
+            raise NvimError(f"Invalid method: {method}")
+        return getattr(self, method)(*args)
+
+    def notify(self, session: Session, method: str, args: list):
+        session.send([NOTIFICATION, method, args], self.busy_until + self.latency)
+
+    # Buffers
+
+    def create_buffer(self, name: str = '', lines: Optional[List[str]] = None,
+                      listed: bool = True, loaded: bool = True) -> FakeBuffer:
+        id = max(self.buffers, default=0) + 1
+        buf = self.buffers[id] = FakeBuffer(id, self.full_name(name), lines, listed, loaded)
+        return buf
+
+    @staticmethod
+    def full_name(name: str) -> str:
+        if not name or URL_NAME.match(name):
+            return name
+        return os.path.abspath(os.path.expanduser(name))
+
+    def buffer(self, buf) -> FakeBuffer:
+        id = buf.id if isinstance(buf, Handle) else buf
+        if id == 0:
+            id = self.current
+        if id not in self.buffers:
+            raise NvimError(f"Invalid buffer id: {id}")
+        return self.buffers[id]
+
+    def bufnr(self, name: str) -> int:
+        name = self.full_name(name)
+        for buf in self.buffers.values():
+            if buf.name == name:
+                return buf.id
+        return -1
+
+    def bufadd(self, name: str) -> int:
+        found = self.bufnr(name) if name else -1
+        if found != -1:
+            return found
+        return self.create_buffer(name, listed=False, loaded=False).id
+
+    def bufload(self, id: int):
+        buf = self.buffer(id)
+        if buf.loaded:
+            return
+        buf.loaded = True
+        try:
+            with open(buf.name, encoding='utf-8', errors='surrogateescape') as f:
+                text = f.read()
+        except OSError:
+            return
+        lines = text.split('\n')
+        if len(lines) > 1 and lines[-1] == '':
+            lines.pop()
+        buf.lines = lines
+
+    def enter(self, id: int):
+        """Make id the current buffer"""
+        if id != self.current:
+            self.current = id
+            self.fire(self.buffers[id], 'BufEnter')
+
+    def set_lines(self, buf: FakeBuffer, start: int, end: int, strict: bool, lines: List[str]):
+        count = len(buf.lines)
+        if start < 0:
+            start += count + 1
+        if end < 0:
+            end += count + 1
+        if start < 0 or end < 0 or strict and (start > count or end > count):
+            raise NvimError("Index out of bounds")
+        start, end = min(start, count), min(end, count)
+        if start > end:
+            raise NvimError("'start' is higher than 'end'")
+        buf.lines[start:end] = lines
+        if not buf.lines:
+            buf.lines = ['']    # a buffer always has one line
+        buf.tick += 1
+        buf.options['modified'] = True
+        for session in list(buf.attached):
+            self.notify(session, 'nvim_buf_lines_event',
+                        [buf.handle, buf.tick, start, end, list(lines), False])
+        self.fire(buf, 'TextChanged')
+
+    def edit(self, buf: int, start: int, end: int, lines: List[str]):
+        """Change a buffer as if someone typed in the editor (for load generators)"""
+        self.set_lines(self.buffer(buf), start, end, False, lines)
+
+    def touch(self, buf: int):
+        """Bump changedtick without changing text, as an undo back to the same text does"""
+        buf = self.buffer(buf)
+        buf.tick += 1
+        for session in list(buf.attached):
+            self.notify(session, 'nvim_buf_changedtick_event', [buf.handle, buf.tick])
+
+    def fire(self, buf: FakeBuffer, event: str):
+        """Run the VimSwarmDiagnostics autocmd, if a client installed one"""
+        if self.autocmd is None or buf.options.get('buftype'):
+            return
+        channel, method = self.autocmd
+        session = self.sessions.get(channel)
+        if session is None:
+            self.autocmd = None
+            return
+        self.notify(session, method, [buf.id, event, buf.tick])
+
+    def run_command(self, command: str):
+        """Execute one Ex command (the subset the scripts send)"""
+        command = command.strip().lstrip(':').strip()
+        while True:
+            first, _, rest = command.partition(' ')
+            if first not in MODIFIERS:
+                break
+            command = rest.strip()
+        substitute = SUBSTITUTE.match(command)
+        if substitute:
+            pattern, replacement, flags = substitute.group(2), substitute.group(3), substitute.group(4) or ''
+            buf = self.buffer(0)
+            count = 0 if 'g' in flags else 1
+            lines = [re.sub(pattern, replacement, line, count) for line in buf.lines]
+            if lines != buf.lines:
+                self.set_lines(buf, 0, -1, False, lines)
+            elif 'e' not in flags:
+                raise NvimError(f"E486: Pattern not found: {pattern}")
+            return
+        match = EX_COMMAND.match(command)
+        if not match:
+            if command:
+                raise NvimError(f"E492: Not an editor command: {command}")
+            return
+        name, arg = match.group(1).rstrip('!'), match.group(2).strip()
+        if name in ('e', 'edit'):
+            if arg in ('', '%'):
+                return
+            id = self.bufadd(arg)
+            self.bufload(id)
+            self.buffers[id].listed = True
+            self.enter(id)
+        elif name in ('badd', 'bad'):
+            self.buffers[self.bufadd(arg)].listed = True
+        elif name == 'enew':
+            self.enter(self.create_buffer('').id)
+        elif name in ('f', 'file'):
+            self.buffer(0).name = self.full_name(arg)
+        elif name in ('b', 'buffer'):
+            id = int(arg) if arg.isdigit() else self.bufnr(arg)
+            if id not in self.buffers:
+                raise NvimError(f"E86: Buffer {arg} does not exist")
+            self.enter(id)
+        elif name in ('bd', 'bdelete', 'bw', 'bwipeout'):
+            buf = self.buffer(int(arg) if arg.isdigit() else 0)
+            self.delete_buffer(buf, wipe=name.startswith('bw'))
+        elif name in ('set', 'se', 'setlocal', 'setl'):
+            buf = self.buffer(0)
+            for option in arg.split():
+                key, eq, value = option.partition('=')
+                if eq:
+                    self.set_option(buf, key, int(value) if value.isdigit() else value)
+                elif key.startswith('no'):
+                    self.set_option(buf, key[2:], False)
+                else:
+                    self.set_option(buf, key, True)
+        elif name in ('echoerr', 'throw'):
+            raise NvimError(arg.strip('\'"') or "E605: Exception not caught")
+        elif name not in NO_OP_COMMANDS and not name[0].isupper():   # user commands: no-ops
+            raise NvimError(f"E492: Not an editor command: {command}")
+
+    def delete_buffer(self, buf: FakeBuffer, wipe: bool):
+        for session in list(buf.attached):
+            self.notify(session, 'nvim_buf_detach_event', [buf.handle])
+        buf.attached.clear()
+        if wipe:
+            del self.buffers[buf.id]
+        else:
+            buf.listed = buf.loaded = False
+        if buf.id == self.current:
+            rest = [b.id for b in self.buffers.values() if b.listed and b.id != buf.id]
+            self.current = rest[0] if rest else self.create_buffer('').id
+
+    def set_option(self, buf: FakeBuffer, name: str, value):
+        if name == 'buflisted':
+            buf.listed = bool(value)
+        else:
+            buf.options[name] = value
+
+    # API
+
+    def nvim_get_api_info(self):
+        return [self.caller.channel if self.caller else 0, {
+            'version': {'major': VERSION[0], 'minor': VERSION[1], 'patch': VERSION[2],
+                        'api_level': 12, 'api_compatible': 0, 'api_prerelease': False},
+            'functions': [], 'ui_events': [], 'ui_options': [],
+            'error_types': {'Exception': {'id': 0}, 'Validation': {'id': 1}},
+            'types': {'Buffer': {'id': 0, 'prefix': 'nvim_buf_'},
+                      'Window': {'id': 1, 'prefix': 'nvim_win_'},
+                      'Tabpage': {'id': 2, 'prefix': 'nvim_tabpage_'}},
+        }]
+
+    def nvim_command(self, command: str):
+        self.run_command(command)
+
+    def nvim_eval(self, expr: str):
+        expr = expr.strip()
+        if expr == 'v:version':
+            return VIM_VERSION
+        if expr == 'getpid()':
+            return os.getpid()
+        if expr.lstrip('-').isdigit():
+            return int(expr)
+        raise NvimError(f"fake_nvim: cannot evaluate {expr}")
+
+    def nvim_call_function(self, fn: str, args: list):
+        if fn == 'bufadd':
+            return self.bufadd(args[0])
+        if fn == 'bufload':
+            self.bufload(args[0] if args[0] else self.current)
+            return 0
+        if fn == 'bufnr':
+            return self.current if args[0] in ('%', '') else self.bufnr(args[0])
+        if fn == 'getpid':
+            return os.getpid()
+        if fn == 'changenr':
+            return self.buffer(0).tick
+        raise NvimError(f"fake_nvim: unknown function {fn}")
+
+    def nvim_input(self, keys: str):
+        return len(keys)
+
+    def nvim_list_bufs(self):
+        return [buf.handle for buf in self.buffers.values()]
+
+    def nvim_get_current_buf(self):
+        return self.buffer(0).handle
+
+    def nvim_set_current_buf(self, buf):
+        self.enter(self.buffer(buf).id)
+
+    def nvim_create_buf(self, listed: bool, scratch: bool):
+        buf = self.create_buffer('', listed=listed)
+        if scratch:
+            buf.options.update(buftype='nofile', bufhidden='hide', swapfile=False)
+        return buf.handle
+
+    def nvim_buf_get_lines(self, buf, start: int, end: int, strict: bool):
+        lines = self.buffer(buf).lines
+        count = len(lines)
+        start, end = (start + count + 1 if start < 0 else start), (end + count + 1 if end < 0 else end)
+        if strict and not (0 <= start <= count and 0 <= end <= count):
+            raise NvimError("Index out of bounds")
+        return lines[max(start, 0):max(end, 0)]
+
+    def nvim_buf_set_lines(self, buf, start: int, end: int, strict: bool, lines: List[str]):
+        self.set_lines(self.buffer(buf), start, end, strict, list(lines))
+
+    def nvim_buf_line_count(self, buf):
+        return len(self.buffer(buf).lines)
+
+    def nvim_buf_get_name(self, buf):
+        return self.buffer(buf).name
+
+    def nvim_buf_set_name(self, buf, name: str):
+        self.buffer(buf).name = self.full_name(name)
+
+    def nvim_buf_get_changedtick(self, buf):
+        return self.buffer(buf).tick
+
+    def nvim_buf_is_valid(self, buf):
+        id = buf.id if isinstance(buf, Handle) else buf
+        return (id or self.current) in self.buffers
+
+    def nvim_buf_is_loaded(self, buf):
+        return self.nvim_buf_is_valid(buf) and self.buffer(buf).loaded
+
+    def nvim_buf_attach(self, buf, send_buffer: bool, opts: dict):
+        buf = self.buffer(buf)
+        if not buf.loaded:
+            return False
+        buf.attached.add(self.caller)
+        if send_buffer:
+            self.notify(self.caller, 'nvim_buf_lines_event',
+                        [buf.handle, buf.tick, 0, -1, list(buf.lines), False])
+        return True
+
+    def nvim_buf_detach(self, buf):
+        buf = self.buffer(buf)
+        if self.caller not in buf.attached:
+            return False
+        buf.attached.discard(self.caller)
+        self.notify(self.caller, 'nvim_buf_detach_event', [buf.handle])
+        return True
+
+    def nvim_get_option_value(self, name: str, opts: dict):
+        buf = self.buffer(opts.get('buf', 0))
+        if name == 'buflisted':
+            return buf.listed
+        if name not in buf.options:
+            raise NvimError(f"Unknown option '{name}'")
+        return buf.options[name]
+
+    def nvim_set_option_value(self, name: str, value, opts: dict):
+        self.set_option(self.buffer(opts.get('buf', 0)), name, value)
+
+    def nvim_create_namespace(self, name: str):
+        if not name:
+            return next(self.namespace_ids)
+        if name not in self.namespaces:
+            self.namespaces[name] = next(self.namespace_ids)
+        return self.namespaces[name]
+
+    def nvim_buf_set_virtual_text(self, buf, ns: int, line: int, chunks: list, opts: dict):
+        self.virtual_text[(self.buffer(buf).id, line)] = chunks
+        return ns
+
+    def nvim_buf_clear_namespace(self, buf, ns: int, start: int, end: int):
+        id = self.buffer(buf).id
+        stop = end if end >= 0 else float('inf')
+        for key in [k for k in self.virtual_text if k[0] == id and start <= k[1] < stop]:
+            del self.virtual_text[key]
+
+    def nvim_call_atomic(self, calls: list):
+        results = []
+        for i, (method, args) in enumerate(calls):
+            try:
+                results.append(self.call(method, args))
+            except NvimError as e:
+                return [results, [i, 0, str(e)]]
+            except Exception as e:
+                return [results, [i, 1, f"{method}: {type(e).__name__}: {e}"]]
+        return [results, None]
+
+    def nvim_exec_lua(self, code: str, args: list):
+        chunk = lua_chunks().get(code)
+        if chunk is None:
+            raise NvimError("Error executing lua: fake_nvim does not know this chunk")
+        try:
+            return getattr(self, chunk)(*args)
+        except NvimError as e:
+            raise NvimError(f"Error executing lua: {e}") from None
+
+    # Lua chunks sent by the scripts (see lua_chunks)
+
+    def lua_describe(self):
+        return [os.getpid(), '.'.join(map(str, VERSION))]
+
+    def lua_macro(self, commands: List[str]):
+        start = self.current
+        before = {id: (buf.tick, list(buf.lines)) for id, buf in self.buffers.items() if buf.loaded}
+        for i, command in enumerate(commands):
+            try:
+                self.run_command(command)
+            except NvimError as e:
+                # `silent undo` back to where the macro started, in every buffer it changed
+                # (buffers it opened are left as loaded: the fake keeps no undo history)
+                for id, (tick, lines) in before.items():
+                    buf = self.buffers.get(id)
+                    if buf is not None and buf.loaded and buf.tick != tick:
+                        self.set_lines(buf, 0, -1, False, lines)
+                if start in self.buffers:
+                    self.current = start
+                return [i + 1, str(e)]
+        return []
+
+    def lua_listed_buffers(self):
+        return [[buf.id, buf.name] for buf in self.buffers.values()
+                if buf.listed and buf.loaded and buf.name]
+
+    def lua_profile_buffer(self, lines: List[str]):
+        id = self.bufnr('VimSwarm-Profile')
+        if id == -1:
+            buf = self.create_buffer('VimSwarm-Profile', listed=False)
+            buf.options.update(buftype='nofile', filetype='markdown')
+            id = buf.id
+        self.set_lines(self.buffers[id], 0, -1, False, list(lines))
+        return id
+
+    def lua_snapshot(self, name: str):
+        buf = self.path_buffer(name)
+        return [buf.id, buf.tick, buf.name, list(buf.lines)]
+
+    def lua_apply(self, buf: int, tick: int, edits: list):
+        buf = self.buffer(buf)
+        if buf.tick != tick:
+            return None
+        for first, last, lines in edits:
+            self.set_lines(buf, first, last, False, list(lines))
+        return buf.tick
+
+    def lua_autocmd(self, channel: int, event: str):
+        self.autocmd = (channel, event)
+        return self.current
+
+    def lua_publish(self, buf: int, tick: int, results: dict):
+        if buf not in self.buffers or self.buffers[buf].tick != tick:
+            return False
+        for agent, items in results.items():
+            self.nvim_create_namespace('vimswarm.' + agent)
+            self.diagnostics.setdefault(agent, {})[buf] = items
+        return True
+
+    def lua_clear(self, agents: List[str]):
+        self.autocmd = None
+        for agent in agents:
+            self.diagnostics.pop(agent, None)
+
+    def lua_collab_buffer(self, name: str, lines: List[str]):
+        if self.collab.get(name) not in self.buffers:
+            buf = self.create_buffer(name)
+            buf.options.update(buftype='nofile', filetype='markdown')
+            self.collab[name] = buf.id
+        buf = self.buffers[self.collab[name]]
+        changed = buf.lines != lines
+        if changed:
+            self.set_lines(buf, 0, -1, False, list(lines))
+        self.enter(buf.id)
+        return [buf.id, changed]
+
+    # orchestra_helpers.lua
+
+    def lua_install_helpers(self):
+        self.helpers = True
+        self.index = {}
+        return 1
+
+    def lua_call_helper(self, name: str, *args):
+        if not self.helpers:
+            raise NvimError("OrchestraHelpers missing")
+        return getattr(self, 'helper_' + name)(*args)
+
+    @staticmethod
+    def hash(lines: List[str]) -> str:
+        return hashlib.sha256(('\n'.join(lines) + '\n').encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def helper_block_hashes(self, buf: int, size: int, known=None):
+        buf = self.buffer(buf)
+        count = len(buf.lines)
+        if known and known.get(str(buf.id)) == buf.tick:
+            return [buf.id, buf.tick, count, None]
+        return [buf.id, buf.tick, count,
+                [self.hash(buf.lines[i:i + size]) for i in range(0, count, size)]]
+
+    def helper_summary(self, buf: int):
+        buf = self.buffer(buf)
+        return {'bufnr': buf.id, 'name': buf.name, 'tick': buf.tick, 'count': len(buf.lines),
+                'checksum': self.hash(buf.lines),
+                'blank': not any(line.strip() for line in buf.lines)}
+
+    def path_buffer(self, path: str) -> FakeBuffer:
+        if path == '':
+            return self.buffer(0)
+        id = self.bufadd(path)
+        self.bufload(id)
+        self.buffers[id].listed = True
+        return self.buffers[id]
+
+    def listed_paths(self) -> List[str]:
+        return [buf.name for buf in self.buffers.values() if buf.listed and buf.name]
+
+    def split_blocks(self, buf: FakeBuffer, size: int):
+        lines = list(buf.lines)
+        hashes, texts = [], []
+        for i in range(0, len(lines), size):
+            last = min(i + size, len(lines))
+            text = '\n'.join(lines[i:last]) + '\n'
+            h = hashlib.sha256(text.encode('utf-8', 'surrogateescape')).hexdigest()
+            hashes.append(h)
+            texts.append(text)
+            self.index[h] = (buf.id, i, last)
+        return lines, hashes, texts
+
+    def helper_inventory(self, size: int):
+        self.index = {}
+        for path in self.listed_paths():
+            buf = self.buffers[self.bufnr(path)]
+            if buf.loaded:
+                self.split_blocks(buf, size)
+        self.split_blocks(self.buffer(0), size)
+        return list(self.index)
+
+    def helper_export(self, paths, size: int, have: dict):
+        files, blocks = [], {}
+        for path in self.listed_paths() if paths is None else paths:
+            lines, hashes, texts = self.split_blocks(self.path_buffer(path), size)
+            files.append([path, len(lines), hashes])
+            for h, text in zip(hashes, texts):
+                if not have.get(h):
+                    blocks[h] = text
+        return {'files': files, 'blocks': blocks}
+
+    def helper_import(self, files: list, blocks: dict, size: int):
+        resolved, missing = {}, set()
+        for _, _, want in files:
+            for h in want:
+                if h in blocks or h in resolved:
+                    continue
+                at = self.index.get(h)
+                text = None
+                if at and at[0] in self.buffers:
+                    text = '\n'.join(self.buffers[at[0]].lines[at[1]:at[2]]) + '\n'
+                if text and hashlib.sha256(text.encode('utf-8', 'surrogateescape')).hexdigest() == h:
+                    resolved[h] = text
+                else:
+                    missing.add(h)
+
+        def block_lines(h):
+            return (blocks.get(h) or resolved[h])[:-1].split('\n')
+
+        results = []
+        for path, count, want in files:
+            if any(h in missing for h in want):
+                continue
+            buf = self.path_buffer(path)
+            _, have, _ = self.split_blocks(buf, size)
+            current = len(buf.lines)
+            edits = 0
+            # Full blocks present on both sides are replaced in place; the rest is one tail edit
+            tail = max(min(len(have), len(want)) - 1, 0)
+            for i in range(tail):
+                if have[i] != want[i]:
+                    self.set_lines(buf, i * size, (i + 1) * size, False, block_lines(want[i]))
+                    edits += 1
+            same_tail = len(have) == len(want) and current == count \
+                and all(have[i] == want[i] for i in range(tail, len(want)))
+            if not same_tail:
+                rest = [line for h in want[tail:] for line in block_lines(h)]
+                self.set_lines(buf, tail * size, -1, False, rest)
+                edits += 1
+            if edits:
+                self.split_blocks(buf, size)
+            results.append([path, buf.id, buf.tick, edits])
+        return {'results': results, 'missing': list(missing)}
+
+
+_chunks: Optional[Dict[str, str]] = None
+
+
+def lua_chunks() -> Dict[str, str]:
+    """Lua source the scripts send -> FakeNvim method answering it"""
+    global _chunks
+    if _chunks is None:
+        import collab_crdt
+        import collab_session
+        import instance_registry
+        import nvim_orchestrator
+        import orchestra_lua
+        import swarm_diagnostics
+        import swarm_profile
+        import vim_swarm
+        _chunks = {
+            orchestra_lua.helpers_source(): 'lua_install_helpers',
+            orchestra_lua.CALL_LUA: 'lua_call_helper',
+            nvim_orchestrator.MACRO_LUA: 'lua_macro',
+            instance_registry.DESCRIBE_LUA: 'lua_describe',
+            collab_crdt.SNAPSHOT_LUA: 'lua_snapshot',
+            collab_crdt.APPLY_LUA: 'lua_apply',
+            collab_session.SESSION_BUFFER_LUA: 'lua_collab_buffer',
+            swarm_diagnostics.AUTOCMD_LUA: 'lua_autocmd',
+            swarm_diagnostics.PUBLISH_LUA: 'lua_publish',
+            swarm_diagnostics.CLEAR_LUA: 'lua_clear',
+            vim_swarm.LISTED_BUFFERS_LUA: 'lua_listed_buffers',
+            swarm_profile.PROFILE_BUFFER_LUA: 'lua_profile_buffer',
+        }
+    return _chunks
+
+
+def raise_fd_limit(needed: int):
+    """Lift the soft open-files limit (up to the hard one) for big fleets"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+class FakeFleet:
+    """count FakeNvims listening for the duration of an `async with` block"""
+
+    def __init__(self, count: int, base_port: int = 0, host: str = '127.0.0.1', **options):
+        self.count = count
+        self.base_port = base_port
+        self.host = host
+        self.options = options
+        self.instances: List[FakeNvim] = []
+
+    @property
+    def endpoints(self) -> List[Tuple]:
+        return [nvim.endpoint for nvim in self.instances]
+
+    @property
+    def names(self) -> List[str]:
+        return [f"nvim-{nvim.endpoint[2]}" for nvim in self.instances]
+
+    async def __aenter__(self) -> 'FakeFleet':
+        # Each instance needs a listening socket plus both ends of in-process connections
+        raise_fd_limit(self.count * 4 + 256)
+        seed = self.options.pop('seed', None)
+        self.instances = [
+            FakeNvim(seed=None if seed is None else seed + i, name=f"fake-{i}", **self.options)
+            for i in range(self.count)
+        ]
+        await asyncio.gather(*[
+            nvim.listen(self.host, self.base_port + i if self.base_port else 0)
+            for i, nvim in enumerate(self.instances)
+        ])
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.gather(*[nvim.close() for nvim in self.instances])
+
+    def stats(self) -> Dict:
+        return {'requests': sum(n.requests for n in self.instances),
+                'failures': sum(n.failures for n in self.instances)}
+
+
+def serve_in_thread(fleet: FakeFleet) -> FakeFleet:
+    """Start fleet on a daemon thread's event loop, for synchronous callers (pynvim)"""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    failed = []
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(fleet.__aenter__())
+        except Exception as e:
+            failed.append(e)
+            started.set()
+            return
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    started.wait()
+    if failed:
+        raise failed[0]
+    return fleet
+
+
+async def serve(args):
+    import instance_registry
+
+    options = dict(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                   service=args.service / 1000, failure_rate=args.failure_rate,
+                   fail_methods=tuple(args.fail_method), seed=args.seed)
+    async with FakeFleet(args.count, args.base_port, args.host, **options) as fleet:
+        registry = instance_registry.InstanceRegistry() if args.register else None
+        keys = [instance_registry.endpoint_key(ep) for ep in fleet.endpoints]
+        if registry:
+            registry.update({key: {'name': name, 'endpoint': list(ep), 'pid': os.getpid(),
+                                   'version': '.'.join(map(str, VERSION)), 'fake': True}
+                             for key, name, ep in zip(keys, fleet.names, fleet.endpoints)})
+        ports = [ep[2] for ep in fleet.endpoints]
+        extras = []
+        if args.latency or args.jitter:
+            extras.append(f"latency {args.latency}±{args.jitter}ms")
+        if args.failure_rate:
+            extras.append(f"failure rate {args.failure_rate}")
+        print(f"✓ {args.count} fake Neovim instances on {args.host}:{ports[0]}-{ports[-1]}"
+              + (f" ({', '.join(extras)})" if extras else ""))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            if registry:
+                registry.update(gone=keys)
+            stats = fleet.stats()
+            print(f"\n= {stats['requests']} requests served, {stats['failures']} injected failures")
+
+
+def parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve fake Neovim instances for tests and benchmarks')
+    parser.add_argument('--count', type=int, default=3, help='Number of instances (default: 3)')
+    parser.add_argument('--base-port', type=int, default=FAKE_PORT,
+                        help=f'First port, one per instance (default: {FAKE_PORT}; 0: any free ports)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--latency', type=float, default=0.0, help='Added to every response, in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random ± spread on --latency, in ms')
+    parser.add_argument('--service', type=float, default=0.0,
+                        help='Time each request occupies an instance, in ms')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with an error (0-1)')
+    parser.add_argument('--fail-method', action='append', default=[], metavar='METHOD',
+                        help='Only inject failures into this method (repeatable)')
+    parser.add_argument('--seed', type=int, help='Seed for jitter and failures')
+    parser.add_argument('--register', action='store_true',
+                        help='Add the instances to the shared instance registry while serving')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"✗ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
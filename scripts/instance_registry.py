@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Shared on-disk registry of running Neovim instances
+
+Discovery results used to live only inside one orchestrator process. The
+registry keeps endpoint, pid, Neovim version, start time and a last-seen
+heartbeat in ~/.config/nvim/orchestra/instances.json so every script (and the
+MCP server) starts from what is already known. Entries are validated lazily
+by connecting to them; a full scan only happens when the registry is stale
+or none of its entries answer.
+"""
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+ORCHESTRA_DIR = os.path.expanduser('~/.config/nvim/orchestra')
+REGISTRY_FILE = os.path.join(ORCHESTRA_DIR, 'instances.json')
+
+# A full scan older than this no longer proves an endpoint is absent
+SCAN_TTL = 300
+
+DESCRIBE_LUA = """
+local v = vim.version()
+return {vim.fn.getpid(), v.major .. '.' .. v.minor .. '.' .. v.patch}
+"""
+
+
+def endpoint_key(endpoint) -> str:
+    """Stable registry key: 'host:port', the socket path or 'relay:port/instance'"""
+    if endpoint[0] == 'tcp':
+        return f"{endpoint[1]}:{endpoint[2]}"
+    if endpoint[0] == 'relay':
+        return f"{endpoint[1]}:{endpoint[2]}/{endpoint[3]}"
+    return endpoint[1]
+
+
+def instance_name(endpoint) -> str:
+    """Name the scripts use for an endpoint ('nvim-7777' or the socket path)"""
+    if endpoint[0] == 'tcp':
+        if endpoint[1] in ('127.0.0.1', 'localhost'):
+            return f"nvim-{endpoint[2]}"
+        return f"{endpoint[1]}:{endpoint[2]}"
+    return endpoint[1]
+
+
+def process_start_time(pid: int):
+    """Epoch seconds a local process started, from /proc (None elsewhere)"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return btime + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+class InstanceRegistry:
+    """instances.json guarded by flock; writes are atomic renames"""
+
+    def __init__(self, path: str = REGISTRY_FILE):
+        self.path = path
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data.setdefault('scanned_at', 0)
+        data.setdefault('instances', {})
+        return data
+
+    def _write(self, data: Dict):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def load(self) -> Dict:
+        """Snapshot of {'scanned_at': ts, 'instances': {key: entry}}"""
+        with self._locked(exclusive=False):
+            return self._read()
+
+    def is_fresh(self, data: Dict) -> bool:
+        return time.time() - data['scanned_at'] < SCAN_TTL
+
+    def update(self, seen: Dict[str, Dict] = None, gone: List[str] = (), scanned: bool = False):
+        """Upsert entries that answered, drop ones that did not, under one lock"""
+        now = time.time()
+        with self._locked(exclusive=True):
+            data = self._read()
+            for key in gone:
+                data['instances'].pop(key, None)
+            for key, entry in (seen or {}).items():
+                if key not in data['instances'] and 'endpoint' not in entry:
+                    continue   # a heartbeat for an entry someone else just removed
+                merged = dict(data['instances'].get(key, {}))
+                merged.update(entry)
+                merged['last_seen'] = now
+                data['instances'][key] = merged
+            if scanned:
+                data['scanned_at'] = now
+            self._write(data)
+
+    def heartbeat(self, keys: List[str]):
+        """Mark entries as seen now without changing anything else"""
+        self.update({key: {} for key in keys})
+
+
+async def describe(client) -> Dict:
+    """pid, version and start time of a freshly connected instance"""
+    pid, version = await client.request('nvim_exec_lua', DESCRIBE_LUA, [])
+    return {'pid': pid, 'version': version, 'started': process_start_time(pid)}
+
+
+async def discover(registry: InstanceRegistry, candidates: List[Tuple], connect,
+                   rescan: bool = False, fixed: bool = False) -> List[Tuple]:
+    """Connect to instances, trusting the registry before scanning
+
+    candidates are (name, endpoint) pairs a full scan would probe; connect is
+    an async (name, endpoint) -> client callable. With fixed=True only the
+    candidates are ever tried (registered ones first), otherwise every
+    registered instance is too. Returns [(name, endpoint, client)] for every
+    instance that answered.
+    """
+    import asyncio
+
+    data = registry.load()
+    wanted = {endpoint_key(ep): (n, ep) for n, ep in candidates}
+    registered = {key: wanted.get(key) or (instance_name(e['endpoint']), tuple(e['endpoint']))
+                  for key, e in data['instances'].items()
+                  if not fixed or key in wanted}
+    scan = rescan or not registry.is_fresh(data)
+
+    async def attempt(probes):
+        results = await asyncio.gather(*[connect(n, ep) for n, ep in probes],
+                                       return_exceptions=True)
+        return [(n, ep, c) for (n, ep), c in zip(probes, results)
+                if not isinstance(c, Exception)]
+
+    probes = dict(registered)
+    if scan:
+        probes.update(wanted)
+    found = await attempt(list(probes.values()))
+    if not found and not scan:
+        # Registry miss: everything it knew is gone, fall back to a full scan
+        scan = True
+        found = await attempt(list(wanted.values()))
+
+    alive = {endpoint_key(ep) for _, ep, _ in found}
+    new = [(n, ep, c) for n, ep, c in found
+           if not data['instances'].get(endpoint_key(ep), {}).get('pid')]
+    details = await asyncio.gather(*[describe(c) for _, _, c in new], return_exceptions=True)
+    seen = {key: {} for key in alive}
+    for (name, endpoint, _), info in zip(new, details):
+        entry = {'name': name, 'endpoint': list(endpoint)}
+        if not isinstance(info, Exception):
+            entry.update(info)
+        seen[endpoint_key(endpoint)] = entry
+    gone = [key for key in registered if key not in alive]
+    # A fixed candidate list is not a full scan, so it cannot refresh scanned_at
+    registry.update(seen, gone, scanned=scan and not fixed)
+    return found
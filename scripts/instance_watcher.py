@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Event-driven instance discovery for the shared registry
+
+Neovim creates its listen socket in /tmp or $XDG_RUNTIME_DIR (directly, or
+inside an nvim* subdirectory). Watching those directories with inotify turns
+each instance start or exit into one event that updates the registry, instead
+of waiting for the next full scan. TCP listeners cannot be watched, so ports
+are swept at a low rate. Without inotify (non-Linux) the sweep covers sockets
+too.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import stat
+import struct
+from typing import Callable, Collection, Dict, List, Optional
+
+import nvim_rpc
+from instance_registry import InstanceRegistry, describe, endpoint_key, instance_name
+
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+EVENT = struct.Struct('iIII')
+
+SWEEP_INTERVAL = 30.0
+PROBE_TIMEOUT = 1.0
+RETRY_DELAYS = (0, 0.05, 0.1, 0.2, 0.4, 0.8)
+
+
+def socket_dirs() -> List[str]:
+    """Directories Neovim creates its listen sockets in"""
+    dirs = ['/tmp']
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        dirs.append(runtime)
+    return dirs
+
+
+def is_socket(path: str) -> bool:
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def is_nvim_socket(path: str) -> bool:
+    """nvim*, or anything inside an nvim* directory, that is a unix socket"""
+    name = os.path.basename(path)
+    parent = os.path.basename(os.path.dirname(path))
+    return (name.startswith('nvim') or parent.startswith('nvim')) and is_socket(path)
+
+
+class Inotify:
+    """Minimal inotify binding over ctypes"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths: Dict[int, str] = {}
+
+    def watch(self, path: str):
+        wd = self._add(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self.paths[wd] = path
+
+    def read(self):
+        """Yield (mask, full path) for every queued event"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd in self.paths:
+                yield mask, os.path.join(self.paths[wd], os.fsdecode(name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class InstanceWatcher:
+    """Keeps the registry current from socket events plus a slow port sweep"""
+
+    def __init__(self, registry: InstanceRegistry, ports, socket_paths=(),
+                 interval: float = SWEEP_INTERVAL,
+                 on_add: Optional[Callable] = None, on_remove: Optional[Callable] = None,
+                 connected: Optional[Callable[[], Collection[str]]] = None):
+        """connected() -> endpoint keys the consumer holds connections to
+
+        With it, sweeps report every live instance missing from that set, even
+        one another script registered; without it, only instances new to the
+        registry are reported.
+        """
+        self.registry = registry
+        self.ports = list(ports)
+        self.socket_paths = list(socket_paths)
+        self.interval = interval
+        self.on_add = on_add
+        self.on_remove = on_remove
+        self.connected = connected
+        self.inotify = None
+        self.pending = set()
+        self.tasks = set()
+
+    async def probe(self, endpoint):
+        """Connect, describe and register one endpoint; returns the entry or None"""
+        name = instance_name(endpoint)
+        try:
+            client = await nvim_rpc.RpcClient.connect(endpoint, name)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        try:
+            entry = {'name': name, 'endpoint': list(endpoint)}
+            entry.update(await asyncio.wait_for(describe(client), PROBE_TIMEOUT))
+        except Exception:
+            pass
+        finally:
+            await client.close()
+        return entry
+
+    async def added(self, endpoint):
+        key = endpoint_key(endpoint)
+        if key in self.pending:
+            return
+        self.pending.add(key)
+        try:
+            # The socket file appears at bind(), slightly before listen()
+            for delay in RETRY_DELAYS:
+                await asyncio.sleep(delay)
+                entry = await self.probe(endpoint)
+                if entry is not None or not is_socket(endpoint[1]):
+                    break
+        finally:
+            self.pending.discard(key)
+        if entry is not None:
+            self.registry.update({key: entry})
+            if self.on_add:
+                self.on_add(entry['name'], endpoint)
+
+    def removed(self, endpoint):
+        key = endpoint_key(endpoint)
+        registered = key in self.registry.load()['instances']
+        if registered:
+            self.registry.update(gone=[key])
+        if registered or self.connected is not None and key in self.connected():
+            if self.on_remove:
+                self.on_remove(instance_name(endpoint))
+
+    def _socket_candidates(self):
+        """Existing sockets: configured paths plus nvim* entries up to one directory deep"""
+        found = [p for p in self.socket_paths if is_socket(p)]
+        for root in socket_dirs():
+            for entry in os.scandir(root):
+                if not entry.name.startswith('nvim') or entry.path in found:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.inotify:
+                            self.inotify.watch(entry.path)
+                        found += [sub.path for sub in os.scandir(entry.path) if is_socket(sub.path)]
+                    elif is_socket(entry.path):
+                        found.append(entry.path)
+                except OSError:
+                    continue   # another user's private directory
+        return found
+
+    def _handle(self, mask, path):
+        """One inotify event: O(1) registry update, no rescan"""
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO) and os.path.basename(path).startswith('nvim'):
+                self.inotify.watch(path)
+            return
+        if mask & (IN_CREATE | IN_MOVED_TO):
+            if is_nvim_socket(path) or path in self.socket_paths:
+                task = asyncio.ensure_future(self.added(('socket', path)))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self.removed(('socket', path))
+
+    def _on_readable(self):
+        for mask, path in self.inotify.read():
+            self._handle(mask, path)
+
+    async def sweep(self, sockets: bool):
+        """Probe every port (and socket, without inotify) and reconcile the registry"""
+        endpoints = [('tcp', '127.0.0.1', port) for port in self.ports]
+        if sockets:
+            endpoints += [('socket', path) for path in self._socket_candidates()]
+        known = self.registry.load()['instances']
+        endpoints += [tuple(e['endpoint']) for key, e in known.items()
+                      if tuple(e['endpoint']) not in endpoints
+                      and (sockets or e['endpoint'][0] == 'tcp')]
+
+        entries = await asyncio.gather(*[self.probe(ep) for ep in endpoints])
+        have = known if self.connected is None else set(self.connected())
+        seen, gone = {}, []
+        for endpoint, entry in zip(endpoints, entries):
+            key = endpoint_key(endpoint)
+            if entry is not None:
+                seen[key] = entry
+                if key not in have and self.on_add:
+                    self.on_add(entry['name'], endpoint)
+            elif key in known or key in have:
+                if key in known:
+                    gone.append(key)
+                if self.on_remove:
+                    self.on_remove(instance_name(endpoint))
+        self.registry.update(seen, gone, scanned=True)
+
+    async def run(self):
+        """Watch until cancelled"""
+        loop = asyncio.get_running_loop()
+        try:
+            self.inotify = Inotify()
+            for root in socket_dirs():
+                self.inotify.watch(root)
+            for path in self.socket_paths:
+                if os.path.dirname(path) not in socket_dirs():
+                    self.inotify.watch(os.path.dirname(path))
+            loop.add_reader(self.inotify.fd, self._on_readable)
+        except (OSError, AttributeError):
+            self.inotify = None
+
+        try:
+            # The first sweep also picks up sockets that existed before we started
+            await self.sweep(sockets=True)
+            while True:
+                await asyncio.sleep(self.interval)
+                await self.sweep(sockets=self.inotify is None)
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            if self.inotify:
+                loop.remove_reader(self.inotify.fd)
+                self.inotify.close()
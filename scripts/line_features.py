@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Bulk per-line features for selecting candidate lines
+
+Most rules only care about lines that contain some token ('=', 'eval(',
+'+=') or are long. LineFeatures answers those questions for the whole
+buffer at once and returns masks that combine with & and |; a rule then runs
+its detailed check only on the lines its mask selects.
+
+With NumPy installed the buffer is encoded once into one contiguous byte
+array with line offsets, and token searches are vectorized compares over
+it. Without NumPy (or for small inputs) a mask is a small query evaluated
+line by line when selected, where `a & b` only tests b on the lines that
+passed a, so the fallback costs what the original per-line checks did.
+
+Masks are candidate filters: the NumPy path measures length in bytes and
+folds case for ASCII only, so rules must still confirm each selected line.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VECTOR_MIN = 256     # below this many lines the per-call NumPy overhead is not worth it
+SAMPLE_EVERY = 64    # bytes per sample when estimating which token byte is rarest
+
+
+class Query:
+    """A mask without NumPy: ('any', tokens, ignore_case), ('len', width), ('and'|'or', a, b)"""
+
+    def __init__(self, *node):
+        self.node = node
+
+    def __and__(self, other: 'Query') -> 'Query':
+        return Query('and', self, other)
+
+    def __or__(self, other: 'Query') -> 'Query':
+        if self.node[0] == other.node[0] == 'any' and self.node[2] == other.node[2]:
+            return Query('any', self.node[1] + other.node[1], self.node[2])
+        return Query('or', self, other)
+
+
+class LineFeatures:
+    """Token and length masks over one buffer's lines"""
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.count = len(lines)
+        self.masks: Dict = {}       # (token, ignore_case) -> boolean column
+        self.data = None
+        self.encoded = np is None or self.count < VECTOR_MIN   # encoding happens on first query
+
+    def _encode(self):
+        self.encoded = True
+        raw = '\n'.join(self.lines).encode('utf-8', 'surrogateescape')
+        data = np.frombuffer(raw, dtype=np.uint8)
+        newlines = np.flatnonzero(data == 10)
+        if len(newlines) != self.count - 1:
+            return   # lines holding '\n' (Neovim's NUL): keep the per-line path
+        self.raw = raw
+        self.data = {False: data}                # ignore_case -> bytes (ASCII-lowered for True)
+        self.histogram = {}
+        self.starts = np.concatenate(([0], newlines + 1))
+        self.lengths = np.concatenate((newlines, [len(data)])) - self.starts
+
+    @property
+    def vectorized(self) -> bool:
+        if not self.encoded:
+            self._encode()
+        return self.data is not None
+
+    def contains(self, token: str, ignore_case: bool = False):
+        """Lines containing token (token in lower case when ignore_case)"""
+        return self.any_of((token,), ignore_case)
+
+    def any_of(self, tokens: Iterable[str], ignore_case: bool = False):
+        """Lines containing at least one of tokens"""
+        tokens = tuple(tokens)
+        if not self.vectorized:
+            return Query('any', tokens, ignore_case)
+        mask = np.zeros(self.count, dtype=bool)
+        for token in tokens:
+            key = (token, ignore_case)
+            if key not in self.masks:
+                self.masks[key] = self._find(token.encode('utf-8', 'surrogateescape'), ignore_case)
+            mask |= self.masks[key]
+        return mask
+
+    def _find(self, token: bytes, ignore_case: bool):
+        if ignore_case not in self.data:
+            self.data[ignore_case] = np.frombuffer(self.raw.lower(), dtype=np.uint8)
+        data = self.data[ignore_case]
+        if ignore_case not in self.histogram:
+            self.histogram[ignore_case] = np.bincount(data[::SAMPLE_EVERY], minlength=256)
+        m, n = len(token), len(data)
+        mask = np.zeros(self.count, dtype=bool)
+        if not m or n < m:
+            return mask
+        # Start from the token's rarest byte, then check the others at each hit
+        anchor = min(range(m), key=lambda k: self.histogram[ignore_case][token[k]])
+        hits = np.flatnonzero(data == token[anchor]) - anchor
+        hits = hits[(hits >= 0) & (hits <= n - m)]
+        for k in range(m):
+            if k == anchor:
+                continue
+            if not len(hits):
+                break
+            hits = hits[data[hits + k] == token[k]]
+        # A token never contains '\n', so each hit lies within one line
+        mask[np.searchsorted(self.starts, hits, side='right') - 1] = True
+        return mask
+
+    def longer_than(self, width: int):
+        """Lines longer than width (bytes when vectorized, so a superset of characters)"""
+        if not self.vectorized:
+            return Query('len', width)
+        return self.lengths > width
+
+    def lines_where(self, mask, among: Optional[List[int]] = None) -> List[int]:
+        """Selected line numbers, in order, optionally only those in `among` (sorted)"""
+        if self.vectorized:
+            if among is None:
+                return np.flatnonzero(mask).tolist()
+            among = np.asarray(among, dtype=np.intp)
+            return among[mask[among]].tolist()
+        return sorted(self._select(mask, among))
+
+    def _select(self, query: Query, domain: Optional[Iterable[int]]) -> Set[int]:
+        """Lines of domain (None: every line) that query selects"""
+        kind, *args = query.node
+        if kind == 'and':
+            return self._select(args[1], self._select(args[0], domain))
+        if kind == 'or':
+            first = self._select(args[0], domain)
+            rest = (i for i in range(self.count) if i not in first) if domain is None \
+                else [i for i in domain if i not in first]
+            return first | self._select(args[1], rest)
+        if domain is None:
+            numbered = enumerate(self.lines)
+        else:
+            lines = self.lines
+            numbered = [(i, lines[i]) for i in domain]
+        if kind == 'len':
+            width = args[0]
+            return {i for i, line in numbered if len(line) > width}
+        tokens, ignore_case = args
+        if ignore_case:
+            numbered = [(i, line.lower()) for i, line in numbered]
+        elif len(tokens) > 2:
+            numbered = list(numbered)
+        if len(tokens) == 1:
+            token = tokens[0]
+            return {i for i, line in numbered if token in line}
+        if len(tokens) == 2:
+            first, second = tokens
+            return {i for i, line in numbered if first in line or second in line}
+        found = set()
+        for token in tokens:
+            found |= {i for i, line in numbered if token in line}
+        return found
+
+
+def of(content: List[str], context: Dict) -> LineFeatures:
+    """The features of content, computed once per analysis and shared by an agent's rules"""
+    features = context.get('features')
+    if features is None or features.lines is not content:
+        features = context['features'] = LineFeatures(content)
+    return features
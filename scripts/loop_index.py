@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Loop and scope index for line-based analysis
+
+Built once per buffer in a single pass from indentation and a few tokens:
+every line learns its innermost enclosing loop and how many loops enclose
+it, so rules such as "I/O inside a loop" are O(1) per line. Function and
+class bodies start a fresh scope (a def inside a loop does not run per
+iteration). Lines inside open brackets or triple-quoted strings continue the
+statement they belong to instead of opening or closing scopes, and brace
+languages are handled through their conventional indentation, with braces
+treated as blocks rather than open brackets.
+"""
+
+import re
+from typing import Iterator, List
+
+LOOP_RE = re.compile(r'^\s*(?:(?:async\s+)?for\b|while\b|do\s*\{|.*\.forEach\s*\()')
+SCOPE_RE = re.compile(r'^\s*(?:(?:async\s+)?def\b|class\b|(?:export\s+)?(?:async\s+)?function\b'
+                      r'|func\b|fn\b)')
+STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+OPEN, CLOSE = '([', ')]'
+
+
+def indent_of(line: str) -> int:
+    return len(line.expandtabs(4)) - len(line.expandtabs(4).lstrip())
+
+
+class LoopIndex:
+    """Per-line loop nesting for one buffer (0-based line numbers)"""
+
+    def __init__(self, lines: List[str], build: bool = True):
+        n = len(lines)
+        self.depth = [0] * n        # loops enclosing the line (a header counts its own loop for its body only)
+        self.loop = [-1] * n        # innermost enclosing loop header, -1 outside loops
+        self.end = {}               # loop header -> last line of its body
+        self.inner = set()          # loop headers that contain another loop
+        self.lines = lines
+        if build:
+            for _ in self.steps():
+                pass
+
+    def steps(self) -> Iterator[None]:
+        """Build the index, yielding once per line so callers can watch a deadline"""
+        lines = self.lines
+        stack = []                  # [indent, header line, is_loop]; scopes reset loop depth
+        brackets = 0
+        in_string = None
+        last_code = -1
+
+        def close(indent):
+            while stack and stack[-1][0] >= indent:
+                _, header, is_loop = stack.pop()
+                if is_loop:
+                    self.end[header] = max(last_code, header)
+
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            continuation = brackets > 0 or in_string is not None
+
+            if not continuation and stripped and not stripped.startswith(('#', '//')):
+                close(indent_of(line))
+            depth, loop = self._enclosing(stack)
+            self.depth[i] = depth
+            self.loop[i] = loop
+
+            if in_string is None and not continuation and stripped \
+                    and not stripped.startswith(('#', '//')):
+                if LOOP_RE.match(line):
+                    if loop >= 0:
+                        self.inner.add(loop)
+                    stack.append([indent_of(line), i, True])
+                elif SCOPE_RE.match(line):
+                    stack.append([indent_of(line), i, False])
+
+            # Track triple-quoted strings and open brackets across lines
+            code = line
+            for quote in ('"""', "'''"):
+                count = code.count(quote)
+                if in_string == quote:
+                    if count % 2:
+                        in_string = None
+                    code = ''
+                elif in_string is None and count % 2:
+                    in_string = quote
+                    code = code[:code.index(quote)]
+            code = STRING_RE.sub('', code).split('#', 1)[0].split('//', 1)[0].strip()
+            # Braces are blocks, not continuations; `forEach((x) => {` opens
+            # its block and `})` closes it
+            if code and not code.endswith('{') and not code.startswith('}'):
+                brackets = max(0, brackets + sum(code.count(c) for c in OPEN)
+                               - sum(code.count(c) for c in CLOSE))
+            if stripped:
+                last_code = i
+            yield
+        close(-1)
+
+    @staticmethod
+    def _enclosing(stack):
+        depth, loop = 0, -1
+        for _, header, is_loop in reversed(stack):
+            if not is_loop:
+                break
+            if loop < 0:
+                loop = header
+            depth += 1
+        return depth, loop
+
+    def in_loop(self, i: int) -> bool:
+        return self.loop[i] >= 0
+
+    def is_header(self, i: int) -> bool:
+        return i in self.end
+
+    def body(self, header: int) -> range:
+        """Line numbers of a loop's body"""
+        return range(header + 1, self.end.get(header, header) + 1)
+
+    def loop_depth(self, header: int) -> int:
+        """Nesting level of a loop itself: 1 for an outermost loop"""
+        return self.depth[header] + 1
+
+    def innermost(self) -> List[int]:
+        """Loop headers with no loop inside them"""
+        return sorted(h for h in self.end if h not in self.inner)
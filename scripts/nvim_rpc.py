@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Pipelined msgpack-RPC client for Neovim
+
+pynvim waits for every response before sending the next request. This client
+keeps many requests in flight on one connection and matches responses by
+msgid, so bulk operations are bound by bandwidth instead of round trips.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+import msgpack
+
+REQUEST, RESPONSE, NOTIFICATION = 0, 1, 2
+
+RECORD_ENV = 'NVIM_RPC_RECORD'   # log path: record every connection's traffic (rpc_replay)
+
+# Neovim encodes handles as msgpack ext types (see `nvim --api-info`)
+EXT_TYPES = {0: 'Buffer', 1: 'Window', 2: 'Tabpage'}
+EXT_CODES = {kind: code for code, kind in EXT_TYPES.items()}
+
+
+class Handle:
+    """A Buffer, Window or Tabpage handle as sent by Neovim"""
+
+    __slots__ = ('kind', 'id')
+
+    def __init__(self, kind: str, id: int):
+        self.kind = kind
+        self.id = id
+
+    def __eq__(self, other):
+        return isinstance(other, Handle) and (self.kind, self.id) == (other.kind, other.id)
+
+    def __hash__(self):
+        return hash((self.kind, self.id))
+
+    def __repr__(self):
+        return f"{self.kind}({self.id})"
+
+
+class RpcError(Exception):
+    """Error response returned by Neovim"""
+
+    def __init__(self, method: str, error: Any):
+        if isinstance(error, (list, tuple)) and len(error) == 2:
+            error = error[1]
+        if isinstance(error, bytes):
+            error = error.decode('utf-8', 'replace')
+        super().__init__(f"{method}: {error}")
+        self.method = method
+        self.error = error
+
+
+def _ext_hook(code: int, data: bytes):
+    kind = EXT_TYPES.get(code)
+    if kind is None:
+        return msgpack.ExtType(code, data)
+    return Handle(kind, msgpack.unpackb(data))
+
+
+def _default(obj):
+    if isinstance(obj, Handle):
+        return msgpack.ExtType(EXT_CODES[obj.kind], msgpack.packb(obj.id))
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def make_packer() -> msgpack.Packer:
+    """Packer that encodes Handles as Neovim ext types"""
+    return msgpack.Packer(default=_default, use_bin_type=True,
+                          unicode_errors='surrogateescape')
+
+
+def make_unpacker() -> msgpack.Unpacker:
+    """Streaming unpacker that decodes Neovim ext types into Handles"""
+    return msgpack.Unpacker(ext_hook=_ext_hook, raw=False,
+                            unicode_errors='surrogateescape')
+
+
+def parse_endpoint(address: str) -> Tuple:
+    """Turn '7777', 'host:7777' or '/path/to/socket' into an endpoint tuple"""
+    if address.isdigit():
+        return ('tcp', '127.0.0.1', int(address))
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        return ('tcp', host, int(port))
+    return ('socket', address)
+
+
+class RpcClient:
+    """msgpack-RPC connection with any number of outstanding requests"""
+
+    recorder = None     # rpc_replay.Recorder shared by every connection, if recording
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 name: str = ''):
+        self.name = name
+        self._reader = reader
+        self._writer = writer
+        self._packer = make_packer()
+        self._msgids = itertools.count(1)
+        self._pending: Dict[int, Tuple[str, asyncio.Future]] = {}
+        self._handlers: Dict[str, List[Callable]] = {}
+        self._recorder = self._start_recording()
+        if self._recorder is not None:
+            self._record_id = self._recorder.connection(name, writer.get_extra_info('peername'))
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_loop())
+        self.closed = False
+
+    @classmethod
+    def _start_recording(cls):
+        if cls.recorder is None and os.environ.get(RECORD_ENV):
+            import rpc_replay
+            cls.recorder = rpc_replay.Recorder(os.environ[RECORD_ENV])
+        return cls.recorder
+
+    @classmethod
+    async def connect(cls, endpoint, name: str = '', timeout: float = 1.0) -> 'RpcClient':
+        """Open a connection to a ('tcp', host, port) or ('socket', path) endpoint"""
+        if isinstance(endpoint, str):
+            endpoint = parse_endpoint(endpoint)
+        if endpoint[0] == 'tcp':
+            opening = asyncio.open_connection(endpoint[1], endpoint[2])
+        else:
+            opening = asyncio.open_unix_connection(endpoint[1])
+        reader, writer = await asyncio.wait_for(opening, timeout)
+        return cls(reader, writer, name)
+
+    def _send(self, message: list):
+        if self._recorder is not None:
+            self._recorder.outgoing(self._record_id, message)
+        self._writer.write(self._packer.pack(message))
+
+    def _start(self, method: str, args) -> asyncio.Future:
+        if self.closed:
+            raise ConnectionError(f"{self.name or 'nvim'}: connection closed")
+        msgid = next(self._msgids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msgid] = (method, future)
+        self._send([REQUEST, msgid, method, list(args)])
+        return future
+
+    async def request(self, method: str, *args) -> Any:
+        """Send one request and wait for its response"""
+        future = self._start(method, args)
+        await self._writer.drain()
+        return await future
+
+    def notify(self, method: str, *args):
+        """Send a notification; Neovim never replies to these"""
+        self._send([NOTIFICATION, method, list(args)])
+
+    async def pipeline(self, calls: List[Tuple], window: int = 256,
+                       return_exceptions: bool = False) -> List[Any]:
+        """Send [(method, *args), ...] back to back and gather the responses in order
+
+        At most `window` requests are outstanding at once so a huge batch
+        does not flood the server's input buffer.
+        """
+        slots = asyncio.Semaphore(window)
+        futures = []
+        for call in calls:
+            if slots.locked():
+                await self._writer.drain()
+            await slots.acquire()
+            future = self._start(call[0], call[1:])
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+        await self._writer.drain()
+        return await asyncio.gather(*futures, return_exceptions=return_exceptions)
+
+    def on_notification(self, method: str, callback: Callable[[List[Any]], None]):
+        """Register a callback for notifications such as nvim_buf_lines_event"""
+        self._handlers.setdefault(method, []).append(callback)
+
+    def remove_notification(self, method: str, callback: Callable[[List[Any]], None]):
+        """Unregister a callback added with on_notification"""
+        handlers = self._handlers.get(method, [])
+        if callback in handlers:
+            handlers.remove(callback)
+
+    async def _read_loop(self):
+        unpacker = make_unpacker()
+        try:
+            while True:
+                data = await self._reader.read(65536)
+                if not data:
+                    break
+                unpacker.feed(data)
+                for message in unpacker:
+                    self._dispatch(message)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._fail_pending(ConnectionError(f"{self.name or 'nvim'}: connection lost"))
+
+    def _dispatch(self, message: list):
+        if self._recorder is not None:
+            self._recorder.incoming(self._record_id, message)
+        kind = message[0]
+        if kind == RESPONSE:
+            _, msgid, error, result = message
+            method, future = self._pending.pop(msgid, (None, None))
+            if future is None or future.done():
+                return
+            if error is not None:
+                future.set_exception(RpcError(method, error))
+            else:
+                future.set_result(result)
+        elif kind == NOTIFICATION:
+            _, method, args = message
+            for callback in self._handlers.get(method, []):
+                # A failing subscriber must not stop the read loop for everyone else
+                try:
+                    callback(args)
+                except Exception as e:
+                    print(f"✗ {self.name or 'nvim'}: {method} handler failed: {type(e).__name__}: {e}")
+        elif kind == REQUEST:
+            # The orchestrator does not serve requests from Neovim
+            _, msgid, method, _args = message
+            self._send([RESPONSE, msgid, f"{method} not supported", None])
+
+    def _fail_pending(self, error: Exception):
+        self.closed = True
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def close(self):
+        """Close the connection and fail any outstanding requests"""
+        if self.closed:
+            return
+        self.closed = True
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._reader_task.cancel()
+        self._fail_pending(ConnectionError(f"{self.name or 'nvim'}: connection closed"))
+
+
+async def ainput(prompt: str = '') -> str:
+    """input() that keeps the event loop running for in-flight operations
+
+    Reads on a daemon thread so a pending prompt never blocks interpreter
+    shutdown the way a default-executor thread would.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(deliver, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(deliver, future.set_result, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
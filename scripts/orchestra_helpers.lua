@@ -0,0 +1,197 @@
+-- Orchestra helpers: buffer summaries computed inside Neovim.
+-- Injected once per instance by orchestra_lua.py so "is anything different?"
+-- checks move hashes and ranges over RPC instead of whole buffers.
+
+local M = { version = 1, index = {} }
+
+local function resolve(buf)
+  if buf == 0 then
+    return vim.api.nvim_get_current_buf()
+  end
+  return buf
+end
+
+local function hash(lines, first, last)
+  return vim.fn.sha256(table.concat(lines, '\n', first, last) .. '\n')
+end
+
+-- {bufnr, changedtick, line count, block hashes}; hashes are nil when the
+-- caller already knows this buffer at the current changedtick
+function M.block_hashes(buf, size, known)
+  buf = resolve(buf)
+  local tick = vim.api.nvim_buf_get_changedtick(buf)
+  local count = vim.api.nvim_buf_line_count(buf)
+  if known and known[tostring(buf)] == tick then
+    return { buf, tick, count, vim.NIL }
+  end
+  local lines = vim.api.nvim_buf_get_lines(buf, 0, -1, false)
+  local hashes = {}
+  for i = 1, #lines, size do
+    hashes[#hashes + 1] = hash(lines, i, math.min(i + size - 1, #lines))
+  end
+  return { buf, tick, count, hashes }
+end
+
+-- Line count, checksum of the whole text and whether it is all blank
+function M.summary(buf)
+  buf = resolve(buf)
+  local lines = vim.api.nvim_buf_get_lines(buf, 0, -1, false)
+  local blank = true
+  for _, line in ipairs(lines) do
+    if line:find('%S') then
+      blank = false
+      break
+    end
+  end
+  return {
+    bufnr = buf,
+    name = vim.api.nvim_buf_get_name(buf),
+    tick = vim.api.nvim_buf_get_changedtick(buf),
+    count = #lines,
+    checksum = hash(lines, 1, #lines),
+    blank = blank,
+  }
+end
+
+-- Buffer for a snapshot path: '' is the current buffer, otherwise the path
+-- is loaded (and listed) if it is not already
+local function path_buffer(path)
+  if path == '' then
+    return vim.api.nvim_get_current_buf()
+  end
+  local buf = vim.fn.bufadd(path)
+  vim.fn.bufload(buf)
+  vim.bo[buf].buflisted = true
+  return buf
+end
+
+local function listed_paths()
+  local paths = {}
+  for _, buf in ipairs(vim.api.nvim_list_bufs()) do
+    local name = vim.api.nvim_buf_get_name(buf)
+    if vim.bo[buf].buflisted and name ~= '' then
+      paths[#paths + 1] = name
+    end
+  end
+  return paths
+end
+
+-- Block texts and hashes of a whole buffer, recording where each block lives
+local function split_blocks(buf, size)
+  local lines = vim.api.nvim_buf_get_lines(buf, 0, -1, false)
+  local hashes, texts = {}, {}
+  for i = 1, #lines, size do
+    local last = math.min(i + size - 1, #lines)
+    local text = table.concat(lines, '\n', i, last) .. '\n'
+    local h = vim.fn.sha256(text)
+    hashes[#hashes + 1] = h
+    texts[#texts + 1] = text
+    M.index[h] = { buf, i - 1, last }
+  end
+  return lines, hashes, texts
+end
+
+local function block_lines(text)
+  return vim.split(text:sub(1, -2), '\n', { plain = true })
+end
+
+-- Every block hash held by listed buffers (content addressing for restores)
+function M.inventory(size)
+  M.index = {}
+  for _, path in ipairs(listed_paths()) do
+    local buf = vim.fn.bufnr(path)
+    if vim.api.nvim_buf_is_loaded(buf) then
+      split_blocks(buf, size)
+    end
+  end
+  split_blocks(vim.api.nvim_get_current_buf(), size)
+  return vim.tbl_keys(M.index)
+end
+
+-- {files = {{path, count, hashes}}, blocks = {hash = text}} for `paths` (nil:
+-- every listed buffer); blocks in `have` are left out
+function M.export(paths, size, have)
+  local files, blocks = {}, {}
+  for _, path in ipairs(paths == vim.NIL and listed_paths() or paths) do
+    local buf = path_buffer(path)
+    local lines, hashes, texts = split_blocks(buf, size)
+    files[#files + 1] = { path, #lines, hashes }
+    for i, h in ipairs(hashes) do
+      if not have[h] then
+        blocks[h] = texts[i]
+      end
+    end
+  end
+  return { files = files, blocks = vim.tbl_isempty(blocks) and vim.empty_dict() or blocks }
+end
+
+-- Make buffers match snapshot files {{path, count, hashes}}. Blocks absent
+-- from `blocks` are copied from this instance's own buffers; files that
+-- still lack a block are skipped and their hashes returned as missing.
+function M.import(files, blocks, size)
+  local resolved, missing = {}, {}
+  for _, f in ipairs(files) do
+    for _, h in ipairs(f[3]) do
+      if blocks[h] == nil and resolved[h] == nil then
+        local at = M.index[h]
+        local text
+        if at and vim.api.nvim_buf_is_valid(at[1]) then
+          text = table.concat(vim.api.nvim_buf_get_lines(at[1], at[2], at[3], false), '\n') .. '\n'
+        end
+        if text and vim.fn.sha256(text) == h then
+          resolved[h] = text
+        else
+          missing[h] = true
+        end
+      end
+    end
+  end
+
+  local results = {}
+  for _, f in ipairs(files) do
+    local path, count, want = f[1], f[2], f[3]
+    local complete = true
+    for _, h in ipairs(want) do
+      if missing[h] then
+        complete = false
+        break
+      end
+    end
+    if complete then
+      local buf = path_buffer(path)
+      local _, have = split_blocks(buf, size)
+      local current = vim.api.nvim_buf_line_count(buf)
+      local edits = 0
+      -- Full blocks present on both sides are replaced in place; the rest is
+      -- one tail edit (the same plan as block_sync.plan_edits)
+      local tail = math.max(math.min(#have, #want) - 1, 0)
+      for i = 1, tail do
+        if have[i] ~= want[i] then
+          local text = blocks[want[i]] or resolved[want[i]]
+          vim.api.nvim_buf_set_lines(buf, (i - 1) * size, i * size, false, block_lines(text))
+          edits = edits + 1
+        end
+      end
+      local same_tail = #have == #want and current == count
+      for i = tail + 1, #want do
+        same_tail = same_tail and have[i] == want[i]
+      end
+      if not same_tail then
+        local rest = {}
+        for i = tail + 1, #want do
+          vim.list_extend(rest, block_lines(blocks[want[i]] or resolved[want[i]]))
+        end
+        vim.api.nvim_buf_set_lines(buf, tail * size, -1, false, rest)
+        edits = edits + 1
+      end
+      if edits > 0 then
+        split_blocks(buf, size)
+      end
+      results[#results + 1] = { path, buf, vim.api.nvim_buf_get_changedtick(buf), edits }
+    end
+  end
+  return { results = results, missing = vim.tbl_keys(missing) }
+end
+
+_G.OrchestraHelpers = M
+return M.version
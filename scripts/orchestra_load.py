@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Load generator for the Claude AI controller
+
+Starts N instances (headless Neovims, fake_nvim instances or existing
+--targets), connects a ClaudeAIController to all of them and drives three
+workloads at fixed rates for a while:
+
+  edit       an agent changes one line of its buffer over its own connection
+  sync       controller.sync_buffers() from a random agent to all others
+  broadcast  controller.broadcast_command() to every agent
+
+Operations start on schedule whether or not earlier ones finished (open
+loop), and latency is measured from the scheduled start, so a controller
+that falls behind shows up as growing latency and a rate below the target
+instead of a politely slower request stream. Sync lag is the time from an
+edit landing to the end of the first sync from that agent started after it:
+how stale the other agents' copies get.
+
+`--agents 3,20,100` repeats the run for each roster size and ends with one
+row per size, which is where scaling cliffs show. Syncs and roles use
+private state files, so a run never touches the shared ones.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import nvim_rpc
+from rpc_replay import HEADLESS_PORT, HeadlessPool, percentile
+
+WORKLOADS = ('edit', 'sync', 'broadcast')
+RATES = {'edit': 50.0, 'sync': 2.0, 'broadcast': 1.0}    # default operations per second
+BEHIND = 0.9            # achieved/target rate below this flags a workload as falling behind
+LINES = 500             # lines in each agent's buffer
+
+
+class Workload:
+    """Latencies and errors of one workload during one run"""
+
+    def __init__(self, name: str, rate: float):
+        self.name = name
+        self.rate = rate
+        self.latency: List[float] = []
+        self.errors = 0
+        self.finished = 0.0      # loop time of the last completion
+
+    def summary(self, started: float, duration: float) -> Dict:
+        count = len(self.latency)
+        elapsed = max(self.finished - started, duration)
+        achieved = count / elapsed if count else 0.0
+        return {'target_per_s': self.rate, 'ops': count, 'errors': self.errors,
+                'per_s': round(achieved, 1),
+                'behind': bool(self.rate) and achieved < BEHIND * self.rate,
+                'p50_ms': _ms(percentile(self.latency, 50)),
+                'p99_ms': _ms(percentile(self.latency, 99))}
+
+
+def _ms(seconds: Optional[float]):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class LoadRun:
+    """One run of the workloads against a roster of agents"""
+
+    def __init__(self, controller, editors: Dict[str, 'nvim_rpc.RpcClient'], rates: Dict[str, float],
+                 duration: float, command: str, seed: Optional[int] = None):
+        self.controller = controller
+        self.editors = editors
+        self.names = list(editors)
+        self.duration = duration
+        self.command = command
+        self.random = random.Random(seed)
+        self.workloads = {name: Workload(name, rates.get(name, 0.0)) for name in WORKLOADS}
+        self.pending: Dict[str, List[float]] = {name: [] for name in self.names}   # unsynced edit times
+        self.lag: List[float] = []
+        self.edits = 0
+
+    async def edit(self):
+        name = self.random.choice(self.names)
+        line = self.random.randrange(LINES)
+        self.edits += 1
+        await self.editors[name].request('nvim_buf_set_lines', 0, line, line + 1, False,
+                                         [f"# {name} edit {self.edits}"])
+        self.pending[name].append(asyncio.get_running_loop().time())
+
+    async def sync(self):
+        source = self.random.choice(self.names)
+        edits, self.pending[source] = self.pending[source], []
+        await self.controller.sync_buffers(source)
+        done = asyncio.get_running_loop().time()
+        self.lag.extend(done - t for t in edits)
+
+    async def broadcast(self):
+        results = await self.controller.broadcast_command(self.command)
+        if any(str(result).startswith('error') for result in results.values()):
+            raise RuntimeError("broadcast failed on some agents")
+
+    async def drive(self, workload: Workload):
+        """Start operations at workload.rate for the duration, open loop"""
+        if not workload.rate:
+            return
+        loop = asyncio.get_running_loop()
+        operation = getattr(self, workload.name)
+        interval = 1 / workload.rate
+        start = loop.time()
+        tasks = []
+
+        async def timed(due):
+            try:
+                await operation()
+            except Exception:
+                workload.errors += 1
+            workload.finished = loop.time()
+            workload.latency.append(workload.finished - due)
+
+        for i in range(int(self.duration * workload.rate)):
+            due = start + i * interval
+            if due > loop.time():
+                await asyncio.sleep(due - loop.time())
+            tasks.append(asyncio.ensure_future(timed(due)))
+        await asyncio.gather(*tasks)
+
+    async def run(self) -> Dict:
+        started = asyncio.get_running_loop().time()
+        # The controller reports every operation; at load that is just noise
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            await asyncio.gather(*[self.drive(w) for w in self.workloads.values()])
+        return {
+            'agents': len(self.names), 'duration_s': self.duration,
+            'workloads': {name: w.summary(started, self.duration) for name, w in self.workloads.items()},
+            'sync_lag_p50_ms': _ms(percentile(self.lag, 50)),
+            'sync_lag_p99_ms': _ms(percentile(self.lag, 99)),
+            'unsynced_edits': sum(len(edits) for edits in self.pending.values()),
+        }
+
+
+async def run_size(endpoints: List, args, state_dir: str) -> Dict:
+    """Connect a controller and one editor connection per agent, seed buffers, run"""
+    from claude_ai_controller import ClaudeAIController
+    import agent_roster
+    import sync_coordinator
+
+    controller = ClaudeAIController(agent_roster.AgentRoster(os.path.join(state_dir, 'roster.json')))
+    controller.coordinator = sync_coordinator.SyncCoordinator(
+        os.path.join(state_dir, f'sync_state_{len(endpoints)}.json'))
+    names = [f'claude{i}' for i in range(1, len(endpoints) + 1)]
+    clients, editors = await asyncio.gather(
+        asyncio.gather(*[nvim_rpc.RpcClient.connect(ep, name) for name, ep in zip(names, endpoints)]),
+        asyncio.gather(*[nvim_rpc.RpcClient.connect(ep, f"{name}-editor")
+                         for name, ep in zip(names, endpoints)]))
+    for name, endpoint, client in zip(names, endpoints, clients):
+        controller.roster.add(name, client, endpoint)
+    seed = [f"line {i}: the same text in every agent" for i in range(LINES)]
+    await asyncio.gather(*[editor.request('nvim_buf_set_lines', 0, 0, -1, False, seed)
+                           for editor in editors])
+    try:
+        return await LoadRun(controller, dict(zip(names, editors)), args.rates, args.duration,
+                             args.command, args.seed).run()
+    finally:
+        await asyncio.gather(*[editor.close() for editor in editors])
+        await controller.close()
+
+
+def print_report(report: Dict):
+    lag = report['sync_lag_p99_ms']
+    print(f"\n⏱ {report['agents']} agents, {report['duration_s']}s"
+          + (f", sync lag p50 {report['sync_lag_p50_ms']}ms p99 {lag}ms" if lag is not None else "")
+          + (f", {report['unsynced_edits']} edits never synced" if report['unsynced_edits'] else ""))
+    print(f"  {'workload':10} {'target/s':>8} {'ops':>6} {'errors':>6} {'per s':>7} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    for name, w in report['workloads'].items():
+        if not w['target_per_s']:
+            continue
+        print(f"  {name:10} {w['target_per_s']:>8} {w['ops']:>6} {w['errors']:>6} {w['per_s']:>7} "
+              f"{_cell(w['p50_ms']):>8} {_cell(w['p99_ms']):>8}"
+              + ("  ⚠ falling behind" if w['behind'] else ""))
+
+
+def print_scaling(reports: List[Dict]):
+    active = [name for name in WORKLOADS if reports[0]['workloads'][name]['target_per_s']]
+    print("\n📈 Scaling (p99 ms; ⚠ = below target rate)")
+    print(f"  {'agents':>6} " + " ".join(f"{name:>12}" for name in active) + f" {'sync lag':>12}")
+    for report in reports:
+        cells = []
+        for name in active:
+            w = report['workloads'][name]
+            cells.append(f"{_cell(w['p99_ms']) + (' ⚠' if w['behind'] else ''):>12}")
+        print(f"  {report['agents']:>6} " + " ".join(cells) + f" {_cell(report['sync_lag_p99_ms']):>12}")
+
+
+def _cell(value) -> str:
+    return '-' if value is None else str(value)
+
+
+async def run(args) -> List[Dict]:
+    import fake_nvim
+
+    sizes = args.agents
+    largest = max(sizes)
+    fake_nvim.raise_fd_limit(largest * 8 + 256)     # two connections per agent, plus the servers
+    if args.targets:
+        endpoints = [nvim_rpc.parse_endpoint(t) for t in args.targets.split(',')]
+        if len(endpoints) < largest:
+            raise RuntimeError(f"--agents {largest} needs {largest} targets, got {len(endpoints)}")
+        pool = contextlib.nullcontext()
+    elif args.fake:
+        pool = fake_nvim.FakeFleet(largest, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                                   service=args.service / 1000, failure_rate=args.failure_rate,
+                                   seed=args.seed)
+    else:
+        pool = HeadlessPool(largest, args.base_port)
+    source = 'fake_nvim' if args.fake else 'targets' if args.targets else 'nvim --headless'
+    print(f"🚀 Load: {', '.join(f'{n}/s {name}' for name, n in args.rates.items() if n)} "
+          f"for {args.duration}s against {'/'.join(map(str, sizes))} agents ({source})")
+    reports = []
+    async with pool as started:
+        if not args.targets:
+            endpoints = started.endpoints
+        with tempfile.TemporaryDirectory(prefix='orchestra-load-') as state_dir:
+            for size in sizes:
+                report = await run_size(endpoints[:size], args, state_dir)
+                print_report(report)
+                reports.append(report)
+    if len(reports) > 1:
+        print_scaling(reports)
+    return reports
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='orchestra_load.py',
+                                     description='Drive editing, sync and broadcast load through the controller')
+    parser.add_argument('--agents', type=lambda s: [int(n) for n in s.split(',')], default=[3],
+                        metavar='N[,N...]', help='Roster sizes to run, e.g. 3,20,100 (default: 3)')
+    instances = parser.add_mutually_exclusive_group()
+    instances.add_argument('--fake', action='store_true',
+                           help='Serve in-process fake instances instead of starting nvim --headless')
+    instances.add_argument('--targets', help='Comma-separated running endpoints to use instead')
+    parser.add_argument('--base-port', type=int, default=HEADLESS_PORT,
+                        help=f'First port for headless instances (default: {HEADLESS_PORT})')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per roster size (default: 10)')
+    for name in WORKLOADS:
+        parser.add_argument(f'--{name}-rate', type=float, default=RATES[name], metavar='PER_S',
+                            help=f'{name.capitalize()} operations per second, 0 to disable '
+                                 f'(default: {RATES[name]:g})')
+    parser.add_argument('--command', default='echo "orchestra load"',
+                        help='Ex command the broadcast workload sends')
+    parser.add_argument('--latency', type=float, default=0.0, help='--fake: response latency in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='--fake: ± spread on --latency in ms')
+    parser.add_argument('--service', type=float, default=0.0,
+                        help='--fake: time each request occupies an instance in ms')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='--fake: fraction of requests answered with an error')
+    parser.add_argument('--seed', type=int, help='Seed for agent and line choices (and --fake jitter)')
+    parser.add_argument('--json', help='Also write the reports to this file')
+    args = parser.parse_args(argv)
+    args.rates = {name: getattr(args, f'{name}_rate') for name in WORKLOADS}
+    return args
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        reports = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        return
+    except (RuntimeError, OSError) as e:
+        sys.exit(f"✗ {e}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
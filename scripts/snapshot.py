@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Content-addressed workspace snapshots
+
+A snapshot lists files as block hashes (the same sha256 line blocks as
+block_sync) plus a store holding each distinct block once. Capturing runs
+inside Neovim (OrchestraHelpers.export), so a block crosses RPC as one string
+instead of a list of line objects. Restoring first asks the target which
+blocks it already holds anywhere in its buffers and ships only the others;
+unchanged files cost nothing and a shared license header costs one block.
+
+On disk a snapshot is a zlib-compressed msgpack manifest followed by
+independently compressed chunks of blocks, so large workspaces stream
+instead of being inflated in one piece:
+
+    b'NVSNAP' version:u8 | len:u32 manifest | (len:u32 chunk)*
+"""
+
+import hashlib
+import struct
+import zlib
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import nvim_rpc
+from block_sync import BLOCK_SIZE, block_hashes
+from orchestra_lua import helper_call
+
+MAGIC = b'NVSNAP'
+VERSION = 1
+LENGTH = struct.Struct('>I')
+CHUNK_BYTES = 1 << 20      # uncompressed block text per on-disk chunk
+BATCH_FILES = 64           # files per import call, keeps RPC messages bounded
+
+
+class SnapshotError(Exception):
+    """Unreadable snapshot file or a restore that could not be completed"""
+
+
+class Snapshot:
+    """Files as block hashes, plus the text of each distinct block"""
+
+    def __init__(self, size: int = BLOCK_SIZE):
+        self.size = size
+        self.files: Dict[str, List] = {}      # path -> [line count, [hashes]]
+        self.blocks: Dict[str, str] = {}      # hash -> block text ending in '\n'
+
+    @classmethod
+    def from_lines(cls, contents: Dict[str, List[str]], size: int = BLOCK_SIZE) -> 'Snapshot':
+        """Snapshot of in-memory content; path '' means a target's current buffer"""
+        snap = cls(size)
+        for path, lines in contents.items():
+            hashes = block_hashes(lines, size)
+            snap.files[path] = [len(lines), hashes]
+            for i, h in enumerate(hashes):
+                snap.blocks.setdefault(h, '\n'.join(lines[i * size:(i + 1) * size]) + '\n')
+        return snap
+
+    def hashes(self) -> Set[str]:
+        return {h for _, hashes in self.files.values() for h in hashes}
+
+    def lines(self, path: str) -> List[str]:
+        _, hashes = self.files[path]
+        return [line for h in hashes for line in self.blocks[h][:-1].split('\n')]
+
+    def stats(self) -> Dict[str, int]:
+        return {'files': len(self.files),
+                'blocks': sum(len(hashes) for _, hashes in self.files.values()),
+                'unique_blocks': len(self.blocks),
+                'lines': sum(count for count, _ in self.files.values()),
+                'bytes': sum(len(text) for text in self.blocks.values())}
+
+    def save(self, path: str) -> int:
+        """Write the snapshot; returns its size in bytes"""
+        packer = nvim_rpc.make_packer()
+        with open(path, 'wb') as f:
+            f.write(MAGIC + bytes([VERSION]))
+            manifest = zlib.compress(packer.pack({'size': self.size, 'files': self.files}))
+            f.write(LENGTH.pack(len(manifest)) + manifest)
+            chunk, used = {}, 0
+            for h, text in self.blocks.items():
+                chunk[h] = text
+                used += len(text)
+                if used >= CHUNK_BYTES:
+                    data = zlib.compress(packer.pack(chunk))
+                    f.write(LENGTH.pack(len(data)) + data)
+                    chunk, used = {}, 0
+            if chunk:
+                data = zlib.compress(packer.pack(chunk))
+                f.write(LENGTH.pack(len(data)) + data)
+            return f.tell()
+
+    @classmethod
+    def load(cls, path: str, verify: bool = True) -> 'Snapshot':
+        def read(f, n):
+            data = f.read(n)
+            if len(data) != n:
+                raise SnapshotError(f"{path}: truncated snapshot")
+            return data
+
+        def unpack(data):
+            unpacker = nvim_rpc.make_unpacker()
+            unpacker.feed(zlib.decompress(data))
+            return unpacker.unpack()
+
+        with open(path, 'rb') as f:
+            header = f.read(len(MAGIC) + 1)
+            if header[:len(MAGIC)] != MAGIC:
+                raise SnapshotError(f"{path}: not a snapshot file")
+            if header[-1] != VERSION:
+                raise SnapshotError(f"{path}: unsupported snapshot version {header[-1]}")
+            manifest = unpack(read(f, LENGTH.unpack(read(f, LENGTH.size))[0]))
+            snap = cls(manifest['size'])
+            snap.files = manifest['files']
+            while True:
+                length = f.read(LENGTH.size)
+                if not length:
+                    break
+                snap.blocks.update(unpack(read(f, LENGTH.unpack(length)[0])))
+        if verify:
+            for h, text in snap.blocks.items():
+                if hashlib.sha256(text.encode('utf-8', 'surrogateescape')).hexdigest() != h:
+                    raise SnapshotError(f"{path}: corrupt block {h[:12]}")
+            absent = snap.hashes() - set(snap.blocks)
+            if absent:
+                raise SnapshotError(f"{path}: {len(absent)} blocks missing")
+        return snap
+
+
+async def inventory(helpers, name: str, client, size: int = BLOCK_SIZE) -> Set[str]:
+    """Hashes of every block an instance already holds in its buffers"""
+    return set(await helpers.call(name, client, 'inventory', size))
+
+
+async def capture(helpers, name: str, client, paths: Optional[Iterable[str]] = None,
+                  have: Iterable[str] = (), size: int = BLOCK_SIZE) -> Snapshot:
+    """Snapshot an instance's listed buffers (or `paths`), omitting blocks in `have`"""
+    result = await helpers.call(name, client, 'export',
+                                None if paths is None else list(paths), size,
+                                {h: True for h in have})
+    snap = Snapshot(size)
+    for path, count, hashes in result['files']:
+        snap.files[path] = [count, hashes]
+    snap.blocks = dict(result['blocks'])
+    return snap
+
+
+async def restore(helpers, name: str, client, snap: Snapshot,
+                  have: Optional[Set[str]] = None,
+                  fetch: Optional[Callable[[List[str]], Awaitable[Dict[str, str]]]] = None) -> Dict:
+    """Make an instance's buffers match `snap`, sending only blocks it lacks
+
+    `have` is the target's inventory when the caller already fetched it.
+    `fetch` supplies blocks the snapshot left out (captured with `have`) when
+    the target turns out to have lost them; fetched blocks are kept in `snap`.
+    Returns {'files', 'changed', 'blocks_sent', 'bytes_sent', 'ticks': {path: tick}}.
+    """
+    if have is None:
+        have = await inventory(helpers, name, client, snap.size)
+    paths = list(snap.files)
+    batches, sent = [], set()
+    for i in range(0, len(paths), BATCH_FILES):
+        files = [[p, *snap.files[p]] for p in paths[i:i + BATCH_FILES]]
+        needed = {h for _, _, hashes in files for h in hashes} - have - sent
+        sent |= needed
+        batches.append((files, {h: snap.blocks[h] for h in needed}))
+
+    stats = {'files': len(paths), 'changed': 0, 'blocks_sent': 0, 'bytes_sent': 0, 'ticks': {}}
+
+    async def resend(files, missing):
+        # Skipped files go again with every block the snapshot has for them, plus
+        # the missing ones it left out because the target was thought to hold them
+        absent = [h for h in missing if h not in snap.blocks]
+        if absent and fetch is not None:
+            snap.blocks.update(await fetch(absent))
+            absent = [h for h in absent if h not in snap.blocks]
+        if absent:
+            raise SnapshotError(f"{name}: lost {len(absent)} blocks the snapshot does not carry")
+        return {h: snap.blocks[h] for f in files for h in f[2] if h in snap.blocks}
+
+    async def run(batches):
+        await helpers.ensure(name, client)
+        replies = await client.pipeline([helper_call('import', files, blocks, snap.size)
+                                         for files, blocks in batches])
+        retry = []
+        for (files, blocks), reply in zip(batches, replies):
+            stats['blocks_sent'] += len(blocks)
+            stats['bytes_sent'] += sum(len(text) for text in blocks.values())
+            for path, _, tick, edits in reply['results']:
+                stats['ticks'][path] = tick
+                stats['changed'] += edits > 0
+            if reply['missing']:
+                # Blocks the target had moved or overwritten since the inventory
+                done = {path for path, *_ in reply['results']}
+                todo = [f for f in files if f[0] not in done]
+                retry.append((todo, await resend(todo, reply['missing'])))
+        return retry
+
+    retry = await run(batches)
+    if retry and await run(retry):
+        raise SnapshotError(f"{name}: blocks kept disappearing during restore")
+    return stats
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Per-agent, per-rule profiling of VimSwarm runs
+
+A SwarmProfiler wraps rules (Rule.scan generators) so that every step a
+rule takes is timed, optionally run under that rule's own cProfile and
+measured with tracemalloc. Rules run one after another in both analyze() and
+budgeted runs, so each rule's numbers are its own; shared work such as the
+loop index or line features is charged to the first rule that builds it.
+
+The report breaks time, function calls, peak allocations and suggestions
+down by agent and rule and lists each rule's hottest functions, as JSON for
+tools and as a markdown scratch buffer for rule authors.
+"""
+
+import cProfile
+import dataclasses
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+HOTSPOTS = 5          # functions listed per rule
+
+# The profiler's own calls around each step, not part of the rule
+WRAPPER_ENTRIES = ("<built-in method builtins.next>", "<method 'disable' of '_lsprof.Profiler' objects>")
+
+# Show `lines` in a reusable VimSwarm-Profile scratch buffer
+PROFILE_BUFFER_LUA = """
+local lines = ...
+local buf = vim.fn.bufnr('VimSwarm-Profile')
+if buf == -1 then
+  buf = vim.api.nvim_create_buf(false, true)
+  vim.api.nvim_buf_set_name(buf, 'VimSwarm-Profile')
+  vim.bo[buf].filetype = 'markdown'
+end
+vim.api.nvim_buf_set_lines(buf, 0, -1, false, lines)
+if vim.fn.bufwinid(buf) == -1 then
+  vim.cmd('vsplit')
+  vim.api.nvim_win_set_buf(0, buf)
+end
+return buf
+"""
+
+
+class RuleStats:
+    """What one rule cost during a run"""
+
+    def __init__(self, agent: str, name: str, cpu: bool):
+        self.agent = agent
+        self.name = name
+        self.time = 0.0
+        self.steps = 0
+        self.suggestions = 0
+        self.peak: Optional[int] = None     # bytes above the rule's starting point
+        self.profile = cProfile.Profile() if cpu else None
+
+    def calls_and_hotspots(self):
+        if self.profile is None:
+            return None, []
+        stats = pstats.Stats(self.profile).stats
+        entries = [(key, nc, tt) for key, (_, nc, tt, _, _) in stats.items()
+                   if key[2] not in WRAPPER_ENTRIES]
+        hottest = sorted(entries, key=lambda entry: entry[2], reverse=True)[:HOTSPOTS]
+        return sum(nc for _, nc, _ in entries), [
+            {'function': f"{os.path.basename(path)}:{line}({func})" if line else func,
+             'calls': nc, 'time_ms': round(tt * 1000, 2)}
+            for (path, line, func), nc, tt in hottest
+        ]
+
+    def to_dict(self) -> Dict:
+        calls, hotspots = self.calls_and_hotspots()
+        return {'time_ms': round(self.time * 1000, 2), 'steps': self.steps, 'calls': calls,
+                'peak_kb': None if self.peak is None else round(self.peak / 1024, 1),
+                'suggestions': self.suggestions, 'hotspots': hotspots}
+
+
+class SwarmProfiler:
+    """Collects RuleStats for every rule it wraps"""
+
+    def __init__(self, cpu: bool = True, memory: bool = False):
+        self.cpu = cpu
+        self.memory = memory
+        self.rules: Dict[tuple, RuleStats] = {}
+        self.started_tracing = False
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def wrap(self, rules: List) -> List:
+        """Copies of rules whose scans are measured"""
+        return [dataclasses.replace(rule, scan=self.scanner(rule)) for rule in rules]
+
+    def scanner(self, rule):
+        stats = self.rules.setdefault((rule.agent, rule.name),
+                                      RuleStats(rule.agent, rule.name, self.cpu))
+        memory = self.memory
+
+        def scan(content, context):
+            steps = rule.scan(content, context)
+            base = tracemalloc.get_traced_memory()[0] if memory else 0
+            while True:
+                if memory:
+                    tracemalloc.reset_peak()
+                started = time.perf_counter()
+                if stats.profile is not None:
+                    stats.profile.enable()
+                try:
+                    suggestion = next(steps)
+                except StopIteration:
+                    return
+                finally:
+                    if stats.profile is not None:
+                        stats.profile.disable()
+                    stats.time += time.perf_counter() - started
+                    if memory:
+                        peak = tracemalloc.get_traced_memory()[1] - base
+                        stats.peak = peak if stats.peak is None else max(stats.peak, peak)
+                stats.steps += 1
+                if suggestion is not None:
+                    stats.suggestions += 1
+                yield suggestion
+
+        return scan
+
+    def report(self, **meta) -> Dict:
+        agents: Dict[str, Dict] = {}
+        for stats in self.rules.values():
+            rule = stats.to_dict()
+            agent = agents.setdefault(stats.agent, {'time_ms': 0.0, 'calls': None, 'peak_kb': None,
+                                                    'suggestions': 0, 'rules': {}})
+            agent['rules'][stats.name] = rule
+            agent['time_ms'] = round(agent['time_ms'] + rule['time_ms'], 2)
+            agent['suggestions'] += rule['suggestions']
+            if rule['calls'] is not None:
+                agent['calls'] = (agent['calls'] or 0) + rule['calls']
+            if rule['peak_kb'] is not None:
+                agent['peak_kb'] = max(agent['peak_kb'] or 0, rule['peak_kb'])
+        return dict(meta, cprofile=self.cpu, tracemalloc=self.memory,
+                    elapsed_ms=round(self.elapsed * 1000, 2), agents=agents)
+
+
+def save(report: Dict, path: str):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def slowest(report: Dict, n: Optional[int] = 3) -> List[tuple]:
+    """(agent, rule, stats) of the n most expensive rules (None: all, by cost)"""
+    rules = [(agent, name, rule) for agent, data in report['agents'].items()
+             for name, rule in data['rules'].items()]
+    return sorted(rules, key=lambda item: item[2]['time_ms'], reverse=True)[:n]
+
+
+def render(report: Dict) -> List[str]:
+    """The report as markdown lines for a scratch buffer"""
+    def cell(value):
+        return '-' if value is None else str(value)
+
+    lines = ["# VimSwarm Profile",
+             f"File: {report.get('file', '?')} ({report.get('lines', '?')} lines), "
+             f"{report['elapsed_ms']}ms total",
+             f"cProfile: {'on' if report['cprofile'] else 'off'}, "
+             f"tracemalloc: {'on' if report['tracemalloc'] else 'off'}"
+             + (" (times include tracing overhead)" if report['tracemalloc'] else ""),
+             "",
+             "| Agent / rule | ms | steps | calls | peak KiB | suggestions |",
+             "|---|---:|---:|---:|---:|---:|"]
+    ranked = sorted(report['agents'].items(), key=lambda item: item[1]['time_ms'], reverse=True)
+    for agent, data in ranked:
+        lines.append(f"| **{agent}** | {data['time_ms']} | | {cell(data['calls'])} "
+                     f"| {cell(data['peak_kb'])} | {data['suggestions']} |")
+        for name, rule in sorted(data['rules'].items(), key=lambda item: item[1]['time_ms'],
+                                 reverse=True):
+            lines.append(f"| {name} | {rule['time_ms']} | {rule['steps']} | {cell(rule['calls'])} "
+                         f"| {cell(rule['peak_kb'])} | {rule['suggestions']} |")
+    if report['cprofile']:
+        lines += ["", "## Hot spots"]
+        for agent, name, rule in slowest(report, None):
+            if not rule['hotspots']:
+                continue
+            lines += ["", f"### {agent}.{name}"]
+            lines += [f"- {spot['time_ms']}ms  {spot['calls']} calls  {spot['function']}"
+                      for spot in rule['hotspots']]
+    return lines
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Agents known to the Claude AI controller, with role groups
+
+The controller used to know exactly three agents on ports 7777-7779. The
+roster holds whatever discovery found, from the shared instance registry and
+a port scan connected concurrently. Local agents are named claudeN after
+their port (claude1 is 7777), so names stay the same across runs and
+processes without any coordination.
+
+Agents belong to any number of role groups (@reviewers, @writers). Roles are
+kept in ~/.config/nvim/orchestra/roster.json, or come from a registry entry's
+'roles'. The roster indexes group -> members, so resolving '@reviewers' or
+'claude1,@testers' costs the size of the answer, not a scan of every agent.
+"""
+
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from instance_registry import ORCHESTRA_DIR, instance_name
+
+ROSTER_FILE = os.path.join(ORCHESTRA_DIR, 'roster.json')
+FIRST_PORT = 7777        # claude1
+ALL = 'all'              # @all: every connected agent
+
+
+class RosterError(Exception):
+    """A target names an agent or group the roster does not know"""
+
+
+def agent_name(endpoint: Tuple) -> str:
+    """'claudeN' for local ports from 7777 up, else the instance name"""
+    if endpoint[0] == 'tcp' and endpoint[1] in ('127.0.0.1', 'localhost') and endpoint[2] >= FIRST_PORT:
+        return f"claude{endpoint[2] - FIRST_PORT + 1}"
+    return instance_name(endpoint)
+
+
+def sort_key(name: str):
+    """claude2 before claude10"""
+    digits = len(name) - len(name.rstrip('0123456789'))
+    return (name[:len(name) - digits], int(name[len(name) - digits:] or 0), name)
+
+
+class AgentRoster:
+    """Connected agents plus the role index used to address them"""
+
+    def __init__(self, path: str = ROSTER_FILE):
+        self.path = path
+        self.agents: Dict[str, Dict] = {}
+        self.assigned = self._load()               # agent -> roles, connected or not
+        self.groups: Dict[str, Set[str]] = {       # role -> connected members
+            role: set() for roles in self.assigned.values() for role in roles}
+
+    def _load(self) -> Dict[str, Set[str]]:
+        try:
+            with open(self.path) as f:
+                roles = json.load(f).get('roles', {})
+        except (OSError, ValueError):
+            roles = {}
+        return {name: set(groups) for name, groups in roles.items()}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'roles': {name: sorted(roles) for name, roles in sorted(self.assigned.items())
+                                 if roles}}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self.agents)
+
+    def __contains__(self, name: str):
+        return name in self.agents
+
+    def add(self, name: str, client, endpoint: Tuple, roles: Iterable[str] = ()):
+        """Register a connected agent; roles from elsewhere (registry) join the saved ones"""
+        self.agents[name] = {
+            'nvim': client,
+            'endpoint': tuple(endpoint),
+            'port': endpoint[2] if endpoint[0] == 'tcp' else None,
+            'status': 'active',
+            'last_sync': None,
+        }
+        for role in self.assigned.get(name, set()) | set(roles):
+            self.groups.setdefault(role, set()).add(name)
+
+    def sort(self):
+        """Order agents claude1, claude2, ..., claude10 (after concurrent discovery)"""
+        self.agents = {name: self.agents[name] for name in sorted(self.agents, key=sort_key)}
+
+    def remove(self, name: str) -> Optional[Dict]:
+        for members in self.groups.values():
+            members.discard(name)
+        return self.agents.pop(name, None)
+
+    def roles(self, name: str) -> List[str]:
+        return sorted(role for role, members in self.groups.items() if name in members)
+
+    def assign(self, role: str, names: List[str]):
+        """Add names to @role and remember it across runs"""
+        for name in names:
+            self.assigned.setdefault(name, set()).add(role)
+            self.groups.setdefault(role, set()).add(name)
+        self.save()
+
+    def unassign(self, role: str, names: List[str]):
+        for name in names:
+            self.assigned.get(name, set()).discard(role)
+            self.groups.get(role, set()).discard(name)
+        self.save()
+
+    def is_target(self, spec: str) -> bool:
+        """Whether spec reads as agents/groups rather than, say, an Ex command"""
+        try:
+            self.resolve(spec)
+        except RosterError:
+            return False
+        return True
+
+    def resolve(self, spec: str, exclude: Iterable[str] = ()) -> List[str]:
+        """Agents named by 'claude1,@reviewers,...' (claude2 before claude10), minus exclude"""
+        chosen: Set[str] = set()
+        for token in spec.split(','):
+            token = token.strip()
+            if not token:
+                continue
+            if token.startswith('@'):
+                group = token[1:]
+                if group == ALL:
+                    chosen.update(self.agents)
+                elif group in self.groups:
+                    chosen.update(self.groups[group])
+                else:
+                    raise RosterError(f"unknown group @{group}")
+            elif token in self.agents:
+                chosen.add(token)
+            else:
+                raise RosterError(f"unknown agent {token}")
+        chosen.difference_update(exclude)
+        return sorted(chosen, key=sort_key)
@@ -1,54 +1,161 @@
 #!/usr/bin/env python3
 """
 Claude AI Orchestra Controller
-Allows 3 Claude AI instances to command and sync with each other
+Lets any number of Claude AI instances command and sync with each other,
+addressed by name (claude1) or role group (@reviewers)
 """
 
-import asyncio
-import pynvim
+import sys
 import json
 import time
 from datetime import datetime
 from typing import Dict, List, Any
+from orchestra_cli import StartupTimer, lazy_import
+
+TIMER = StartupTimer()
+
+# Deferred until first use so argument errors return instantly
+asyncio = lazy_import('asyncio')
+nvim_rpc = lazy_import('nvim_rpc')
+block_sync = lazy_import('block_sync')
+orchestra_lua = lazy_import('orchestra_lua')
+instance_registry = lazy_import('instance_registry')
+send_queue = lazy_import('send_queue')
+sync_coordinator = lazy_import('sync_coordinator')
+agent_roster = lazy_import('agent_roster')
+collab_session = lazy_import('collab_session')
+
+CLAUDE_PORTS = range(7777, 7780)   # scanned when the registry does not know better
+LIST_LIMIT = 20                    # above this many agents, output is summarized
+
+def context_object(text):
+    """--context: a JSON object; anything else is reported and ignored
+
+    Older MCP servers pass the JSON through a shell unquoted, so it can
+    arrive as {task:x}. The command should still run, just without context.
+    """
+    try:
+        context = json.loads(text)
+    except ValueError:
+        context = None
+    if not isinstance(context, dict):
+        print(f"⚠ Ignoring --context that is not a JSON object: {text[:80]}", file=sys.stderr)
+        return {}
+    return context
+
+
+def port_list(text):
+    """'7777-7999' or '7777,7780' -> list of ports"""
+    ports = []
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        ports.extend(range(int(first), int(last or first) + 1))
+    return ports
+
+def where(info):
+    return f"Port {info['port']}" if info['port'] is not None else info['endpoint'][-1]
 
 class ClaudeAIController:
-    def __init__(self):
-        self.agents = {}
+    def __init__(self, roster=None, ports=None, rescan=False, context=None):
+        self.roster = roster or agent_roster.AgentRoster()
+        self.ports = ports
+        self.rescan = rescan
         self.command_history = []
         self.sync_log = []
         self.auto_sync = False
+        self.fingerprints = block_sync.FingerprintCache()
+        self.helpers = orchestra_lua.LuaHelpers()
+        self.queues = send_queue.QueueSet()
+        self.coordinator = sync_coordinator.SyncCoordinator()
+        self.templates = collab_session.TemplateCache()
+        self.context = context or {}       # --context from the MCP server
         
-    def discover_agents(self):
-        """Find all running Claude AI instances"""
-        for i, port in enumerate([7777, 7778, 7779], 1):
-            try:
-                nvim = pynvim.attach('tcp', address='127.0.0.1', port=port)
-                self.agents[f'claude{i}'] = {
-                    'nvim': nvim,
-                    'port': port,
-                    'status': 'active',
-                    'last_sync': None
-                }
-                print(f"✓ Connected to Claude Agent {i} (Port {port})")
-            except Exception as e:
-                print(f"✗ Claude Agent {i} (Port {port}): {e}")
+    @property
+    def agents(self):
+        """name -> {'nvim', 'endpoint', 'port', 'status', 'last_sync'}"""
+        return self.roster.agents
+    
+    async def discover_agents(self):
+        """Build the roster from the shared registry plus a port scan, connecting concurrently
+        
+        Every registered instance joins unless --ports limits discovery to a
+        range, which is then always scanned.
+        """
+        registry = instance_registry.InstanceRegistry()
+        candidates = [(agent_roster.agent_name(endpoint), endpoint)
+                      for endpoint in (('tcp', '127.0.0.1', port) for port in self.ports or CLAUDE_PORTS)]
+        found = await instance_registry.discover(
+            registry, candidates,
+            lambda name, endpoint: nvim_rpc.RpcClient.connect(endpoint, name),
+            rescan=self.rescan or self.ports is not None, fixed=self.ports is not None)
+        entries = registry.load()['instances']
+        duplicates = []
+        for _, endpoint, nvim in found:
+            name = agent_roster.agent_name(endpoint)
+            if name in self.roster:
+                duplicates.append(nvim)   # e.g. registered as both localhost and 127.0.0.1
+                continue
+            roles = entries.get(instance_registry.endpoint_key(endpoint), {}).get('roles', ())
+            self.roster.add(name, nvim, endpoint, roles)
+        self.roster.sort()
+        await asyncio.gather(*[nvim.close() for nvim in duplicates])
+        
+        if len(self.agents) <= LIST_LIMIT:
+            for name, info in self.agents.items():
+                roles = self.roster.roles(name)
+                print(f"✓ Connected to {name} ({where(info)})"
+                      + (f" {' '.join('@' + role for role in roles)}" if roles else ""))
+        else:
+            groups = ', '.join(f"@{role} {len(members)}" for role, members in sorted(self.roster.groups.items())
+                               if members)
+            print(f"✓ Connected to {len(self.agents)} agents" + (f" ({groups})" if groups else ""))
+        missing = [(name, endpoint) for name, endpoint in candidates if name not in self.roster]
+        if len(candidates) <= LIST_LIMIT:
+            for name, endpoint in missing:
+                print(f"✗ {name} (Port {endpoint[2]}): not running")
+        elif missing:
+            print(f"✗ {len(missing)} of {len(candidates)} scanned ports not answering")
     
-    def broadcast_command(self, cmd, exclude=None):
-        """Send command to all agents except excluded one"""
+    async def close(self):
+        """Let queued commands finish, then close all agent connections"""
+        await self.queues.flush()
+        await self.queues.close()
+        await asyncio.gather(*[info['nvim'].close() for info in self.agents.values()])
+    
+    async def broadcast_command(self, cmd, exclude=None, targets=None):
+        """Send command to targets (default: all agents) except excluded ones"""
         exclude = exclude or []
         results = {}
+        names = [name for name in (self.agents if targets is None else targets) if name not in exclude]
+        verbose = len(names) <= LIST_LIMIT
         
-        for agent_name, agent_info in self.agents.items():
-            if agent_name in exclude:
-                continue
-                
-            try:
-                agent_info['nvim'].command(cmd)
+        def record(agent_name, reply, late=False):
+            suffix = " (late)" if late else ""
+            if isinstance(reply, Exception):
+                results[agent_name] = f"error: {reply}"
+                print(f"✗ {agent_name}: {reply}{suffix}")
+            else:
                 results[agent_name] = "success"
-                print(f"✓ {agent_name}: {cmd}")
-            except Exception as e:
-                results[agent_name] = f"error: {e}"
-                print(f"✗ {agent_name}: {e}")
+                if verbose:
+                    print(f"✓ {agent_name}: {cmd}{suffix}")
+        
+        # Queued per agent: a busy agent catches up without stalling the others
+        replies = await self.queues.fan_out(
+            {name: self.agents[name]['nvim'] for name in names}, 'nvim_command', cmd,
+            on_late=lambda name, reply: record(name, reply, late=True))
+        for agent_name in names:
+            if agent_name in replies:
+                record(agent_name, replies[agent_name])
+            else:
+                results[agent_name] = "queued"
+                if verbose:
+                    print(f"… {agent_name}: still queued (depth {self.queues.queues[agent_name].depth})")
+        if not verbose:
+            counts = {outcome: sum(1 for r in results.values() if r.startswith(outcome))
+                      for outcome in ('success', 'error', 'queued')}
+            print(f"✓ {cmd}: {counts['success']} agents"
+                  + (f", {counts['error']} failed" if counts['error'] else "")
+                  + (f", {counts['queued']} still queued" if counts['queued'] else ""))
         
         # Log command
         self.command_history.append({
@@ -60,7 +167,7 @@ class ClaudeAIController:
         
         return results
     
-    def sync_buffers(self, source_agent, target_agents=None):
+    async def sync_buffers(self, source_agent, target_agents=None):
         """Sync buffer content from source to targets"""
         if source_agent not in self.agents:
             print(f"Source agent {source_agent} not found")
@@ -69,24 +176,61 @@ class ClaudeAIController:
         if target_agents is None:
             target_agents = [name for name in self.agents.keys() if name != source_agent]
         
+        # Syncs of the same pair from other agents within the debounce window
+        # share one transfer of the latest state
+        def key(name):
+            return instance_registry.endpoint_key(self.agents[name]['endpoint'])
+        targets = [t for t in target_agents if t in self.agents]
+        outcome = await self.coordinator.sync(
+            key(source_agent), {t: key(t) for t in targets},
+            lambda names: self._sync_now(source_agent, names))
+        for target, result in outcome.items():
+            if result == 'coalesced':
+                print(f"  ≈ {source_agent} → {target}: covered by a concurrent sync")
+            elif result.startswith('error'):
+                print(f"  ✗ {source_agent} → {target}: {result[7:]}")
+        return True
+    
+    async def _sync_now(self, source_agent, target_agents):
+        """Push the source's current buffer to targets, sending only changed blocks"""
         try:
-            # Get content from source
-            source_content = self.agents[source_agent]['nvim'].current.buffer[:]
-            source_filename = self.agents[source_agent]['nvim'].current.buffer.name or "[No Name]"
+            source_nvim = self.agents[source_agent]['nvim']
+            source_fp = await self.fingerprint(source_agent)
+            source_filename = await source_nvim.request('nvim_buf_get_name', source_fp.bufnr) or "[No Name]"
+            fetched = {}
+            
+            def source_lines(start, end):
+                # Targets share one fetch per differing range
+                if (start, end) not in fetched:
+                    fetched[(start, end)] = asyncio.ensure_future(source_nvim.request(
+                        'nvim_buf_get_lines', source_fp.bufnr, start, end, False))
+                return fetched[(start, end)]
             
             print(f"📄 Syncing '{source_filename}' from {source_agent}")
             
             # Sync to targets
             sync_results = {}
-            for target in target_agents:
-                if target in self.agents:
-                    try:
-                        self.agents[target]['nvim'].current.buffer[:] = source_content
-                        sync_results[target] = "success"
-                        print(f"  ✓ {source_agent} → {target}")
-                    except Exception as e:
-                        sync_results[target] = f"error: {e}"
-                        print(f"  ✗ {source_agent} → {target}: {e}")
+            targets = [t for t in target_agents if t in self.agents]
+            verbose = len(targets) <= LIST_LIMIT
+            replies = await asyncio.gather(*[
+                self.push_blocks(target, source_fp, source_lines) for target in targets
+            ], return_exceptions=True)
+            for target, blocks in zip(targets, replies):
+                if isinstance(blocks, Exception):
+                    sync_results[target] = f"error: {blocks}"
+                    print(f"  ✗ {source_agent} → {target}: {blocks}")
+                elif blocks:
+                    sync_results[target] = "success"
+                    if verbose:
+                        print(f"  ✓ {source_agent} → {target} ({blocks} block ranges)")
+                else:
+                    sync_results[target] = "unchanged"
+                    if verbose:
+                        print(f"  = {source_agent} → {target}: already in sync")
+            if not verbose:
+                updated = sum(1 for r in sync_results.values() if r == 'success')
+                unchanged = sum(1 for r in sync_results.values() if r == 'unchanged')
+                print(f"  ✓ {source_agent} → {updated} agents updated, {unchanged} already in sync")
             
             # Log sync
             self.sync_log.append({
@@ -94,7 +238,7 @@ class ClaudeAIController:
                 'source': source_agent,
                 'targets': target_agents,
                 'filename': source_filename,
-                'lines': len(source_content),
+                'lines': source_fp.count,
                 'results': sync_results
             })
             
@@ -104,18 +248,55 @@ class ClaudeAIController:
             print(f"Sync failed: {e}")
             return False
     
-    def diff_agents(self, agent1, agent2):
+    async def fingerprint(self, agent_name):
+        """Block-hash an agent's current buffer inside Neovim"""
+        nvim = self.agents[agent_name]['nvim']
+        result = await self.helpers.call(agent_name, nvim, 'block_hashes',
+                                         *self.fingerprints.args(agent_name))
+        return self.fingerprints.update(agent_name, result)
+    
+    async def summary(self, agent_name):
+        """Line count, checksum and file name of an agent's current buffer"""
+        return await self.helpers.call(agent_name, self.agents[agent_name]['nvim'], 'summary', 0)
+    
+    async def push_blocks(self, target, source_fp, source_lines):
+        """Write only the blocks of target's current buffer that differ from source_fp
+
+        source_lines(start, end) returns an awaitable for the source's lines.
+        """
+        nvim = self.agents[target]['nvim']
+        target_fp = await self.fingerprint(target)
+        edits = block_sync.plan_edits(source_fp, target_fp, self.fingerprints.block_size)
+        if not edits:
+            return 0
+        chunks = await asyncio.gather(*[source_lines(s0, s1) for _, _, s0, s1 in edits])
+        calls = [('nvim_buf_set_lines', target_fp.bufnr, t0, t1, False, chunk)
+                 for (t0, t1, _, _), chunk in reversed(list(zip(edits, chunks)))]
+        calls.append(('nvim_buf_get_changedtick', target_fp.bufnr))
+        results = await nvim.pipeline(calls)
+        self.fingerprints.store(target, target_fp.bufnr, results[-1], source_fp)
+        return len(edits)
+    
+    async def diff_agents(self, agent1, agent2):
         """Compare buffer content between two agents"""
         if agent1 not in self.agents or agent2 not in self.agents:
             print("Invalid agent names")
             return
             
         try:
-            content1 = self.agents[agent1]['nvim'].current.buffer[:]
-            content2 = self.agents[agent2]['nvim'].current.buffer[:]
+            summary1, summary2 = await asyncio.gather(self.summary(agent1), self.summary(agent2))
+            if summary1['checksum'] == summary2['checksum']:
+                print(f"\n📊 Diff: {agent1} vs {agent2}")
+                print(f"  ✓ Files are identical ({summary1['count']} lines)")
+                return
+            
+            content1, content2 = await asyncio.gather(*[
+                self.agents[name]['nvim'].request('nvim_buf_get_lines', 0, 0, -1, False)
+                for name in (agent1, agent2)
+            ])
             
-            file1 = self.agents[agent1]['nvim'].current.buffer.name or f"[{agent1}]"
-            file2 = self.agents[agent2]['nvim'].current.buffer.name or f"[{agent2}]"
+            file1 = summary1['name'] or f"[{agent1}]"
+            file2 = summary2['name'] or f"[{agent2}]"
             
             print(f"\n📊 Diff: {agent1} vs {agent2}")
             print(f"File 1: {file1} ({len(content1)} lines)")
@@ -144,75 +325,172 @@ class ClaudeAIController:
         except Exception as e:
             print(f"Diff failed: {e}")
     
-    def create_collaboration_session(self, task_description):
-        """Set up a collaborative session between agents"""
+    async def create_collaboration_session(self, task_description):
+        """Open the session template in a collab://<task> scratch buffer of every agent at once"""
         print(f"\n🤝 Creating collaboration session: {task_description}")
         
-        # Create shared workspace file
-        workspace_content = [
-            f"# Claude AI Orchestra Collaboration Session",
-            f"# Task: {task_description}",
-            f"# Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            f"# Agents: {', '.join(self.agents.keys())}",
-            "",
-            "## Agent Assignments:",
-            "# Claude1: [Your role here]",
-            "# Claude2: [Your role here]", 
-            "# Claude3: [Your role here]",
-            "",
-            "## Collaboration Notes:",
-            "# Use comments to communicate between agents",
-            "# Sync changes with: sync <source> <targets>",
-            "",
-            "## Task Progress:",
-            "# [ ] Step 1:",
-            "# [ ] Step 2:",
-            "# [ ] Step 3:",
-            "",
-        ]
+        names = list(self.agents)
+        lines, cached = self.templates.get(task_description,
+                                           [(name, self.roster.roles(name)) for name in names])
+        buffer = collab_session.buffer_name(task_description)
         
-        # Load workspace in all agents
-        for agent_name, agent_info in self.agents.items():
-            try:
-                agent_info['nvim'].current.buffer[:] = workspace_content
-                print(f"  ✓ Workspace loaded in {agent_name}")
-            except Exception as e:
-                print(f"  ✗ Failed to load workspace in {agent_name}: {e}")
+        # One Lua call per agent, all in flight together: one round trip in total
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            self.agents[name]['nvim'].request('nvim_exec_lua', collab_session.SESSION_BUFFER_LUA,
+                                              [buffer, lines])
+            for name in names
+        ], return_exceptions=True)
+        elapsed = (time.perf_counter() - started) * 1000
         
-        print(f"🚀 Collaboration session ready!")
-        print(f"   Use 'sync claude1 claude2,claude3' to share changes")
-        print(f"   Use 'broadcast :w' to save all agents")
+        verbose = len(names) <= LIST_LIMIT
+        for agent_name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f"  ✗ Failed to open {buffer} in {agent_name}: {result}")
+            elif verbose:
+                print(f"  ✓ {buffer} loaded in {agent_name}" if result[1]
+                      else f"  = {buffer} already open in {agent_name}")
+        ready = [result for result in results if not isinstance(result, Exception)]
+        updated = sum(1 for result in ready if result[1])
+        
+        print(f"🚀 Collaboration session ready in {len(ready)} agents "
+              f"({updated} updated, template {'cached' if cached else 'rendered'}, {elapsed:.0f}ms)")
+        if names:
+            print(f"   Use 'sync {names[0]} <targets|@group>' to share changes")
+        print(f"   Use 'broadcast :wa' to save all agents")
     
-    def show_status(self):
-        """Show status of all agents and recent activity"""
+    async def show_status(self, names=None):
+        """Show status of agents (default: all) and recent activity"""
         print(f"\n🎭 Claude AI Orchestra Status")
         print("=" * 50)
         
-        print(f"\n📱 Agents ({len(self.agents)} active):")
-        for agent_name, agent_info in self.agents.items():
-            try:
-                current_file = agent_info['nvim'].current.buffer.name or "[No Name]"
-                line_count = len(agent_info['nvim'].current.buffer[:])
-                print(f"  ✓ {agent_name} (Port {agent_info['port']}): {current_file} ({line_count} lines)")
-            except:
-                print(f"  ✗ {agent_name} (Port {agent_info['port']}): Connection lost")
+        names = list(self.agents) if names is None else names
+        summaries = await asyncio.gather(*[self.summary(name) for name in names], return_exceptions=True)
+        lost = [name for name, summary in zip(names, summaries) if isinstance(summary, Exception)]
+        print(f"\n📱 Agents ({len(names) - len(lost)} active"
+              + (f" of {len(self.agents)}" if len(names) < len(self.agents) else "") + "):")
+        for agent_name, summary in zip(names, summaries):
+            agent_info = self.agents[agent_name]
+            if isinstance(summary, Exception):
+                print(f"  ✗ {agent_name} ({where(agent_info)}): Connection lost")
+            elif len(names) <= LIST_LIMIT:
+                current_file = summary['name'] or "[No Name]"
+                line_count = summary['count']
+                queue = self.queues.queues.get(agent_name)
+                backlog = f", queue {queue.depth}" if queue is not None else ""
+                print(f"  ✓ {agent_name} ({where(agent_info)}): {current_file} ({line_count} lines{backlog})")
+        if len(names) > LIST_LIMIT:
+            print(f"  … {len(names) - len(lost)} agents answering; 'status @group' lists a group")
+        groups = [(role, members) for role, members in sorted(self.roster.groups.items()) if members]
+        if groups:
+            print(f"\n👥 Groups: " + ", ".join(f"@{role} ({len(members)})" for role, members in groups))
         
         print(f"\n📋 Recent Commands ({len(self.command_history)}):")
         for cmd in self.command_history[-3:]:
             timestamp = cmd['timestamp'].split('T')[1][:8]
             print(f"  [{timestamp}] {cmd['command']}")
         
-        print(f"\n🔄 Recent Syncs ({len(self.sync_log)}):")
+        stats = self.coordinator.stats()
+        print(f"\n🔄 Recent Syncs ({len(self.sync_log)}; {stats['requested']} requested, "
+              f"{stats['performed']} transfers, coalescing ratio {stats['ratio']}x):")
         for sync in self.sync_log[-3:]:
             timestamp = sync['timestamp'].split('T')[1][:8]
             print(f"  [{timestamp}] {sync['source']} → {len(sync['targets'])} agents")
     
+    async def execute(self, parts):
+        """Run one controller command; returns False when the user asks to exit"""
+        try:
+            return await self._execute(parts)
+        except agent_roster.RosterError as e:
+            print(f"✗ {e}")
+            return True
+    
+    async def _execute(self, parts):
+        cmd = parts[0].lower()
+        
+        if cmd == "broadcast":
+            # An optional first argument addresses agents: @reviewers, claude1,claude4
+            if len(parts) > 2 and (parts[1].startswith('@') or self.roster.is_target(parts[1])):
+                await self.broadcast_command(' '.join(parts[2:]), targets=self.roster.resolve(parts[1]))
+            elif len(parts) > 1:
+                await self.broadcast_command(' '.join(parts[1:]))
+            else:
+                print("Usage: broadcast [@group|agents] <vim_command>")
+        
+        elif cmd == "sync":
+            if len(parts) >= 2:
+                source = parts[1]
+                targets = self.roster.resolve(parts[2], exclude=[source]) if len(parts) > 2 else None
+                await self.sync_buffers(source, targets)
+            else:
+                print("Usage: sync <source_agent> [targets|@group]")
+        
+        elif cmd == "diff":
+            if len(parts) >= 3:
+                await self.diff_agents(parts[1], parts[2])
+            else:
+                print("Usage: diff <agent1> <agent2>")
+        
+        elif cmd == "collab":
+            description = (' '.join(parts[1:]) if len(parts) > 1
+                           else self.context.get('task') or "General collaboration")
+            await self.create_collaboration_session(description)
+        
+        elif cmd == "status":
+            await self.show_status(self.roster.resolve(parts[1]) if len(parts) > 1 else None)
+        
+        elif cmd == "roles":
+            if not self.roster.groups:
+                print("No role groups yet. Create one with: assign <role> <agents|@group>")
+            for role, members in sorted(self.roster.groups.items()):
+                names = sorted(members, key=agent_roster.sort_key)
+                listing = ', '.join(names[:LIST_LIMIT]) + (f", … (+{len(names) - LIST_LIMIT})"
+                                                          if len(names) > LIST_LIMIT else "")
+                print(f"  @{role} ({len(names)}): {listing or '-'}")
+        
+        elif cmd in ("assign", "unassign"):
+            if len(parts) >= 3:
+                role = parts[1].lstrip('@')
+                names = self.roster.resolve(parts[2])
+                if cmd == "assign":
+                    self.roster.assign(role, names)
+                    print(f"✓ @{role}: added {len(names)} agents ({len(self.roster.groups[role])} members)")
+                else:
+                    self.roster.unassign(role, names)
+                    print(f"✓ @{role}: removed {len(names)} agents ({len(self.roster.groups.get(role, ()))} members)")
+            else:
+                print(f"Usage: {cmd} <role> <agents|@group>")
+        
+        elif cmd == "help":
+            print("\nAvailable commands:")
+            print("  broadcast :w              - Save all files")
+            print("  broadcast :echo 'hello'   - Echo in all agents")
+            print("  broadcast @reviewers :w   - Only agents in a role group")
+            print("  sync claude1 claude2      - Copy claude1 to claude2")
+            print("  sync claude1 @reviewers   - Copy claude1 to a group")
+            print("  sync claude1              - Copy claude1 to all others")
+            print("  diff claude1 claude2      - Compare two agents")
+            print("  collab 'build web app'    - Start collaboration")
+            print("  status [@group]           - Show detailed status")
+            print("  assign reviewers claude2,claude5 - Add agents to @reviewers")
+            print("  unassign reviewers claude5       - Remove agents from @reviewers")
+            print("  roles                     - List role groups")
+        
+        elif cmd == "exit":
+            print("👋 Exiting Claude AI Orchestra Controller")
+            return False
+            
+        else:
+            print(f"Unknown command: {cmd}. Type 'help' for available commands.")
+        return True
+    
     async def run_interactive(self):
         """Run interactive command interface"""
         print("\n🎮 Claude AI Orchestra Controller")
         print("=" * 50)
         
-        self.discover_agents()
+        await self.discover_agents()
+        TIMER.mark('connect')
         
         if not self.agents:
             print("❌ No Claude agents found! Start the orchestra first.")
@@ -220,76 +498,79 @@ class ClaudeAIController:
         
         print(f"\n✅ {len(self.agents)} agents connected!")
         print("\nCommands:")
-        print("  broadcast <cmd>           - Send command to all agents")
+        print("  broadcast [@group] <cmd>  - Send command to all agents (or a group)")
         print("  sync <source> [targets]   - Sync buffer content")
         print("  diff <agent1> <agent2>    - Compare agent buffers")
         print("  collab <description>      - Start collaboration session")
-        print("  status                    - Show agent status")
+        print("  status [@group]           - Show agent status")
+        print("  assign <role> <agents>    - Group agents by role (roles to list)")
         print("  help                      - Show commands")
         print("  exit                      - Exit controller")
         
         while True:
             try:
-                line = input("\n🎭 > ").strip()
+                line = (await nvim_rpc.ainput("\n🎭 > ")).strip()
                 if not line:
                     continue
-                    
-                parts = line.split()
-                cmd = parts[0].lower()
-                
-                if cmd == "broadcast":
-                    if len(parts) > 1:
-                        self.broadcast_command(' '.join(parts[1:]))
-                    else:
-                        print("Usage: broadcast <vim_command>")
-                
-                elif cmd == "sync":
-                    if len(parts) >= 2:
-                        source = parts[1]
-                        targets = parts[2].split(',') if len(parts) > 2 else None
-                        self.sync_buffers(source, targets)
-                    else:
-                        print("Usage: sync <source_agent> [target1,target2,...]")
-                
-                elif cmd == "diff":
-                    if len(parts) >= 3:
-                        self.diff_agents(parts[1], parts[2])
-                    else:
-                        print("Usage: diff <agent1> <agent2>")
-                
-                elif cmd == "collab":
-                    description = ' '.join(parts[1:]) if len(parts) > 1 else "General collaboration"
-                    self.create_collaboration_session(description)
-                
-                elif cmd == "status":
-                    self.show_status()
-                
-                elif cmd == "help":
-                    print("\nAvailable commands:")
-                    print("  broadcast :w              - Save all files")
-                    print("  broadcast :echo 'hello'   - Echo in all agents")
-                    print("  sync claude1 claude2      - Copy claude1 to claude2")
-                    print("  sync claude1              - Copy claude1 to all others")
-                    print("  diff claude1 claude2      - Compare two agents")
-                    print("  collab 'build web app'    - Start collaboration")
-                    print("  status                    - Show detailed status")
-                
-                elif cmd == "exit":
-                    print("👋 Exiting Claude AI Orchestra Controller")
+                if not await self.execute(line.split()):
                     break
                     
-                else:
-                    print(f"Unknown command: {cmd}. Type 'help' for available commands.")
-                    
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
                 print("\n👋 Exiting...")
                 break
             except Exception as e:
                 print(f"Error: {e}")
+    
+    async def run_once(self, parts):
+        """Run a single command from argv (used by the MCP server)"""
+        if parts[0].lower() == "help":
+            await self.execute(parts)    # needs no agents
+            return
+        await self.discover_agents()
+        TIMER.mark('connect')
+        if not self.agents:
+            print("❌ No Claude agents found! Start the orchestra first.")
+            return
+        await self.execute(parts)
+
+async def run(args):
+    controller = ClaudeAIController(ports=args.ports, rescan=args.rescan, context=args.context)
+    try:
+        if args.command:
+            await controller.run_once(args.command)
+        else:
+            await controller.run_interactive()
+    finally:
+        await controller.close()
+
+def parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='claude_ai_controller.py',
+                                     description='Command and sync Claude AI agents')
+    parser.add_argument('command', nargs='*',
+                        help='Run one command (e.g. status, broadcast :w) instead of the REPL')
+    parser.add_argument('--ports', type=port_list, metavar='FIRST-LAST',
+                        help='Scan only these ports for agents (e.g. 7777-7999) instead of '
+                             'the registry plus 7777-7779')
+    parser.add_argument('--rescan', action='store_true',
+                        help='Scan ports even if the instance registry is fresh')
+    parser.add_argument('--context', type=context_object,
+                        help="JSON object from the MCP server; its 'task' names a collab "
+                             "session started without a description")
+    parser.add_argument('--timing', action='store_true',
+                        help='Report import and startup time on stderr')
+    return parser.parse_args(argv)
 
 def main():
-    controller = ClaudeAIController()
-    asyncio.run(controller.run_interactive())
+    args = parse_args(sys.argv[1:])
+    TIMER.mark('startup')
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+    TIMER.mark('command')
+    if args.timing:
+        TIMER.report()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Collaboration session bootstrap for the Claude AI controller
+
+A session used to overwrite each agent's current buffer with the workspace
+template. Now every agent gets a dedicated collab://<task> scratch buffer,
+filled and shown by one Lua call that Neovim runs without interleaving other
+requests, so an agent never sees a half-written template and whatever it had
+open stays in its buffer list. All agents are sent their call at once, so
+starting a session costs one round trip however many agents take part.
+
+Rendered templates are cached by task in
+~/.config/nvim/orchestra/collab_templates.json: restarting a session for the
+same task and roster reuses the same lines (and start time), and agents
+already showing them are left untouched.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from instance_registry import ORCHESTRA_DIR
+
+TEMPLATE_FILE = os.path.join(ORCHESTRA_DIR, 'collab_templates.json')
+MAX_TEMPLATES = 64       # cached tasks, least recently used dropped first
+
+# Show `lines` in the session's scratch buffer, creating it on first use;
+# returns {bufnr, changed}
+SESSION_BUFFER_LUA = """
+local name, lines = ...
+OrchestraCollab = OrchestraCollab or {}
+local buf = OrchestraCollab[name]
+if not (buf and vim.api.nvim_buf_is_valid(buf)) then
+  buf = vim.api.nvim_create_buf(true, true)
+  vim.api.nvim_buf_set_name(buf, name)
+  vim.bo[buf].filetype = 'markdown'
+  OrchestraCollab[name] = buf
+end
+local changed = not vim.deep_equal(vim.api.nvim_buf_get_lines(buf, 0, -1, false), lines)
+if changed then
+  vim.api.nvim_buf_set_lines(buf, 0, -1, false, lines)
+end
+vim.api.nvim_set_current_buf(buf)
+return {buf, changed}
+"""
+
+
+def buffer_name(task: str) -> str:
+    return f"collab://{task}"
+
+
+def render(task: str, agents: List[Tuple[str, List[str]]], started: str) -> List[str]:
+    """The workspace template for task and (agent, roles) pairs"""
+    return [
+        "# Claude AI Orchestra Collaboration Session",
+        f"# Task: {task}",
+        f"# Started: {started}",
+        f"# Agents: {', '.join(name for name, _ in agents)}",
+        "",
+        "## Agent Assignments:",
+        *[f"# {name}{''.join(' @' + role for role in roles)}: [Your role here]"
+          for name, roles in agents],
+        "",
+        "## Collaboration Notes:",
+        "# Use comments to communicate between agents",
+        "# Sync changes with: sync <source> <targets>",
+        "",
+        "## Task Progress:",
+        "# [ ] Step 1:",
+        "# [ ] Step 2:",
+        "# [ ] Step 3:",
+        "",
+    ]
+
+
+class TemplateCache:
+    """Rendered templates by task, kept while the roster they list is unchanged"""
+
+    def __init__(self, path: str = TEMPLATE_FILE):
+        self.path = path
+        self.entries = None
+
+    def _load(self) -> Dict:
+        if self.entries is None:
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+    def get(self, task: str, agents: List[Tuple[str, List[str]]]) -> Tuple[List[str], bool]:
+        """(lines, cached) for task; renders and stores them on a miss"""
+        entries = self._load()
+        signature = hashlib.sha1(json.dumps(agents).encode()).hexdigest()
+        entry = entries.pop(task, None)
+        cached = entry is not None and entry['agents'] == signature
+        if not cached:
+            # A changed roster re-renders, but the session keeps its start time
+            started = entry['started'] if entry else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            entry = {'agents': signature, 'started': started,
+                     'lines': render(task, agents, started)}
+        entries[task] = entry      # most recently used last
+        while len(entries) > MAX_TEMPLATES:
+            del entries[next(iter(entries))]
+        self._save()
+        return entry['lines'], cached
@@ -1,60 +1,513 @@
 #!/usr/bin/env python3
-"""Neovim Orchestrator - Control multiple Neovim instances"""
+"""Neovim Orchestrator - Control multiple Neovim instances
+
+Everything runs on one long-lived asyncio loop: each instance is a pipelined
+RpcClient, so operations across instances are awaitable, cancellable and
+multiplexed without a thread per instance.
+"""
 
-import asyncio
-import pynvim
-from typing import Dict, List
 import os
+import re
+import sys
 import json
+from typing import Dict, List
+from orchestra_cli import StartupTimer, lazy_import
+
+TIMER = StartupTimer()
+
+# Deferred until first use so `help` and argument errors return instantly
+asyncio = lazy_import('asyncio')
+nvim_rpc = lazy_import('nvim_rpc')
+block_sync = lazy_import('block_sync')
+orchestra_lua = lazy_import('orchestra_lua')
+instance_registry = lazy_import('instance_registry')
+instance_watcher = lazy_import('instance_watcher')
+nvim_relay = lazy_import('nvim_relay')
+send_queue = lazy_import('send_queue')
+sync_coordinator = lazy_import('sync_coordinator')
+collab_crdt = lazy_import('collab_crdt')
+snapshot = lazy_import('snapshot')
+
+ORCHESTRA_DIR = os.path.expanduser('~/.config/nvim/orchestra')
+TCP_PORTS = range(7777, 7787)
+SOCKET_PATHS = ['/tmp/nvim', '/tmp/nvim-automation.sock']
+MACROS_FILE = os.path.join(ORCHESTRA_DIR, 'macros.json')
+
+# Runs a compiled macro inside Neovim as a single request. If any command
+# fails, every buffer the macro changed (including ones it opened) is undone
+# to where it started and the starting buffer is shown again, so an instance
+# either applies the whole macro or none of it.
+MACRO_LUA = """
+local cmds = ...
+local start = vim.api.nvim_get_current_buf()
+local before = {}
+for _, b in ipairs(vim.api.nvim_list_bufs()) do
+  if vim.api.nvim_buf_is_loaded(b) then
+    before[b] = {vim.api.nvim_buf_get_changedtick(b), vim.api.nvim_buf_call(b, vim.fn.changenr)}
+  end
+end
+for i, cmd in ipairs(cmds) do
+  local ok, err = pcall(vim.cmd, cmd)
+  if not ok then
+    for _, b in ipairs(vim.api.nvim_list_bufs()) do
+      local was = before[b]
+      if vim.api.nvim_buf_is_loaded(b)
+          and (not was or vim.api.nvim_buf_get_changedtick(b) ~= was[1]) then
+        local seq = was and was[2] or 0
+        pcall(vim.api.nvim_buf_call, b, function() vim.cmd('silent undo ' .. seq) end)
+      end
+    end
+    if vim.api.nvim_buf_is_valid(start) then
+      vim.api.nvim_set_current_buf(start)
+    end
+    return {i, tostring(err)}
+  end
+end
+return {}
+"""
+
+MACRO_PARAM = re.compile(r'\$\{(\w+)\}')
+
+
+def fnameescape(path):
+    """Python equivalent of Vim's fnameescape() for use in Ex commands"""
+    return re.sub(r'([ \t\n*?\[{`$\\%#\'"|!<])', r'\\\1', path)
+
+
+def endpoint_for(name):
+    """Endpoint for an instance name: 'nvim-7777', '7777', 'host:port' or a socket path"""
+    if name.startswith('nvim-') and name[5:].isdigit():
+        return ('tcp', '127.0.0.1', int(name[5:]))
+    return nvim_rpc.parse_endpoint(name)
+
 
 class NeovimOrchestrator:
-    def __init__(self):
-        self.instances = {}
-        self.discover_instances()
-        self.macros = {}
-    
-    def discover_instances(self):
-        """Find all running Neovim instances"""
-        sockets = []
-        # Check TCP ports
-        for port in range(7777, 7787):
-            try:
-                nvim = pynvim.attach('tcp', address='127.0.0.1', port=port)
-                self.instances[f'nvim-{port}'] = nvim
-                print(f"Found Neovim on port {port}")
-            except:
-                pass
-        
-        # Check Unix sockets
-        for socket in ['/tmp/nvim', '/tmp/nvim-automation.sock']:
-            if os.path.exists(socket):
-                try:
-                    nvim = pynvim.attach('socket', path=socket)
-                    self.instances[socket] = nvim
-                    print(f"Found Neovim on socket {socket}")
-                except:
-                    pass
+    def __init__(self, queue_options=None):
+        self.instances: Dict[str, 'nvim_rpc.RpcClient'] = {}
+        self.endpoints = {}
+        self.relays = []
+        self.relay_token = None    # else $ORCHESTRA_RELAY_TOKEN
+        self.source_ticks = {}   # (source, target, path) -> changedtick last synced
+        self.fingerprints = block_sync.FingerprintCache()
+        self.helpers = orchestra_lua.LuaHelpers()
+        self.registry = instance_registry.InstanceRegistry()
+        self.queues = send_queue.QueueSet(**(queue_options or {}))
+        self.coordinator = sync_coordinator.SyncCoordinator()
+        self.collab = None
+        self.macros = self.load_macros()
+    
+    async def connect(self, name, endpoint):
+        """Open a pipelined connection to one instance and register it"""
+        if name in self.instances and not self.instances[name].closed:
+            return self.instances[name]
+        client = await nvim_rpc.RpcClient.connect(endpoint, name)
+        self.instances[name] = client
+        self.endpoints[name] = endpoint
+        return client
+    
+    async def discover_instances(self, rescan=False, ports=None):
+        """Find all running Neovim instances, starting from the shared registry
+        
+        With `ports` only those ports are considered (e.g. a relay that owns
+        part of a machine's instances).
+        """
+        candidates = [(f'nvim-{port}', ('tcp', '127.0.0.1', port)) for port in ports or TCP_PORTS]
+        if ports is None:
+            candidates += [(path, ('socket', path)) for path in SOCKET_PATHS if os.path.exists(path)]
+        
+        # Registered instances are probed first; the full scan only runs when
+        # the registry is stale or none of its entries answer
+        found = await instance_registry.discover(self.registry, candidates, self.connect,
+                                                 rescan, fixed=ports is not None)
+        for name, endpoint, _ in found:
+            where = f"port {endpoint[2]}" if endpoint[0] == 'tcp' else f"socket {endpoint[1]}"
+            print(f"Found Neovim on {where}")
+    
+    async def connect_only(self, names):
+        """Connect just the named instances instead of scanning for all of them"""
+        names = [n for n in names if n not in self.instances]
+        registered = {e.get('name'): tuple(e['endpoint'])
+                      for e in self.registry.load()['instances'].values()}
+        results = await asyncio.gather(*[
+            self.connect(name, registered.get(name) or endpoint_for(name)) for name in names
+        ], return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f"✗ {name}: {result}")
+        alive = {instance_registry.endpoint_key(self.endpoints[n]): {'name': n, 'endpoint': list(self.endpoints[n])}
+                 for n in names if n in self.instances}
+        if alive:
+            self.registry.update(alive)
+    
+    async def connect_relay(self, address):
+        """Attach every instance a remote relay owns as 'host/instance'"""
+        relay = await nvim_relay.RelayClient.connect(address, self.relay_token)
+        self.relays.append(relay)
+        names = (await relay.hello())['instances']
+        for instance in names:
+            name = f"{relay.host}/{instance}"
+            self.instances[name] = relay.proxy(instance)
+            self.endpoints[name] = ('relay', relay.endpoint[1], relay.endpoint[2], instance)
+        print(f"Found {len(names)} Neovim instances via relay {relay.host}")
+    
+    async def watch(self, interval=None, live=False):
+        """Keep the registry current from socket events and a slow port sweep
+        
+        With live=True instances that appear are connected and ones that vanish
+        are dropped, so a running REPL follows them without a rescan.
+        """
+        def added(name, endpoint):
+            print(f"+ {name}")
+            if live:
+                task = asyncio.ensure_future(self.connect(name, endpoint))
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        
+        def removed(name):
+            print(f"- {name}")
+            if live and name in self.instances:
+                asyncio.ensure_future(self.instances[name].close())
+                self.drop(name)
+        
+        def connected():
+            return {instance_registry.endpoint_key(self.endpoints[name])
+                    for name, client in self.instances.items() if not client.closed}
+        
+        watcher = instance_watcher.InstanceWatcher(
+            self.registry, TCP_PORTS, SOCKET_PATHS,
+            interval or instance_watcher.SWEEP_INTERVAL, added, removed,
+            connected if live else None)
+        await watcher.run()
+    
+    def drop(self, name):
+        """Forget an instance whose connection was lost"""
+        self.instances.pop(name, None)
+        queue = self.queues.queues.pop(name, None)
+        if queue is not None:
+            asyncio.ensure_future(queue.close())
+        self.helpers.forget(name)
+        self.fingerprints.forget(name)
+    
+    async def close(self):
+        """Let queued commands finish (for a while), then close every connection"""
+        await self.stop_collab()
+        if not await self.queues.flush(send_queue.FLUSH_TIMEOUT):
+            print(f"✗ Dropping {self.queues.pending()} commands still queued for slow instances")
+        await self.queues.close()
+        await asyncio.gather(*[client.close() for client in self.instances.values()])
+        await asyncio.gather(*[relay.close() for relay in self.relays])
     
     async def broadcast_command(self, cmd):
-        """Send command to all Neovim instances"""
-        for name, nvim in self.instances.items():
-            try:
-                nvim.command(cmd)
-                print(f"✓ {name}: {cmd}")
-            except Exception as e:
-                print(f"✗ {name}: {e}")
+        """Send command to all Neovim instances through their send queues"""
+        def report(name, result, late=False):
+            suffix = " (late)" if late else ""
+            if isinstance(result, Exception):
+                print(f"✗ {name}: {result}{suffix}")
+            else:
+                print(f"✓ {name}: {cmd}{suffix}")
+        
+        results = await self.queues.fan_out(
+            dict(self.instances), 'nvim_command', cmd,
+            on_late=lambda name, result: report(name, result, late=True))
+        self._report_fan_out(list(self.instances), results, report)
+    
+    def _report_fan_out(self, names, results, report):
+        """Print answers that arrived in time and the queue depth of the rest"""
+        for name in names:
+            if name in results:
+                report(name, results[name])
+            elif name in self.queues.queues:
+                print(f"… {name}: still queued (depth {self.queues.queues[name].depth})")
+    
+    async def bulk_open(self, name, paths):
+        """Add many files to an instance's buffer list in one pipelined burst"""
+        results = await self.instances[name].pipeline(
+            [('nvim_command', f'badd {fnameescape(path)}') for path in paths],
+            return_exceptions=True
+        )
+        failed = [(p, r) for p, r in zip(paths, results) if isinstance(r, Exception)]
+        for path, error in failed:
+            print(f"✗ {name}: {path}: {error}")
+        print(f"✓ {name}: opened {len(paths) - len(failed)}/{len(paths)} files")
+    
+    async def buffer_info(self, name):
+        """Return (bufnr, name, line count) for every buffer of an instance"""
+        client = self.instances[name]
+        buffers = await client.request('nvim_list_bufs')
+        calls = []
+        for buf in buffers:
+            calls.append(('nvim_buf_get_name', buf))
+            calls.append(('nvim_buf_line_count', buf))
+        results = await client.pipeline(calls)
+        return [(buf.id, results[2 * i], results[2 * i + 1])
+                for i, buf in enumerate(buffers)]
+    
+    async def bulk_set_lines(self, name, contents):
+        """Replace the lines of many buffers ({buffer handle: lines}) in one burst"""
+        return await self.instances[name].pipeline(
+            [('nvim_buf_set_lines', buf, 0, -1, False, lines)
+             for buf, lines in contents.items()],
+            return_exceptions=True
+        )
+    
+    async def _listed_buffers(self, client):
+        """Return {path: (buffer, changedtick)} for listed, named buffers"""
+        buffers = await client.request('nvim_list_bufs')
+        calls = []
+        for buf in buffers:
+            calls.append(('nvim_get_option_value', 'buflisted', {'buf': buf.id}))
+            calls.append(('nvim_buf_get_name', buf))
+            calls.append(('nvim_buf_get_changedtick', buf))
+        results = await client.pipeline(calls)
+        listed = {}
+        for i, buf in enumerate(buffers):
+            is_listed, path, tick = results[3 * i:3 * i + 3]
+            if is_listed and path:
+                listed[path] = (buf, tick)
+        return listed
+    
+    async def _fingerprint(self, name, client, buffers):
+        """Block-hash buffers inside the instance, reusing cached hashes when unchanged"""
+        await self.helpers.ensure(name, client)
+        try:
+            results = await client.pipeline([self.fingerprints.request(name, b) for b in buffers])
+        except Exception as e:
+            if not orchestra_lua.is_missing(e):
+                raise
+            # Instance restarted since we injected the helpers
+            self.helpers.forget(name)
+            self.fingerprints.forget(name)
+            await self.helpers.ensure(name, client)
+            results = await client.pipeline([self.fingerprints.request(name, b) for b in buffers])
+        return [self.fingerprints.update(name, r) for r in results]
+    
+    async def _fetch_ranges(self, client, wanted):
+        """Fetch {(bufnr, start, end): lines} for the source ranges that differ somewhere"""
+        keys = sorted(wanted)
+        chunks = await client.pipeline(
+            [('nvim_buf_get_lines', bufnr, start, end, False) for bufnr, start, end in keys]
+        )
+        return dict(zip(keys, chunks))
+    
+    async def _push_blocks(self, target, client, plans, chunks):
+        """Apply planned block edits [(target bufnr, source fp, edits)] to one target"""
+        calls = []
+        for bufnr, src_fp, edits in plans:
+            for t0, t1, s0, s1 in reversed(edits):
+                calls.append(('nvim_buf_set_lines', bufnr, t0, t1, False,
+                              chunks[(src_fp.bufnr, s0, s1)]))
+            calls.append(('nvim_buf_get_changedtick', bufnr))
+        results = await client.pipeline(calls)
+        
+        index = 0
+        for bufnr, src_fp, edits in plans:
+            index += len(edits)
+            self.fingerprints.store(target, bufnr, results[index], src_fp)
+            index += 1
+        return sum(len(edits) for _, _, edits in plans)
     
     async def sync_buffers(self, source, targets):
-        """Sync buffer content across instances"""
+        """Sync the current buffer of source to targets, coalescing concurrent requests"""
         if source not in self.instances:
             print(f"Source {source} not found")
             return
-            
-        content = self.instances[source].current.buffer[:]
-        for target in targets:
-            if target in self.instances:
-                self.instances[target].current.buffer[:] = content
-                print(f"✓ Synced {source} -> {target}")
+        targets = [t for t in targets if t in self.instances and t != source]
+        key = instance_registry.endpoint_key
+        outcome = await self.coordinator.sync(
+            key(self.endpoints[source]), {t: key(self.endpoints[t]) for t in targets},
+            lambda names: self._sync_current(source, names))
+        for target, result in outcome.items():
+            if result == 'coalesced':
+                print(f"≈ {source} -> {target}: covered by a concurrent sync")
+            elif result.startswith('error'):
+                print(f"✗ {source} -> {target}: {result[7:]}")
+    
+    async def _sync_current(self, source, targets):
+        """Sync the current buffer of source to targets, sending only changed blocks"""
+        clients = self.instances
+        
+        async def plan(target):
+            [dst_fp] = await self._fingerprint(target, clients[target], [0])
+            return dst_fp, block_sync.plan_edits(src_fp, dst_fp, self.fingerprints.block_size)
+        
+        [src_fp] = await self._fingerprint(source, clients[source], [0])
+        plans = dict(zip(targets, await asyncio.gather(*[plan(t) for t in targets])))
+        wanted = {(src_fp.bufnr, s0, s1)
+                  for _, edits in plans.values() for _, _, s0, s1 in edits}
+        chunks = await self._fetch_ranges(clients[source], wanted)
+        
+        async def push(target):
+            dst_fp, edits = plans[target]
+            if not edits:
+                return 0
+            return await self._push_blocks(
+                target, clients[target], [(dst_fp.bufnr, src_fp, edits)], chunks
+            )
+        
+        results = await asyncio.gather(*[push(t) for t in targets], return_exceptions=True)
+        
+        for target, result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"✗ {source} -> {target}: {result}")
+            elif result == 0:
+                print(f"= {source} -> {target}: already in sync")
+            else:
+                print(f"✓ Synced {source} -> {target} ({result} block ranges)")
+    
+    async def save_snapshot(self, name, path):
+        """Write every listed buffer of an instance to a snapshot file"""
+        if name not in self.instances:
+            print(f"✗ Instance '{name}' not found")
+            return
+        snap = await snapshot.capture(self.helpers, name, self.instances[name],
+                                      size=self.fingerprints.block_size)
+        written = snap.save(path)
+        stats = snap.stats()
+        print(f"✓ {name} -> {path}: {stats['files']} files, {stats['lines']} lines, "
+              f"{stats['unique_blocks']}/{stats['blocks']} unique blocks, {written} bytes")
+    
+    async def restore_snapshot(self, snap, targets, inventories=None, fetch=None):
+        """Bring targets' buffers in line with a snapshot, skipping blocks they already hold"""
+        targets = [t for t in targets if t in self.instances]
+        inventories = inventories or {}
+        results = await asyncio.gather(*[
+            snapshot.restore(self.helpers, t, self.instances[t], snap, inventories.get(t), fetch)
+            for t in targets
+        ], return_exceptions=True)
+        for target, result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"✗ {target}: {result}")
+            elif not result['changed']:
+                print(f"= {target}: all {result['files']} files already match")
+            else:
+                print(f"✓ {target}: {result['changed']}/{result['files']} files updated, "
+                      f"{result['blocks_sent']} blocks ({result['bytes_sent']} bytes) sent")
+    
+    async def copy_workspace(self, source, targets):
+        """Bootstrap targets with source's listed buffers as one content-addressed snapshot
+        
+        Only blocks missing from at least one target leave the source.
+        """
+        if source not in self.instances:
+            print(f"Source {source} not found")
+            return
+        targets = [t for t in targets if t in self.instances and t != source]
+        size = self.fingerprints.block_size
+        found = await asyncio.gather(*[
+            snapshot.inventory(self.helpers, t, self.instances[t], size) for t in targets
+        ], return_exceptions=True)
+        inventories = {t: have for t, have in zip(targets, found) if not isinstance(have, Exception)}
+        common = set.intersection(*inventories.values()) if inventories else set()
+        snap = await snapshot.capture(self.helpers, source, self.instances[source],
+                                      have=common, size=size)
+        stats = snap.stats()
+        print(f"📦 {source}: {stats['files']} files, {stats['blocks']} blocks, "
+              f"{stats['unique_blocks']} fetched")
+        for target, error in zip(targets, found):
+            if isinstance(error, Exception):
+                print(f"✗ {target}: {error}")
+
+        async def fetch(hashes):
+            # Blocks left out because every target held them, until one of them lost some
+            again = await snapshot.capture(self.helpers, source, self.instances[source],
+                                           list(snap.files), size=size)
+            return {h: again.blocks[h] for h in hashes if h in again.blocks}
+
+        await self.restore_snapshot(snap, list(inventories), inventories, fetch)
+    
+    async def start_collab(self, source, targets):
+        """Share source's current buffer with targets, merging everyone's edits as they type"""
+        names = [source] + [t for t in targets if t != source]
+        missing = [n for n in names if n not in self.instances]
+        if missing:
+            print(f"✗ Instance(s) not found: {', '.join(missing)}")
+            return
+        await self.stop_collab()
+        self.collab = collab_crdt.CollabSession()
+        await self.collab.start(source, names[1:], self.instances)
+        status = self.collab.status()
+        print(f"✓ Collaborating on {status['buffer']} ({status['lines']} lines) "
+              f"across {', '.join(status['instances'])}")
+    
+    async def stop_collab(self):
+        if self.collab is not None:
+            await self.collab.stop()
+            self.collab = None
+            print("✓ Collaboration stopped")
+    
+    async def _plan_workspace(self, target, client, files):
+        """Match source files to target buffers by path and plan their block edits"""
+        existing = await self._listed_buffers(client)
+        missing = [path for path in files if path not in existing]
+        created = await client.pipeline(
+            [('nvim_call_function', 'bufadd', [path]) for path in missing]
+        )
+        if missing:
+            calls = []
+            for path, bufnr in zip(missing, created):
+                calls.append(('nvim_call_function', 'bufload', [bufnr]))
+                calls.append(('nvim_set_option_value', 'buflisted', True, {'buf': bufnr}))
+            await client.pipeline(calls)
+        
+        matched = [path for path in files if path in existing]
+        dst_fps = await self._fingerprint(target, client, [existing[p][0] for p in matched])
+        plans = [(fp.bufnr, files[path], block_sync.plan_edits(files[path], fp, self.fingerprints.block_size))
+                 for path, fp in zip(matched, dst_fps)]
+        plans += [(bufnr, files[path], block_sync.plan_edits(files[path], block_sync.UNKNOWN, self.fingerprints.block_size))
+                  for path, bufnr in zip(missing, created)]
+        return [plan for plan in plans if plan[2]]
+    
+    async def sync_workspace(self, source, targets):
+        """Sync every listed buffer of source to targets, matched by file path"""
+        if source not in self.instances:
+            print(f"Source {source} not found")
+            return
+        targets = [t for t in targets if t in self.instances and t != source]
+        
+        clients = self.instances
+        
+        listed = await self._listed_buffers(clients[source])
+        # Each target remembers what it last received, so a new target gets everything
+        changed = {t: [path for path, (_, tick) in listed.items()
+                       if self.source_ticks.get((source, t, path)) != tick]
+                   for t in targets}
+        wanted_paths = set().union(*changed.values())
+        needed = [path for path in listed if path in wanted_paths]
+        fps = await self._fingerprint(source, clients[source],
+                                      [listed[p][0] for p in needed])
+        files = dict(zip(needed, fps))
+        
+        plans = await asyncio.gather(*[
+            self._plan_workspace(t, clients[t], {path: files[path] for path in changed[t]})
+            for t in targets
+        ], return_exceptions=True)
+        wanted = {(src_fp.bufnr, s0, s1)
+                  for plan in plans if not isinstance(plan, Exception)
+                  for _, src_fp, edits in plan for _, _, s0, s1 in edits}
+        chunks = await self._fetch_ranges(clients[source], wanted)
+        
+        async def push(target, plan):
+            if isinstance(plan, Exception):
+                raise plan
+            if plan:
+                await self._push_blocks(target, clients[target], plan, chunks)
+            return len(plan)
+        
+        results = await asyncio.gather(*[
+            push(t, plan) for t, plan in zip(targets, plans)
+        ], return_exceptions=True)
+        
+        # Only remember ticks for targets that now have the content
+        for target, result in zip(targets, results):
+            if not isinstance(result, Exception):
+                for path in changed[target]:
+                    self.source_ticks[(source, target, path)] = listed[path][1]
+        
+        print(f"📂 {source}: {len(listed)} buffers, {len(needed)} changed since last sync")
+        for target, result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"✗ {source} -> {target}: {result}")
+            else:
+                print(f"✓ Synced {result} buffers {source} -> {target}")
     
     async def orchestrate_split_view(self):
         """Create synchronized split view across instances"""
@@ -63,30 +516,84 @@ class NeovimOrchestrator:
             return
             
         instances = list(self.instances.values())
-        # Make first instance show file tree
-        instances[0].command('NvimTreeToggle')
-        # Make second instance show current file
-        instances[1].command('e %')
+        await asyncio.gather(
+            # Make first instance show file tree
+            instances[0].request('nvim_command', 'NvimTreeToggle'),
+            # Make second instance show current file
+            instances[1].request('nvim_command', 'e %'),
+        )
+    
+    def load_macros(self):
+        """Load persisted macros from the orchestra directory"""
+        try:
+            with open(MACROS_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_macros(self):
+        """Persist macros so they survive across orchestrator runs"""
+        os.makedirs(ORCHESTRA_DIR, exist_ok=True)
+        tmp = MACROS_FILE + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.macros, f, indent=2)
+        os.replace(tmp, MACROS_FILE)
     
     async def record_macro(self, name, commands):
         """Record a sequence of commands as a macro"""
         self.macros[name] = commands
-        print(f"✓ Macro '{name}' recorded with {len(commands)} commands")
+        self.save_macros()
+        params = sorted({p for cmd in commands for p in MACRO_PARAM.findall(cmd)})
+        suffix = f" (params: {', '.join(params)})" if params else ""
+        print(f"✓ Macro '{name}' recorded with {len(commands)} commands{suffix}")
+    
+    def compile_macro(self, name, params=None):
+        """Substitute ${param} placeholders and return the command batch"""
+        params = params or {}
+        
+        def substitute(match):
+            key = match.group(1)
+            if key not in params:
+                raise KeyError(f"Macro '{name}' needs parameter '{key}'")
+            return str(params[key])
+        
+        return [MACRO_PARAM.sub(substitute, cmd) for cmd in self.macros[name]]
     
-    async def play_macro(self, name, target='all'):
+    async def play_macro(self, name, target='all', params=None):
         """Play a recorded macro on target instances"""
         if name not in self.macros:
             print(f"✗ Macro '{name}' not found")
             return
-            
-        commands = self.macros[name]
+        
+        try:
+            commands = self.compile_macro(name, params)
+        except KeyError as e:
+            print(f"✗ {e.args[0]}")
+            return
+        
         if target == 'all':
-            for cmd in commands:
-                await self.broadcast_command(cmd)
+            names = list(self.instances)
+        elif target in self.instances:
+            names = [target]
         else:
-            if target in self.instances:
-                for cmd in commands:
-                    self.instances[target].command(cmd)
+            print(f"✗ Instance '{target}' not found")
+            return
+        
+        def report(inst, result, late=False):
+            suffix = " (late)" if late else ""
+            if isinstance(result, Exception):
+                print(f"✗ {inst}: {result}{suffix}")
+            elif result:
+                index, error = result
+                print(f"✗ {inst}: command {index} ({commands[index - 1]}) failed, rolled back: {error}{suffix}")
+            else:
+                print(f"✓ {inst}: macro '{name}' applied ({len(commands)} commands){suffix}")
+        
+        # One request per instance, queued so a busy instance cannot hold up the rest
+        results = await self.queues.fan_out(
+            {n: self.instances[n] for n in names}, 'nvim_exec_lua', MACRO_LUA, [commands],
+            on_late=lambda inst, result: report(inst, result, late=True))
+        self._report_fan_out(names, results, report)
     
     async def diff_instances(self, inst1, inst2):
         """Show diff between two instances' current buffers"""
@@ -94,13 +601,21 @@ class NeovimOrchestrator:
             print("Invalid instance names")
             return
             
-        # Get buffer contents
-        buf1 = self.instances[inst1].current.buffer[:]
-        buf2 = self.instances[inst2].current.buffer[:]
+        # Compare checksums computed inside Neovim before moving any text
+        summaries = await asyncio.gather(*[
+            self.helpers.call(name, self.instances[name], 'summary', 0) for name in (inst1, inst2)
+        ])
+        if summaries[0]['checksum'] == summaries[1]['checksum']:
+            print(f"✓ {inst1} and {inst2} are identical ({summaries[0]['count']} lines)")
+            return
+        
+        buf1, buf2 = await asyncio.gather(*[
+            self.instances[name].request('nvim_buf_get_lines', 0, 0, -1, False)
+            for name in (inst1, inst2)
+        ])
         
         # Create temp files and show diff
         import tempfile
-        import subprocess
         
         with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f1:
             f1.write('\n'.join(buf1))
@@ -110,68 +625,335 @@ class NeovimOrchestrator:
             f2.write('\n'.join(buf2))
             file2 = f2.name
             
-        subprocess.run(['diff', '--color=always', '-u', file1, file2])
+        proc = await asyncio.create_subprocess_exec('diff', '--color=always', '-u', file1, file2)
+        await proc.wait()
 
-if __name__ == "__main__":
-    import sys
-    orch = NeovimOrchestrator()
-    
-    if len(sys.argv) > 1:
-        cmd = ' '.join(sys.argv[1:])
-        asyncio.run(orch.broadcast_command(cmd))
-    else:
-        # Interactive mode
-        print("Neovim Orchestrator")
-        print("Commands: broadcast <cmd>, sync <source> <target1,target2>, split")
-        while True:
+
+def print_help():
+    print("\nCommands:")
+    print("  broadcast <cmd>     - Send command to all instances")
+    print("  sync <src> <targets> - Sync buffer from source to targets")
+    print("  wsync <src> <targets> - Sync all listed buffers (changed only)")
+    print("  collab <src> <targets> - Co-edit src's buffer with targets (collab stop|status)")
+    print("  snapshot save <inst> <file> - Save all listed buffers to a snapshot file")
+    print("  snapshot restore <file> <targets> - Load a snapshot into instances")
+    print("  snapshot copy <src> <targets> - Bootstrap targets with src's workspace")
+    print("  split              - Create split view layout")
+    print("  macro record <name> - Record a command sequence")
+    print("  macro play <name> [target] [key=value ...] - Play macro (default: all)")
+    print("  diff <inst1> <inst2> - Show diff between instances")
+    print("  open <inst> <files...> - Add many files to an instance at once")
+    print("  buffers <inst>     - List all buffers of an instance")
+    print("  list               - List instances and macros")
+    print("  rescan             - Rescan ports and sockets, refreshing the registry")
+    print("  relay <host:port>  - Attach the instances of a remote relay")
+    print("  help               - Show this help")
+    print("  exit               - Exit orchestrator")
+
+
+async def run_command(orch, parts):
+    """Execute one REPL command; returns False when the user asks to exit"""
+    if parts[0] == "broadcast":
+        await orch.broadcast_command(' '.join(parts[1:]))
+    elif parts[0] == "sync" and len(parts) >= 3:
+        targets = parts[2].split(',')
+        await orch.sync_buffers(parts[1], targets)
+    elif parts[0] == "wsync" and len(parts) >= 3:
+        await orch.sync_workspace(parts[1], parts[2].split(','))
+    elif parts[0] == "collab" and len(parts) >= 2:
+        if parts[1] == "stop":
+            await orch.stop_collab()
+        elif parts[1] == "status":
+            if orch.collab is None:
+                print("No collaboration session")
+                return True
+            status = orch.collab.status()
+            print(f"\n{status['buffer']}: {status['lines']} lines, {status['ops_in']} ops merged, "
+                  f"{status['ops_out']} applied remotely ({status['lines_sent']} lines sent)")
+            for name, inst in status['instances'].items():
+                print(f"  - {name} (tick {inst['tick']}, pending {inst['pending']}, refused {inst['refused']})")
+        elif len(parts) >= 3:
+            await orch.start_collab(parts[1], parts[2].split(','))
+    elif parts[0] == "snapshot" and len(parts) >= 4:
+        if parts[1] == "save":
+            await orch.save_snapshot(parts[2], parts[3])
+        elif parts[1] == "restore":
             try:
-                line = input("> ")
-                parts = line.split()
-                if not parts:
-                    continue
-                    
-                if parts[0] == "broadcast":
-                    asyncio.run(orch.broadcast_command(' '.join(parts[1:])))
-                elif parts[0] == "sync" and len(parts) >= 3:
-                    targets = parts[2].split(',')
-                    asyncio.run(orch.sync_buffers(parts[1], targets))
-                elif parts[0] == "split":
-                    asyncio.run(orch.orchestrate_split_view())
-                elif parts[0] == "macro" and len(parts) >= 3:
-                    if parts[1] == "record":
-                        macro_name = parts[2]
-                        print(f"Recording macro '{macro_name}'. Enter commands (empty line to finish):")
-                        commands = []
-                        while True:
-                            cmd = input("  > ")
-                            if not cmd:
-                                break
-                            commands.append(cmd)
-                        asyncio.run(orch.record_macro(macro_name, commands))
-                    elif parts[1] == "play" and len(parts) >= 3:
-                        target = parts[3] if len(parts) > 3 else 'all'
-                        asyncio.run(orch.play_macro(parts[2], target))
-                elif parts[0] == "diff" and len(parts) >= 3:
-                    asyncio.run(orch.diff_instances(parts[1], parts[2]))
-                elif parts[0] == "list":
-                    print("\nActive instances:")
-                    for name in orch.instances:
-                        print(f"  - {name}")
-                    print("\nRecorded macros:")
-                    for name in orch.macros:
-                        print(f"  - {name} ({len(orch.macros[name])} commands)")
-                elif parts[0] == "help":
-                    print("\nCommands:")
-                    print("  broadcast <cmd>     - Send command to all instances")
-                    print("  sync <src> <targets> - Sync buffer from source to targets")
-                    print("  split              - Create split view layout")
-                    print("  macro record <name> - Record a command sequence")
-                    print("  macro play <name> [target] - Play macro (default: all)")
-                    print("  diff <inst1> <inst2> - Show diff between instances")
-                    print("  list               - List instances and macros")
-                    print("  help               - Show this help")
-                    print("  exit               - Exit orchestrator")
-                elif parts[0] == "exit":
+                snap = snapshot.Snapshot.load(parts[2])
+            except (OSError, snapshot.SnapshotError) as e:
+                print(f"✗ {e}")
+                return True
+            await orch.restore_snapshot(snap, parts[3].split(','))
+        elif parts[1] == "copy":
+            await orch.copy_workspace(parts[2], parts[3].split(','))
+    elif parts[0] == "split":
+        await orch.orchestrate_split_view()
+    elif parts[0] == "macro" and len(parts) >= 3:
+        if parts[1] == "record":
+            macro_name = parts[2]
+            print(f"Recording macro '{macro_name}'. Enter commands (${{param}} placeholders allowed, empty line to finish):")
+            commands = []
+            while True:
+                cmd = await nvim_rpc.ainput("  > ")
+                if not cmd:
                     break
-            except KeyboardInterrupt:
+                commands.append(cmd)
+            await orch.record_macro(macro_name, commands)
+        elif parts[1] == "play" and len(parts) >= 3:
+            rest = parts[3:]
+            target = 'all'
+            if rest and '=' not in rest[0]:
+                target = rest.pop(0)
+            params = dict(arg.split('=', 1) for arg in rest if '=' in arg)
+            await orch.play_macro(parts[2], target, params)
+    elif parts[0] == "diff" and len(parts) >= 3:
+        await orch.diff_instances(parts[1], parts[2])
+    elif parts[0] == "open" and len(parts) >= 3:
+        if parts[1] not in orch.instances:
+            print(f"✗ Instance '{parts[1]}' not found")
+            return True
+        await orch.bulk_open(parts[1], parts[2:])
+    elif parts[0] == "buffers" and len(parts) >= 2:
+        if parts[1] not in orch.instances:
+            print(f"✗ Instance '{parts[1]}' not found")
+            return True
+        for bufnr, bufname, lines in await orch.buffer_info(parts[1]):
+            print(f"  {bufnr:>4} {bufname or '[No Name]'} ({lines} lines)")
+    elif parts[0] == "list":
+        print("\nActive instances:")
+        known = orch.registry.load()['instances']
+        for name in orch.instances:
+            entry = known.get(instance_registry.endpoint_key(orch.endpoints[name]), {})
+            details = f" (nvim {entry['version']}, pid {entry['pid']})" if entry.get('pid') else ""
+            queue = orch.queues.queues.get(name)
+            if queue is not None:
+                stats = queue.stats()
+                details += (f" [queue {stats['depth']}, sent {stats['sent']}, failed {stats['failed']}"
+                            f", dropped {stats['dropped']}"
+                            f", coalesced {stats['coalesced']}, deferred {stats['deferred']}]")
+            print(f"  - {name}{details}")
+        stats = orch.coordinator.stats()
+        if stats['performed']:
+            print(f"\nSyncs: {stats['requested']} requested, {stats['performed']} transfers "
+                  f"(coalescing ratio {stats['ratio']}x)")
+        print("\nRecorded macros:")
+        for name in orch.macros:
+            print(f"  - {name} ({len(orch.macros[name])} commands)")
+    elif parts[0] == "rescan":
+        await orch.discover_instances(rescan=True)
+    elif parts[0] == "relay" and len(parts) >= 2:
+        await orch.connect_relay(parts[1])
+    elif parts[0] == "help":
+        print_help()
+    elif parts[0] == "exit":
+        return False
+    return True
+
+
+async def interactive(orch):
+    print("Neovim Orchestrator")
+    print("Commands: broadcast <cmd>, sync <source> <target1,target2>, split")
+    watcher = asyncio.ensure_future(orch.watch(live=True))
+    try:
+        await repl(orch)
+    finally:
+        watcher.cancel()
+
+
+async def repl(orch):
+    while True:
+        try:
+            line = await nvim_rpc.ainput("> ")
+        except EOFError:
+            break
+        parts = line.split()
+        if not parts:
+            continue
+        
+        # Ctrl-C cancels the running command, not the orchestrator
+        task = asyncio.ensure_future(run_command(orch, parts))
+        try:
+            if not await asyncio.shield(task):
                 break
+        except asyncio.CancelledError:
+            task.cancel()
+            asyncio.current_task().uncancel()
+            print("✗ Cancelled")
+        except (ConnectionError, OSError) as e:
+            print(f"✗ {e}")
+
+
+# Global options that take a value, so bare Ex commands can follow them
+VALUE_FLAGS = ('--relay', '--relay-token', '--queue-size', '--rate', '--burst', '--policy', '--ack-timeout',
+               '--debounce')
+
+COMMANDS = ('broadcast', 'sync', 'collab', 'snapshot', 'macro', 'diff', 'list', 'watch', 'help')
+
+
+def parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='nvim_orchestrator.py',
+                                     description='Control multiple Neovim instances')
+    parser.add_argument('--timing', action='store_true',
+                        help='Report import and startup time on stderr')
+    parser.add_argument('--rescan', action='store_true',
+                        help='Ignore the instance registry and scan every endpoint')
+    parser.add_argument('--relay', action='append', default=[], metavar='HOST:PORT',
+                        help='Also drive the instances of a remote nvim_relay.py (repeatable)')
+    parser.add_argument('--relay-token', help='Token the relays were started with '
+                                              '(default: $ORCHESTRA_RELAY_TOKEN)')
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help='Commands queued per instance before the overload policy applies')
+    parser.add_argument('--rate', type=float, help='Max commands per second per instance')
+    parser.add_argument('--burst', type=float, help='Commands allowed at once above --rate')
+    parser.add_argument('--policy', default='defer', choices=['drop', 'coalesce', 'defer'],
+                        help='What to do when an instance\'s queue is full (default: defer)')
+    parser.add_argument('--ack-timeout', type=float, default=1.0,
+                        help='Seconds to wait for answers before reporting slow instances as queued')
+    parser.add_argument('--debounce', type=float, default=50,
+                        help='Milliseconds of quiet before a sync transfers; concurrent syncs '
+                             'of the same pair share it (0 disables)')
+    sub = parser.add_subparsers(dest='command')
+    
+    p = sub.add_parser('broadcast', help='Send an Ex command to every instance')
+    p.add_argument('cmd', nargs='+')
+    
+    p = sub.add_parser('sync', help='Sync buffers between instances')
+    p.add_argument('--type', default='buffers', choices=['buffers', 'session', 'all', 'config'],
+                   help="buffers: current buffer; session/all: every listed buffer")
+    p.add_argument('--source', help='Source instance (default: first discovered)')
+    p.add_argument('--targets', help='Comma-separated targets (default: all others)')
+    
+    p = sub.add_parser('collab', help='Co-edit one buffer across instances until interrupted')
+    p.add_argument('--source', help='Instance whose current buffer is shared (default: first discovered)')
+    p.add_argument('--targets', help='Comma-separated instances joining it (default: all others)')
+    
+    p = sub.add_parser('snapshot', help='Save, restore or copy workspaces as block snapshots')
+    p.add_argument('action', choices=['save', 'restore', 'copy'])
+    p.add_argument('--source', help='Instance to save or copy from')
+    p.add_argument('--targets', help='Comma-separated instances to restore or copy into')
+    p.add_argument('--file', help='Snapshot file to write (save) or read (restore)')
+    
+    p = sub.add_parser('macro', help='Play a recorded macro')
+    p.add_argument('action', choices=['play'])
+    p.add_argument('name')
+    p.add_argument('--target', default='all')
+    p.add_argument('params', nargs='*', metavar='key=value')
+    
+    p = sub.add_parser('diff', help='Diff the current buffers of two instances')
+    p.add_argument('inst1')
+    p.add_argument('inst2')
+    
+    sub.add_parser('list', help='List instances and macros')
+    
+    p = sub.add_parser('watch', help='Keep the instance registry current until interrupted')
+    p.add_argument('--interval', type=float, help='Seconds between port sweeps (default: 30)')
+    sub.add_parser('help', help='Show interactive commands')
+    
+    # Bare Ex commands keep working: `nvim_orchestrator.py w` broadcasts :w
+    flags, rest = [], []
+    args = iter(argv)
+    for arg in args:
+        if arg in ('--timing', '--rescan') or arg.split('=', 1)[0] in VALUE_FLAGS and '=' in arg:
+            flags.append(arg)
+        elif arg in VALUE_FLAGS:
+            flags += [arg, next(args, '')]
+        else:
+            rest.append(arg)
+    if rest and rest[0] not in COMMANDS and not rest[0].startswith('-'):
+        rest = ['broadcast'] + rest
+    return parser.parse_args(flags + rest)
+
+
+async def main(args):
+    if args.command == 'sync' and args.type == 'config':
+        print("✗ Config sync is handled by the MCP server, not the orchestrator")
+        return
+    
+    orch = NeovimOrchestrator(queue_options={
+        'maxsize': args.queue_size, 'rate': args.rate, 'burst': args.burst,
+        'policy': args.policy, 'ack_timeout': args.ack_timeout,
+    })
+    orch.coordinator.window = args.debounce / 1000
+    orch.relay_token = args.relay_token
+    try:
+        for address in args.relay:
+            try:
+                await orch.connect_relay(address)
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"✗ relay {address}: {e}")
+        # Connect only to what the command needs; scan when it needs "all"
+        if args.command in ('sync', 'collab') and args.source and args.targets:
+            await orch.connect_only([args.source] + args.targets.split(','))
+        elif args.command == 'snapshot' and (args.targets or args.action == 'save' and args.source):
+            await orch.connect_only([n for n in [args.source] + (args.targets or '').split(',') if n])
+        elif args.command == 'macro' and args.target != 'all':
+            await orch.connect_only([args.target])
+        elif args.command == 'diff':
+            await orch.connect_only([args.inst1, args.inst2])
+        elif args.command == 'watch':
+            pass   # the watcher does its own sweep
+        else:
+            await orch.discover_instances(rescan=args.rescan)
+        TIMER.mark('connect')
+        
+        if args.command is None:
+            await interactive(orch)
+        elif args.command == 'broadcast':
+            await orch.broadcast_command(' '.join(args.cmd))
+        elif args.command in ('sync', 'collab'):
+            source = args.source or next(iter(orch.instances), None)
+            if source is None:
+                print("✗ No Neovim instances found")
+                return
+            if args.targets:
+                targets = args.targets.split(',')
+            else:
+                targets = [name for name in orch.instances if name != source]
+            if args.command == 'collab':
+                await orch.start_collab(source, targets)
+                if orch.collab is not None:
+                    print("Merging edits (Ctrl-C to stop)")
+                    await asyncio.Event().wait()
+            elif args.type == 'buffers':
+                await orch.sync_buffers(source, targets)
+            else:
+                await orch.sync_workspace(source, targets)
+        elif args.command == 'snapshot':
+            if args.action == 'save' and args.source and args.file:
+                await orch.save_snapshot(args.source, args.file)
+            elif args.action == 'restore' and args.file and args.targets:
+                await run_command(orch, ['snapshot', 'restore', args.file, args.targets])
+            elif args.action == 'copy' and args.source:
+                targets = args.targets.split(',') if args.targets else list(orch.instances)
+                await orch.copy_workspace(args.source, targets)
+            else:
+                print("✗ snapshot save needs --source and --file, restore needs --file and "
+                      "--targets, copy needs --source")
+        elif args.command == 'macro':
+            params = dict(arg.split('=', 1) for arg in args.params if '=' in arg)
+            await orch.play_macro(args.name, args.target, params)
+        elif args.command == 'diff':
+            await orch.diff_instances(args.inst1, args.inst2)
+        elif args.command == 'list':
+            await run_command(orch, ['list'])
+        elif args.command == 'watch':
+            print("Watching for Neovim instances (Ctrl-C to stop)")
+            await orch.watch(args.interval)
+        TIMER.mark('command')
+    finally:
+        await orch.close()
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    TIMER.mark('startup')
+    if args.command == 'help':
+        print_help()
+    else:
+        try:
+            asyncio.run(main(args))
+        except KeyboardInterrupt:
+            pass
+    if args.timing:
+        TIMER.report()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""Per-host relay for orchestrating Neovim instances across machines
+
+A relay runs on each host, owns the connections to that host's Neovim
+instances and exposes them to a central orchestrator over one TCP stream.
+Messages for every instance are multiplexed on that stream; everything queued
+in the same loop iteration goes out as one length-prefixed, zlib-compressed
+msgpack frame. The orchestrator sees each remote instance as 'host/nvim-7777'
+with the same request/notify/pipeline interface as a local RpcClient.
+
+The relay listens on 127.0.0.1 unless told otherwise and serves nobody who
+does not hold its token (--token or $ORCHESTRA_RELAY_TOKEN; a fresh one is
+printed when neither is set). On connect it sends a random nonce and the
+client answers with HMAC-SHA256(token, nonce), so the token never crosses
+the wire. Only the methods the orchestrator sends are forwarded
+(RELAY_METHODS); nvim_command and nvim_exec_lua are among them, so the
+token is what stands between the port and code running on this host.
+Until the handshake succeeds a peer may only send small uncompressed
+frames, and no frame inflates beyond MAX_FRAME.
+
+Protocol (msgpack arrays inside frames):
+    relay -> client  [4, nonce]                           handshake challenge
+    client -> relay  [4, proof]                           HMAC of the nonce
+    relay -> client  [4, accepted]
+    client -> relay  [0, msgid, instance, method, args]   request
+                     [2, instance, method, args]          notification
+                     [3, instance, method]                subscribe to notifications
+    relay -> client  [1, msgid, error, result]            response
+                     [2, instance, method, args]          forwarded notification
+Instance '' addresses the relay itself ('hello' returns host and instances).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import secrets
+import socket
+import struct
+import sys
+import zlib
+from typing import Any, Callable, Dict, List, Tuple
+
+import nvim_rpc
+from nvim_rpc import REQUEST, RESPONSE, NOTIFICATION, RpcError
+
+SUBSCRIBE = 3
+AUTH = 4
+RELAY_PORT = 7900
+TOKEN_ENV = 'ORCHESTRA_RELAY_TOKEN'
+AUTH_TIMEOUT = 5.0
+
+# What the orchestrator sends to instances; anything else is refused
+RELAY_METHODS = frozenset({
+    'nvim_buf_attach', 'nvim_buf_detach', 'nvim_buf_get_changedtick', 'nvim_buf_get_lines',
+    'nvim_buf_get_name', 'nvim_buf_is_valid', 'nvim_buf_line_count', 'nvim_buf_set_lines',
+    'nvim_call_function', 'nvim_command', 'nvim_exec_lua', 'nvim_get_current_buf',
+    'nvim_get_option_value', 'nvim_list_bufs', 'nvim_set_current_buf', 'nvim_set_option_value',
+})
+# Notifications a client may subscribe to
+RELAY_EVENTS = frozenset({
+    'nvim_buf_lines_event', 'nvim_buf_changedtick_event', 'nvim_buf_detach_event',
+})
+
+HEADER = struct.Struct('>IB')   # payload length, flags
+COMPRESSED = 1
+COMPRESS_MIN = 256              # smaller frames are not worth deflating
+MAX_FRAME = 256 << 20           # payload bytes, before and after inflating
+AUTH_FRAME = 1024               # the handshake answer is a few dozen bytes
+
+
+def proof(token: str, nonce: bytes) -> bytes:
+    """Answer to a relay's challenge"""
+    return hmac.new(token.encode(), nonce, hashlib.sha256).digest()
+
+
+class FrameError(ConnectionError):
+    """A frame the stream refuses to read; the connection is dropped"""
+
+
+class FrameStream:
+    """Batched, compressed msgpack messages over a reader/writer pair"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 max_frame: int = MAX_FRAME, inflate: bool = True):
+        self.reader = reader
+        self.writer = writer
+        self.max_frame = max_frame
+        self.inflate = inflate     # accept compressed frames
+        self.packer = nvim_rpc.make_packer()
+        self.batch: List[Any] = []
+        self.bytes_in = self.bytes_out = self.raw_out = 0
+
+    def send(self, message: list):
+        """Queue a message; the batch is flushed once per loop iteration"""
+        if not self.batch:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self.batch.append(message)
+
+    def flush(self):
+        if not self.batch or self.writer.is_closing():
+            self.batch = []
+            return
+        payload = self.packer.pack(self.batch)
+        self.batch = []
+        self.raw_out += len(payload)
+        flags = 0
+        if len(payload) >= COMPRESS_MIN:
+            payload = zlib.compress(payload, 1)
+            flags = COMPRESSED
+        self.writer.write(HEADER.pack(len(payload), flags) + payload)
+        self.bytes_out += HEADER.size + len(payload)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def read(self) -> List[Any]:
+        """Next batch of messages; raises IncompleteReadError at EOF, FrameError on limits"""
+        length, flags = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+        if length > self.max_frame:
+            raise FrameError(f"frame of {length} bytes exceeds {self.max_frame}")
+        if flags & COMPRESSED and not self.inflate:
+            raise FrameError("compressed frame not accepted yet")
+        payload = await self.reader.readexactly(length)
+        self.bytes_in += HEADER.size + length
+        if flags & COMPRESSED:
+            inflater = zlib.decompressobj()
+            try:
+                payload = inflater.decompress(payload, self.max_frame)
+            except zlib.error as e:
+                raise FrameError(f"bad compressed frame: {e}") from None
+            if inflater.unconsumed_tail:
+                raise FrameError(f"frame inflates beyond {self.max_frame} bytes")
+        unpacker = nvim_rpc.make_unpacker()
+        unpacker.feed(payload)
+        return unpacker.unpack()
+
+    async def close(self):
+        self.flush()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class RelayServer:
+    """Serves a NeovimOrchestrator's local instances to remote orchestrators"""
+
+    def __init__(self, orch, host: str, token: str):
+        self.orch = orch
+        self.host = host
+        self.token = token
+
+    async def authenticate(self, stream) -> bool:
+        """Challenge the peer to prove it holds the token"""
+        nonce = secrets.token_bytes(32)
+        stream.send([AUTH, nonce])
+        try:
+            reply = await asyncio.wait_for(stream.read(), AUTH_TIMEOUT)
+        except Exception:      # timeout, EOF or garbage: all the same refusal
+            reply = None
+        answer = reply[0] if isinstance(reply, list) and len(reply) == 1 else None
+        accepted = (isinstance(answer, list) and len(answer) == 2 and answer[0] == AUTH
+                    and isinstance(answer[1], bytes)
+                    and hmac.compare_digest(answer[1], proof(self.token, nonce)))
+        stream.send([AUTH, accepted])
+        return accepted
+
+    async def handle(self, reader, writer):
+        stream = FrameStream(reader, writer, max_frame=AUTH_FRAME, inflate=False)
+        tasks = set()
+        subscriptions = []
+        peer = writer.get_extra_info('peername')
+        try:
+            if not await self.authenticate(stream):
+                print(f"✗ Refused {peer}: bad or missing token")
+                return
+            stream.max_frame, stream.inflate = MAX_FRAME, True
+            print(f"✓ Orchestrator connected from {peer}")
+            while True:
+                for message in await stream.read():
+                    if message[0] == REQUEST:
+                        # Tasks start in arrival order, so per-instance ordering holds
+                        task = asyncio.ensure_future(self.request(stream, *message[1:]))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    elif message[0] == NOTIFICATION:
+                        _, instance, method, args = message
+                        if instance in self.orch.instances and method in RELAY_METHODS:
+                            self.orch.instances[instance].notify(method, *args)
+                    elif message[0] == SUBSCRIBE:
+                        subscription = self.subscribe(stream, *message[1:])
+                        if subscription:
+                            subscriptions.append(subscription)
+        except FrameError as e:
+            print(f"✗ Dropped {peer}: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            for client, method, forward in subscriptions:
+                client.remove_notification(method, forward)
+            await stream.close()
+            print(f"- {peer} disconnected")
+
+    async def request(self, stream, msgid, instance, method, args):
+        try:
+            if instance == '':
+                result = self.local(method)
+            elif method not in RELAY_METHODS:
+                raise ValueError("not forwarded by this relay")
+            else:
+                client = self.orch.instances.get(instance)
+                if client is None or client.closed:
+                    raise ConnectionError(f"{instance}: not connected on {self.host}")
+                result = await client.request(method, *args)
+        except RpcError as e:
+            stream.send([RESPONSE, msgid, e.error, None])
+        except Exception as e:
+            stream.send([RESPONSE, msgid, str(e), None])
+        else:
+            stream.send([RESPONSE, msgid, None, result])
+
+    def local(self, method):
+        if method == 'hello':
+            return {'host': self.host, 'instances': sorted(self.orch.instances)}
+        raise ValueError(f"unknown relay method {method}")
+
+    def subscribe(self, stream, instance, method):
+        """Forward an instance's notifications; returns (client, method, callback) to undo it"""
+        client = self.orch.instances.get(instance)
+        if client is None or method not in RELAY_EVENTS:
+            return None
+        def forward(args):
+            if not stream.writer.is_closing():
+                stream.send([NOTIFICATION, instance, method, args])
+        client.on_notification(method, forward)
+        return client, method, forward
+
+
+class RelayClient:
+    """Orchestrator side of one relay connection"""
+
+    def __init__(self, stream: FrameStream, endpoint):
+        self.stream = stream
+        self.endpoint = endpoint
+        self.host = None
+        self.closed = False
+        self._msgids = itertools.count(1)
+        self._pending: Dict[int, Tuple[str, asyncio.Future]] = {}
+        self._handlers: Dict[Tuple[str, str], List[Callable]] = {}
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, endpoint, token: str = None, timeout: float = 5.0) -> 'RelayClient':
+        """Connect to a relay, answer its challenge and learn its host name"""
+        if isinstance(endpoint, str):
+            endpoint = nvim_rpc.parse_endpoint(endpoint)
+        token = token or os.environ.get(TOKEN_ENV)
+        if not token:
+            raise ConnectionError(f"no relay token (set {TOKEN_ENV} or pass --relay-token)")
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(endpoint[1], endpoint[2]), timeout)
+        stream = FrameStream(reader, writer)
+        try:
+            (kind, nonce), = await asyncio.wait_for(stream.read(), timeout)
+            stream.send([AUTH, proof(token, nonce)])
+            (kind, accepted), = await asyncio.wait_for(stream.read(), timeout)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, TypeError):
+            accepted = False
+        if accepted is not True:
+            await stream.close()
+            raise ConnectionError(f"relay {endpoint[1]}:{endpoint[2]} did not accept the token")
+        relay = cls(stream, endpoint)
+        relay.host = (await relay.hello())['host']
+        return relay
+
+    async def hello(self) -> Dict:
+        """{'host': name, 'instances': [...]} as currently known by the relay"""
+        return await self.request('', 'hello')
+
+    def start(self, instance: str, method: str, args) -> asyncio.Future:
+        if self.closed:
+            raise ConnectionError(f"relay {self.host}: connection closed")
+        msgid = next(self._msgids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msgid] = (method, future)
+        self.stream.send([REQUEST, msgid, instance, method, list(args)])
+        return future
+
+    async def request(self, instance: str, method: str, *args) -> Any:
+        future = self.start(instance, method, args)
+        await self.stream.drain()
+        return await future
+
+    def notify(self, instance: str, method: str, *args):
+        self.stream.send([NOTIFICATION, instance, method, list(args)])
+
+    def subscribe(self, instance: str, method: str, callback: Callable):
+        key = (instance, method)
+        if key not in self._handlers:
+            self.stream.send([SUBSCRIBE, instance, method])
+        self._handlers.setdefault(key, []).append(callback)
+
+    def proxy(self, instance: str) -> 'RelayInstance':
+        return RelayInstance(self, instance)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                for message in await self.stream.read():
+                    self._dispatch(message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._fail_pending(ConnectionError(f"relay {self.host}: connection lost"))
+
+    def _dispatch(self, message: list):
+        if message[0] == RESPONSE:
+            _, msgid, error, result = message
+            method, future = self._pending.pop(msgid, (None, None))
+            if future is None or future.done():
+                return
+            if error is not None:
+                future.set_exception(RpcError(method, error))
+            else:
+                future.set_result(result)
+        elif message[0] == NOTIFICATION:
+            _, instance, method, args = message
+            for callback in self._handlers.get((instance, method), []):
+                callback(args)
+
+    def _fail_pending(self, error: Exception):
+        self.closed = True
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        await self.stream.close()
+        self._reader_task.cancel()
+        self._fail_pending(ConnectionError(f"relay {self.host}: connection closed"))
+
+
+class RelayInstance:
+    """A remote instance behind a relay, usable wherever an RpcClient is"""
+
+    def __init__(self, relay: RelayClient, instance: str):
+        self.relay = relay
+        self.instance = instance
+        self.name = f"{relay.host}/{instance}"
+        self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed or self.relay.closed
+
+    async def request(self, method: str, *args) -> Any:
+        return await self.relay.request(self.instance, method, *args)
+
+    def notify(self, method: str, *args):
+        self.relay.notify(self.instance, method, *args)
+
+    async def pipeline(self, calls: List[Tuple], window: int = 256,
+                       return_exceptions: bool = False) -> List[Any]:
+        """Same contract as RpcClient.pipeline; requests share the relay's frames"""
+        slots = asyncio.Semaphore(window)
+        futures = []
+        for call in calls:
+            if slots.locked():
+                await self.relay.stream.drain()
+            await slots.acquire()
+            future = self.relay.start(self.instance, call[0], call[1:])
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+        await self.relay.stream.drain()
+        return await asyncio.gather(*futures, return_exceptions=return_exceptions)
+
+    def on_notification(self, method: str, callback: Callable[[List[Any]], None]):
+        self.relay.subscribe(self.instance, method, callback)
+
+    def remove_notification(self, method: str, callback: Callable[[List[Any]], None]):
+        """Stop calling callback; the relay keeps forwarding until the stream closes"""
+        handlers = self.relay._handlers.get((self.instance, method), [])
+        if callback in handlers:
+            handlers.remove(callback)
+
+    async def close(self):
+        """The relay stream is shared, so closing one instance only detaches it"""
+        self._closed = True
+
+
+async def serve(args):
+    from nvim_orchestrator import NeovimOrchestrator
+
+    orch = NeovimOrchestrator()
+    if args.ports:
+        await orch.discover_instances(ports=[int(p) for p in args.ports.split(',')])
+    else:
+        await orch.discover_instances()
+    token = args.token or os.environ.get(TOKEN_ENV)
+    if not token:
+        token = secrets.token_urlsafe(24)
+        print(f"No --token or ${TOKEN_ENV} given; orchestrators must use: {token}")
+    relay = RelayServer(orch, args.name or socket.gethostname(), token)
+    server = await asyncio.start_server(relay.handle, args.listen, args.port)
+    print(f"Relay '{relay.host}' serving {len(orch.instances)} instances on {args.listen}:{args.port}")
+    try:
+        async with server:
+            if args.ports:
+                await server.serve_forever()
+            else:
+                # Follow instances that start or exit on this host
+                await asyncio.gather(server.serve_forever(), orch.watch(live=True))
+    finally:
+        await orch.close()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='nvim_relay.py',
+                                     description='Expose this host\'s Neovim instances to a remote orchestrator')
+    parser.add_argument('--listen', default='127.0.0.1',
+                        help='Address to bind (default: 127.0.0.1; use 0.0.0.0 to serve other hosts)')
+    parser.add_argument('--token', help=f'Shared secret orchestrators must prove (default: ${TOKEN_ENV}, '
+                                        'else a random one is printed)')
+    parser.add_argument('--port', type=int, default=RELAY_PORT, help=f'Port to bind (default: {RELAY_PORT})')
+    parser.add_argument('--name', help='Host name reported to orchestrators (default: hostname)')
+    parser.add_argument('--ports', help='Comma-separated Neovim ports to own instead of discovering '
+                                        '(lets several relays share one machine)')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args(sys.argv[1:])))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Startup helpers shared by the orchestra scripts
+
+One-shot invocations from the MCP server should not pay for asyncio, msgpack
+or instance discovery before argv is even parsed. Scripts import heavy
+modules through lazy_import() and report where startup time went with
+--timing.
+"""
+
+import importlib.util
+import os
+import sys
+import time
+
+
+def lazy_import(name: str):
+    """Return a module that is only executed on first attribute access"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def process_age_ms():
+    """Milliseconds since this process was exec'd (Linux only, else None)"""
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        start = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        return (uptime - start) * 1000
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """Records named phases since the script started and prints them on demand"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.boot = process_age_ms()
+        self.phases = []
+
+    def mark(self, phase: str):
+        self.phases.append((phase, time.perf_counter()))
+
+    def report(self, out=sys.stderr):
+        last = self.start
+        parts = []
+        if self.boot is not None:
+            parts.append(f"interpreter {self.boot:.1f}ms")
+        for phase, at in self.phases:
+            parts.append(f"{phase} {(at - last) * 1000:.1f}ms")
+            last = at
+        total = (last - self.start) * 1000 + (self.boot or 0)
+        print(f"⏱  {', '.join(parts)} (total {total:.1f}ms)", file=out)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Inject and call the orchestra_helpers.lua module inside Neovim instances
+
+Helpers are installed once per instance and then invoked by name, so diff,
+status, sync and swarm can compare buffers by hashes and line ranges instead
+of downloading them.
+"""
+
+import os
+from typing import Tuple
+
+HELPERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'orchestra_helpers.lua')
+
+CALL_LUA = """
+local name = ...
+if not OrchestraHelpers then error('OrchestraHelpers missing') end
+return OrchestraHelpers[name](select(2, ...))
+"""
+
+_source = None
+
+
+def helpers_source() -> str:
+    global _source
+    if _source is None:
+        with open(HELPERS_PATH) as f:
+            _source = f.read()
+    return _source
+
+
+def install_call() -> Tuple:
+    """RPC call that (re)defines OrchestraHelpers in an instance"""
+    return ('nvim_exec_lua', helpers_source(), [])
+
+
+def helper_call(name: str, *args) -> Tuple:
+    """RPC call (method, *args) invoking one helper function"""
+    return ('nvim_exec_lua', CALL_LUA, [name, *args])
+
+
+def is_missing(error: Exception) -> bool:
+    """True if an error means the helpers are not installed (e.g. instance restarted)"""
+    return 'OrchestraHelpers missing' in str(error)
+
+
+class LuaHelpers:
+    """Tracks which instances already have the helpers installed"""
+
+    def __init__(self):
+        self.ready = set()
+
+    def forget(self, instance: str):
+        self.ready.discard(instance)
+
+    async def ensure(self, instance: str, client):
+        """Install helpers through a pipelined RpcClient unless already done"""
+        if instance not in self.ready:
+            await client.request(*install_call())
+            self.ready.add(instance)
+
+    async def call(self, instance: str, client, name: str, *args):
+        """Call a helper, reinstalling once if the instance lost it"""
+        await self.ensure(instance, client)
+        try:
+            return await client.request(*helper_call(name, *args))
+        except Exception as e:
+            if not is_missing(e):
+                raise
+            self.ready.discard(instance)
+            await self.ensure(instance, client)
+            return await client.request(*helper_call(name, *args))
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""Record and replay msgpack-RPC traffic
+
+With NVIM_RPC_RECORD=<log> in the environment every RpcClient of the process
+(orchestrator, controller, swarm) appends its traffic to one compact log, so
+a real session with its bursts and large syncs can be captured and then
+replayed offline against headless Neovims, fake_nvim instances or any other
+RPC server.
+
+The log is a gzip'd msgpack stream of records:
+
+    ['hello', version, wall-clock start, full]
+    ['conn', conn, name, peer]                    a connection was opened
+    [dt_us, conn, 0, msgid, method, args]         request sent
+    [dt_us, conn, 1, msgid, error, size|result]   response received
+    [dt_us, conn, 2, method, args]                notification sent
+    [dt_us, conn, 3, method, size|args]           notification received
+
+dt_us is the time since the previous record in microseconds. Incoming
+payloads are recorded by packed size only (set NVIM_RPC_RECORD_FULL=1 to
+keep them); replaying needs just what was sent.
+
+Replaying maps recorded connections round-robin onto targets and re-issues
+each connection's requests and notifications at the recorded pace divided by
+--speed (0: no pauses), then compares per-method latency and throughput with
+the recording. Replay is closed-loop: a request the recorded client sent only
+after some responses had arrived also waits for as many replayed responses,
+so pipelined batches stay pipelined and request/response chains stay chains
+at any speed. Handles in arguments (Buffer(1)) are sent as recorded, which
+matches freshly started instances. A '{pid}' in the log path gives each
+recording process its own file.
+"""
+
+import argparse
+import asyncio
+import atexit
+import gzip
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import nvim_rpc
+
+LOG_VERSION = 1
+FULL_ENV = 'NVIM_RPC_RECORD_FULL'
+OUT_REQUEST, IN_RESPONSE, OUT_NOTIFY, IN_NOTIFY = 0, 1, 2, 3
+HEADLESS_PORT = 7800       # first port for instances started by --headless
+WINDOW = 256               # outstanding requests per replayed connection
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of unsorted values, None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Recorder:
+    """Appends the traffic of every RpcClient to a log"""
+
+    def __init__(self, path: str, full: Optional[bool] = None):
+        self.path = path = path.replace('{pid}', str(os.getpid()))
+        self.full = os.environ.get(FULL_ENV) == '1' if full is None else full
+        self.file = gzip.open(path, 'wb', compresslevel=1)
+        self.packer = nvim_rpc.make_packer()
+        self.ids = itertools.count()
+        self.last = time.perf_counter()
+        self.write(['hello', LOG_VERSION, time.time(), self.full])
+        atexit.register(self.close)
+
+    def write(self, record: list):
+        if self.file is not None:
+            self.file.write(self.packer.pack(record))
+
+    def stamp(self) -> int:
+        now = time.perf_counter()
+        elapsed, self.last = now - self.last, now
+        return int(elapsed * 1e6)
+
+    def size(self, payload) -> int:
+        try:
+            return len(self.packer.pack(payload))
+        except (TypeError, ValueError):
+            return 0
+
+    def connection(self, name: str, peer) -> int:
+        conn = next(self.ids)
+        if isinstance(peer, (tuple, list)) and len(peer) >= 2:
+            peer = f"{peer[0]}:{peer[1]}"
+        self.write(['conn', conn, name, str(peer or '')])
+        return conn
+
+    def outgoing(self, conn: int, message: list):
+        kind = message[0]
+        if kind == nvim_rpc.REQUEST:
+            _, msgid, method, args = message
+            self.write([self.stamp(), conn, OUT_REQUEST, msgid, method, args])
+        elif kind == nvim_rpc.NOTIFICATION:
+            _, method, args = message
+            self.write([self.stamp(), conn, OUT_NOTIFY, method, args])
+
+    def incoming(self, conn: int, message: list):
+        kind = message[0]
+        if kind == nvim_rpc.RESPONSE:
+            _, msgid, error, result = message
+            self.write([self.stamp(), conn, IN_RESPONSE, msgid, error,
+                        result if self.full else self.size(result)])
+        elif kind == nvim_rpc.NOTIFICATION:
+            _, method, args = message
+            self.write([self.stamp(), conn, IN_NOTIFY, method,
+                        args if self.full else self.size(args)])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_log(path: str) -> Iterator[list]:
+    unpacker = nvim_rpc.make_unpacker()
+    with gzip.open(path, 'rb') as f:
+        while True:
+            try:
+                data = f.read(1 << 16)
+            except EOFError:
+                break   # the recording process died mid-write
+            if not data:
+                break
+            unpacker.feed(data)
+            yield from unpacker
+
+
+class Trace:
+    """A loaded log: connections and their events on one time axis (seconds)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connections: Dict[int, Dict] = {}
+        self.events: Dict[int, List[Tuple]] = {}      # conn -> [(t, kind, *payload)]
+        self.full = False
+        t = 0.0
+        for record in read_log(path):
+            if record[0] == 'hello':
+                if record[1] != LOG_VERSION:
+                    raise ValueError(f"{path}: unsupported log version {record[1]}")
+                self.full = record[3]
+            elif record[0] == 'conn':
+                _, conn, name, peer = record
+                self.connections[conn] = {'name': name, 'peer': peer}
+                self.events.setdefault(conn, [])
+            else:
+                dt, conn, kind, *payload = record
+                t += dt / 1e6
+                self.events.setdefault(conn, []).append((t, kind, *payload))
+        times = [e[0] for events in self.events.values() for e in events]
+        self.start = min(times, default=0.0)
+        self.duration = max(times, default=0.0) - self.start
+
+    def requests(self, conn: int) -> Iterator[Tuple]:
+        """(method, sent, answered or None, error, size) per recorded request"""
+        sent = {}
+        for t, kind, *payload in self.events.get(conn, []):
+            if kind == OUT_REQUEST:
+                sent[payload[0]] = (payload[1], t)
+            elif kind == IN_RESPONSE and payload[0] in sent:
+                method, started = sent.pop(payload[0])
+                size = 0 if self.full else payload[2]
+                yield method, started, t, payload[1], size
+        for method, started in sent.values():
+            yield method, started, None, None, 0
+
+    def summary(self) -> Dict:
+        methods: Dict[str, Dict] = {}
+        notifications = 0
+        for conn in self.events:
+            notifications += sum(1 for e in self.events[conn] if e[1] == OUT_NOTIFY)
+            for method, sent, answered, error, size in self.requests(conn):
+                m = methods.setdefault(method, {'count': 0, 'errors': 0, 'bytes': 0, 'latency': []})
+                m['count'] += 1
+                m['errors'] += error is not None
+                m['bytes'] += size
+                if answered is not None:
+                    m['latency'].append((answered - sent) * 1000)
+        return summarize(methods, self.duration, notifications)
+
+
+def summarize(methods: Dict[str, Dict], duration: float, notifications: int) -> Dict:
+    requests = sum(m['count'] for m in methods.values())
+    return {
+        'duration_s': round(duration, 3), 'requests': requests, 'notifications': notifications,
+        'requests_per_s': round(requests / duration, 1) if duration > 0 else None,
+        'methods': {
+            name: {'count': m['count'], 'errors': m['errors'], 'bytes': m.get('bytes', 0),
+                   'p50_ms': _round(percentile(m['latency'], 50)),
+                   'p99_ms': _round(percentile(m['latency'], 99))}
+            for name, m in sorted(methods.items(), key=lambda item: -item[1]['count'])
+        },
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+class HeadlessPool:
+    """`nvim --headless` instances on consecutive ports for the duration of a block"""
+
+    def __init__(self, count: int, base_port: int = HEADLESS_PORT):
+        self.ports = list(range(base_port, base_port + count))
+        self.processes = []
+
+    @property
+    def endpoints(self) -> List[Tuple]:
+        return [('tcp', '127.0.0.1', port) for port in self.ports]
+
+    async def __aenter__(self) -> 'HeadlessPool':
+        if shutil.which('nvim') is None:
+            raise RuntimeError("nvim not found on PATH")
+        for port in self.ports:
+            self.processes.append(await asyncio.create_subprocess_exec(
+                'nvim', '--headless', '--clean', '--listen', f'127.0.0.1:{port}',
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        await asyncio.gather(*[self._wait(port) for port in self.ports])
+        return self
+
+    async def _wait(self, port: int, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"headless nvim on port {port} did not start")
+                await asyncio.sleep(0.05)
+
+    async def __aexit__(self, *exc):
+        for process in self.processes:
+            if process.returncode is None:
+                process.terminate()
+        await asyncio.gather(*[process.wait() for process in self.processes])
+
+
+async def replay(trace: Trace, endpoints: List, speed: float = 1.0, window: int = WINDOW) -> Dict:
+    """Re-issue the trace's traffic against endpoints; returns a summary like Trace.summary"""
+    conns = [conn for conn in sorted(trace.events)
+             if any(e[1] in (OUT_REQUEST, OUT_NOTIFY) for e in trace.events[conn])]
+    clients = await asyncio.gather(*[
+        nvim_rpc.RpcClient.connect(endpoints[i % len(endpoints)],
+                                   f"replay-{trace.connections.get(conn, {}).get('name', conn)}")
+        for i, conn in enumerate(conns)
+    ])
+    methods: Dict[str, Dict] = {}
+    notifications = 0
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def drive(client, events):
+        nonlocal notifications
+        slots = asyncio.Semaphore(window)
+        answered = asyncio.Condition()
+        done = expected = 0
+        tasks = []
+
+        async def timed(method, args):
+            nonlocal done
+            m = methods.setdefault(method, {'count': 0, 'errors': 0, 'latency': []})
+            m['count'] += 1
+            sent = time.perf_counter()
+            try:
+                await client.request(method, *args)
+            except nvim_rpc.RpcError:
+                m['errors'] += 1
+            finally:
+                m['latency'].append((time.perf_counter() - sent) * 1000)
+                slots.release()
+                done += 1
+                async with answered:
+                    answered.notify_all()
+
+        for t, kind, *payload in events:
+            if kind == IN_RESPONSE:
+                expected += 1
+                continue
+            if kind not in (OUT_REQUEST, OUT_NOTIFY):
+                continue
+            # What the recorded client waited for before sending, it waits for again
+            if done < expected:
+                async with answered:
+                    await answered.wait_for(lambda: done >= expected)
+            if speed:
+                delay = started + (t - trace.start) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if kind == OUT_REQUEST:
+                await slots.acquire()
+                tasks.append(asyncio.ensure_future(timed(payload[1], payload[2])))
+            else:
+                client.notify(payload[0], *payload[1])
+                notifications += 1
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        await asyncio.gather(*[drive(client, trace.events[conn]) for client, conn in zip(clients, conns)])
+    finally:
+        await asyncio.gather(*[client.close() for client in clients])
+    return summarize(methods, loop.time() - started, notifications)
+
+
+def print_summary(title: str, summary: Dict, recorded: Optional[Dict] = None):
+    rate = summary['requests_per_s']
+    print(f"{title}: {summary['requests']} requests, {summary['notifications']} notifications "
+          f"in {summary['duration_s']}s" + (f" ({rate} req/s)" if rate else ""))
+    print(f"  {'method':32} {'count':>7} {'errors':>6} {'p50 ms':>8} {'p99 ms':>8}"
+          + (f" {'was p50':>8} {'was p99':>8}" if recorded else ""))
+    for name, m in summary['methods'].items():
+        line = (f"  {name[:32]:32} {m['count']:>7} {m['errors']:>6} "
+                f"{_cell(m['p50_ms']):>8} {_cell(m['p99_ms']):>8}")
+        if recorded:
+            was = recorded['methods'].get(name, {})
+            line += f" {_cell(was.get('p50_ms')):>8} {_cell(was.get('p99_ms')):>8}"
+        print(line)
+
+
+def _cell(value) -> str:
+    return '-' if value is None else str(value)
+
+
+async def run_replay(args):
+    trace = Trace(args.log)
+    recorded = trace.summary()
+    print(f"📼 {args.log}: {len(trace.connections)} connections, {recorded['requests']} requests "
+          f"over {recorded['duration_s']}s; replaying at "
+          + (f"{args.speed}x" if args.speed else "full speed"))
+    if args.headless:
+        async with HeadlessPool(args.headless, args.base_port) as pool:
+            summary = await replay(trace, pool.endpoints, args.speed, args.window)
+    elif args.fake:
+        import fake_nvim
+        async with fake_nvim.FakeFleet(args.fake, latency=args.fake_latency / 1000) as fleet:
+            summary = await replay(trace, fleet.endpoints, args.speed, args.window)
+    else:
+        endpoints = [nvim_rpc.parse_endpoint(t) for t in args.targets.split(',')]
+        summary = await replay(trace, endpoints, args.speed, args.window)
+    print_summary("✓ Replayed", summary, recorded)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'recorded': recorded, 'replayed': summary}, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='rpc_replay.py',
+                                     description='Record and replay Neovim msgpack-RPC traffic')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    record = sub.add_parser('record', help='Run a command with every RPC connection recorded')
+    record.add_argument('log', help='Log file to write')
+    record.add_argument('--full', action='store_true', help='Also keep response and notification payloads')
+    record.add_argument('cmd', nargs=argparse.REMAINDER, help='Command to run, after --')
+
+    stats = sub.add_parser('stats', help='Summarize a log')
+    stats.add_argument('log')
+
+    rep = sub.add_parser('replay', help='Replay a log against running, headless or fake instances')
+    rep.add_argument('log')
+    targets = rep.add_mutually_exclusive_group(required=True)
+    targets.add_argument('--targets', help='Comma-separated endpoints (7777, host:port, /socket)')
+    targets.add_argument('--headless', type=int, metavar='N', help='Start N headless nvim instances')
+    targets.add_argument('--fake', type=int, metavar='N', help='Serve N in-process fake instances (fake_nvim)')
+    rep.add_argument('--base-port', type=int, default=HEADLESS_PORT,
+                     help=f'First port for --headless (default: {HEADLESS_PORT})')
+    rep.add_argument('--fake-latency', type=float, default=0.0, metavar='MS',
+                     help='Response latency of --fake instances, in ms')
+    rep.add_argument('--speed', type=float, default=1.0,
+                     help='Pace relative to the recording (2 = twice as fast, 0 = no pauses)')
+    rep.add_argument('--window', type=int, default=WINDOW,
+                     help=f'Outstanding requests per connection (default: {WINDOW})')
+    rep.add_argument('--json', help='Also write recorded and replayed summaries to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command == 'record':
+        cmd = args.cmd[1:] if args.cmd[:1] == ['--'] else args.cmd
+        if not cmd:
+            sys.exit("record: give the command to run after --")
+        env = dict(os.environ, **{nvim_rpc.RECORD_ENV: os.path.abspath(args.log)})
+        if args.full:
+            env[FULL_ENV] = '1'
+        sys.exit(subprocess.call(cmd, env=env))
+    elif args.command == 'stats':
+        trace = Trace(args.log)
+        for conn, info in sorted(trace.connections.items()):
+            sent = sum(1 for e in trace.events[conn] if e[1] == OUT_REQUEST)
+            print(f"  {info['name'] or conn} ({info['peer']}): {sent} requests")
+        print_summary(f"📼 {args.log}", trace.summary())
+    else:
+        try:
+            asyncio.run(run_replay(args))
+        except (RuntimeError, OSError) as e:
+            sys.exit(f"✗ {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Bounded, rate-limited per-instance send queues
+
+Broadcasts and macros used to fire at every instance at once and wait for
+the slowest. Each instance now gets its own bounded queue drained by its own
+task, optionally rate limited by a token bucket. When a queue is full the
+policy decides: 'drop' the new command, 'coalesce' it (skip duplicates of a
+queued command, otherwise evict the oldest) or 'defer' it until there is
+room. Callers wait only a short ack window, so fast instances answer quickly
+while slow ones catch up in the background.
+"""
+
+import asyncio
+import collections
+import time
+from typing import Any, Callable, Dict, Optional
+
+POLICIES = ('drop', 'coalesce', 'defer')
+QUEUE_SIZE = 64
+ACK_TIMEOUT = 1.0
+FLUSH_TIMEOUT = 5.0     # how long closing waits for slow instances to catch up
+
+
+class Overloaded(Exception):
+    """A command was dropped or evicted because its target fell behind"""
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+
+    async def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self.tokens = 1
+            self.last = time.monotonic()
+        self.tokens -= 1
+
+
+class SendQueue:
+    """One instance's queue and the task that drains it in order"""
+
+    def __init__(self, name: str, client, maxsize: int = QUEUE_SIZE, rate: float = None,
+                 burst: float = None, policy: str = 'defer'):
+        self.name = name
+        self.client = client
+        self.maxsize = maxsize
+        self.policy = policy
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.items = collections.deque()     # (key, method, args, future)
+        self.in_flight = 0
+        self.not_empty = asyncio.Event()
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.sent = self.failed = self.dropped = self.coalesced = self.deferred = 0
+        self.latency = None
+        self.task = asyncio.ensure_future(self._drain())
+
+    @property
+    def depth(self) -> int:
+        return len(self.items) + self.in_flight
+
+    async def put(self, method: str, *args) -> asyncio.Future:
+        """Queue a request; the returned future resolves when the instance answers"""
+        key = (method, repr(args))
+        if self.policy == 'coalesce':
+            for queued in self.items:
+                if queued[0] == key:
+                    self.coalesced += 1
+                    return queued[3]
+        if len(self.items) >= self.maxsize:
+            if self.policy == 'drop':
+                self.dropped += 1
+                future = asyncio.get_running_loop().create_future()
+                future.set_exception(Overloaded(f"{self.name}: queue full ({self.maxsize}), dropped"))
+                return future
+            if self.policy == 'coalesce':
+                self.dropped += 1
+                evicted = self.items.popleft()
+                evicted[3].set_exception(Overloaded(f"{self.name}: superseded while queued"))
+            else:
+                self.deferred += 1
+                while len(self.items) >= self.maxsize:
+                    self.not_full.clear()
+                    await self.not_full.wait()
+        future = asyncio.get_running_loop().create_future()
+        self.items.append((key, method, args, future))
+        self.idle.clear()
+        self.not_empty.set()
+        return future
+
+    async def _drain(self):
+        while True:
+            if not self.items:
+                self.not_empty.clear()
+                if not self.in_flight:
+                    self.idle.set()
+                await self.not_empty.wait()
+                continue
+            if self.bucket:
+                await self.bucket.take()
+                if not self.items:
+                    continue
+            _, method, args, future = self.items.popleft()
+            self.not_full.set()
+            if future.done():
+                continue
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                result = await self.client.request(method, *args)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.sent += 1
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.in_flight -= 1
+            elapsed = (time.perf_counter() - started) * 1000
+            self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+
+    async def flush(self):
+        """Wait until everything queued so far has been answered"""
+        await self.idle.wait()
+
+    async def close(self):
+        self.task.cancel()
+        for _, _, _, future in self.items:
+            if not future.done():
+                future.set_exception(ConnectionError(f"{self.name}: queue closed"))
+        self.items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'depth': self.depth, 'sent': self.sent, 'failed': self.failed,
+                'dropped': self.dropped, 'coalesced': self.coalesced, 'deferred': self.deferred,
+                'latency_ms': round(self.latency, 1) if self.latency is not None else None}
+
+
+class QueueSet:
+    """Send queues for every instance, sharing one configuration"""
+
+    def __init__(self, maxsize: int = QUEUE_SIZE, rate: float = None, burst: float = None,
+                 policy: str = 'defer', ack_timeout: float = ACK_TIMEOUT):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown overload policy '{policy}' (choose from {', '.join(POLICIES)})")
+        self.maxsize = maxsize
+        self.rate = rate
+        self.burst = burst
+        self.policy = policy
+        self.ack_timeout = ack_timeout
+        self.queues: Dict[str, SendQueue] = {}
+        self.late = set()
+
+    def get(self, name: str, client) -> SendQueue:
+        queue = self.queues.get(name)
+        if queue is None or queue.client is not client:
+            if queue is not None:
+                asyncio.ensure_future(queue.close())
+            queue = SendQueue(name, client, self.maxsize, self.rate, self.burst, self.policy)
+            self.queues[name] = queue
+        return queue
+
+    async def fan_out(self, targets: Dict[str, Any], method: str, *args,
+                      on_late: Callable[[str, Any], None] = None) -> Dict[str, Any]:
+        """Queue one request per target and wait at most ack_timeout for answers
+
+        Returns {name: result or exception} for targets that answered in time.
+        The rest keep going; on_late(name, result) is called when they finish.
+        """
+        async def deliver(name, client):
+            return await (await self.get(name, client).put(method, *args))
+
+        tasks = {asyncio.ensure_future(deliver(name, client)): name
+                 for name, client in targets.items()}
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks, timeout=self.ack_timeout)
+        results = {}
+        for task in done:
+            results[tasks[task]] = task.exception() or task.result()
+        for task in pending:
+            name = tasks[task]
+            self.late.add(task)
+
+            def finished(t, name=name):
+                self.late.discard(t)
+                if on_late and not t.cancelled():
+                    on_late(name, t.exception() or t.result())
+            task.add_done_callback(finished)
+        return results
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: queue.stats() for name, queue in self.queues.items()}
+
+    async def flush(self, timeout: float = None) -> bool:
+        """Let slow instances catch up, e.g. before a one-shot command exits
+
+        Returns False if `timeout` passed first; whatever is left is still queued.
+        """
+        async def drained():
+            await asyncio.gather(*[queue.flush() for queue in self.queues.values()])
+            if self.late:
+                await asyncio.wait(set(self.late))
+
+        try:
+            await asyncio.wait_for(drained(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def pending(self) -> int:
+        """Commands queued or in flight across all instances"""
+        return sum(queue.depth for queue in self.queues.values())
+
+    async def close(self):
+        await asyncio.gather(*[queue.close() for queue in self.queues.values()])
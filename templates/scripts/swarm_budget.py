@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Deadline-bounded VimSwarm runs
+
+Rules from every agent run in priority order (errors first, then warnings,
+then info) and are stepped through cooperatively: each rule yields once per
+unit of work and the deadline is checked every few steps. Only the top-k
+suggestions by (severity, confidence) are kept, in a bounded heap, so an
+on-save check on a huge file returns within its budget with the most
+important findings and says how far it got.
+"""
+
+import heapq
+import itertools
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from line_features import LineFeatures
+
+CHECK_EVERY = 64       # steps between deadline checks
+TOP_K = 20
+
+SEVERITY_ORDER = {'error': 0, 'warning': 1, 'info': 2}
+
+
+def parse_duration(text: str) -> float:
+    """'200ms', '1.5s' or a bare number of milliseconds, in seconds"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*(ms|s)?\s*', text)
+    if not match:
+        raise ValueError(f"invalid duration '{text}' (use e.g. 200ms or 1.5s)")
+    value = float(match.group(1))
+    return value if match.group(2) == 's' else value / 1000
+
+
+class TopK:
+    """The k most important suggestions seen so far"""
+
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.heap = []              # min-heap: the least important kept suggestion on top
+        self.order = itertools.count()
+        self.seen = 0
+
+    def push(self, suggestion):
+        self.seen += 1
+        # Higher is more important; earlier suggestions win ties
+        item = (-SEVERITY_ORDER.get(suggestion.severity, 3), suggestion.confidence,
+                -next(self.order), suggestion)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+        elif item[:3] > self.heap[0][:3]:
+            heapq.heapreplace(self.heap, item)
+
+    def best(self) -> List:
+        return [item[-1] for item in sorted(self.heap, key=lambda item: item[:3], reverse=True)]
+
+
+class BudgetReport:
+    """Outcome of a budgeted run, including how complete it is"""
+
+    def __init__(self, top: List, found: Dict[str, int], rules_done: List[str],
+                 rules_total: int, stopped: Optional[Dict[str, Any]], elapsed: float):
+        self.top = top
+        self.found = found
+        self.rules_done = rules_done
+        self.rules_total = rules_total
+        self.stopped = stopped      # {'rule', 'steps'} of the rule the deadline interrupted
+        self.elapsed = elapsed
+
+    @property
+    def complete(self) -> bool:
+        return len(self.rules_done) == self.rules_total
+
+    def marker(self) -> str:
+        if self.complete:
+            return f"complete ({self.rules_total} rules, {self.elapsed * 1000:.0f}ms)"
+        where = f", {self.stopped['rule']} stopped after {self.stopped['steps']} steps" \
+            if self.stopped else ""
+        return (f"partial ({len(self.rules_done)}/{self.rules_total} rules in "
+                f"{self.elapsed * 1000:.0f}ms{where})")
+
+
+def run_budgeted(agents, content: List[str], budget: float, k: int = TOP_K,
+                 profiler=None) -> BudgetReport:
+    """Run every agent's rules over content, stopping at the deadline"""
+    return run_rules([rule for agent in agents for rule in agent.rules()], content, budget, k,
+                     profiler)
+
+
+def run_rules(rules, content: List[str], budget: float, k: int = TOP_K,
+              profiler=None) -> BudgetReport:
+    """Run rules by priority over content, stopping at the deadline
+
+    A swarm_profile.SwarmProfiler, if given, measures each rule.
+    """
+    if profiler is not None:
+        rules = profiler.wrap(rules)
+    started = time.perf_counter()
+    deadline = started + budget
+    rules = sorted(rules, key=lambda rule: SEVERITY_ORDER.get(rule.severity, 3))
+    top = TopK(k)
+    found = {severity: 0 for severity in SEVERITY_ORDER}
+    features = LineFeatures(content)
+    contexts = {}                   # one context per agent, as in analyze(); line features shared
+    done, stopped = [], None
+
+    for rule in rules:
+        name = f"{rule.agent}.{rule.name}"
+        if time.perf_counter() >= deadline:
+            break
+        steps = 0
+        context = contexts.setdefault(rule.agent, {'features': features})
+        for steps, suggestion in enumerate(rule.scan(content, context), 1):
+            if suggestion is not None:
+                top.push(suggestion)
+                found[suggestion.severity] = found.get(suggestion.severity, 0) + 1
+            if not steps % CHECK_EVERY and time.perf_counter() >= deadline:
+                stopped = {'rule': name, 'steps': steps}
+                break
+        else:
+            done.append(name)
+            continue
+        break
+
+    return BudgetReport(top.best(), found, done, len(rules), stopped,
+                        time.perf_counter() - started)
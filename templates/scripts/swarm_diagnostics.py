@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Resident VimSwarm: diagnostics pushed into Neovim as you edit
+
+Instead of a one-shot process per check, one server stays connected:
+
+- every analyzed buffer is mirrored through nvim_buf_attach, so an edit
+  costs its changed lines on the wire, not the buffer;
+- BufWritePost/TextChanged autocmds rpcnotify the server, which debounces
+  them per buffer;
+- rules that look at one line at a time are re-run only for changed lines
+  (results are cached per line text), buffer-wide rules run under a small
+  time budget;
+- results go to vim.diagnostic, one namespace per agent, and are dropped if
+  the buffer changed again in the meantime.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import swarm_budget
+
+EVENT = 'vimswarm_changed'
+DEBOUNCE = 0.03           # seconds of quiet after TextChanged before analyzing
+BUFFER_BUDGET = 0.02      # per analysis, for rules that need the whole buffer
+MAX_DIAGNOSTICS = 500     # per agent and buffer
+MEMO_SIZE = 50000         # distinct line texts with cached per-line results
+
+VIM_SEVERITY = {'error': 'ERROR', 'warning': 'WARN', 'info': 'INFO'}
+
+# Notify our channel on edits and saves; removes itself if we went away
+AUTOCMD_LUA = """
+local chan, event = ...
+local group = vim.api.nvim_create_augroup('VimSwarmDiagnostics', { clear = true })
+vim.api.nvim_create_autocmd({ 'BufWritePost', 'TextChanged', 'TextChangedI', 'BufEnter' }, {
+  group = group,
+  callback = function(ev)
+    if vim.bo[ev.buf].buftype ~= '' then
+      return
+    end
+    local ok = pcall(vim.rpcnotify, chan, event, ev.buf, ev.event,
+                     vim.api.nvim_buf_get_changedtick(ev.buf))
+    if not ok then
+      pcall(vim.api.nvim_del_augroup_by_id, group)
+    end
+  end,
+})
+return vim.api.nvim_get_current_buf()
+"""
+
+# Replace each agent's diagnostics unless the buffer moved past `tick`
+PUBLISH_LUA = """
+local buf, tick, results = ...
+if not vim.api.nvim_buf_is_valid(buf) or vim.api.nvim_buf_get_changedtick(buf) ~= tick then
+  return false
+end
+for agent, items in pairs(results) do
+  local ns = vim.api.nvim_create_namespace('vimswarm.' .. agent)
+  local diagnostics = {}
+  for _, d in ipairs(items) do
+    diagnostics[#diagnostics + 1] = {
+      lnum = d[1], end_lnum = d[2], col = 0,
+      severity = vim.diagnostic.severity[d[3]], message = d[4], source = agent,
+    }
+  end
+  vim.diagnostic.set(ns, buf, diagnostics)
+end
+return true
+"""
+
+CLEAR_LUA = """
+pcall(vim.api.nvim_del_augroup_by_name, 'VimSwarmDiagnostics')
+for _, agent in ipairs(...) do
+  vim.diagnostic.reset(vim.api.nvim_create_namespace('vimswarm.' .. agent))
+end
+"""
+
+Diagnostic = Tuple[int, int, str, str]     # lnum, end_lnum (0-based), severity, message
+
+
+def to_diagnostic(s) -> Diagnostic:
+    return (s.line_start - 1, s.line_end - 1, VIM_SEVERITY.get(s.severity, 'INFO'),
+            f"{s.reason} → {s.suggested}")
+
+
+class Mirror:
+    """Local copy of one buffer, kept current from line events"""
+
+    def __init__(self, bufnr: int):
+        self.bufnr = bufnr
+        self.lines: List[str] = []
+        self.tick = -1
+        self.ready = False
+        self.line_results: List[Optional[list]] = []   # per-line rule output, None = stale
+        self.published: Dict[str, list] = {}
+        self.buffer_results: Tuple[int, Dict] = (-1, {})
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.dirty_since: Optional[float] = None
+        self.running = False
+
+    def apply(self, tick, first, last, data):
+        if last == -1:
+            self.lines = list(data)
+            self.line_results = [None] * len(data)
+            self.ready = True
+        else:
+            self.lines[first:last] = data
+            self.line_results[first:last] = [None] * len(data)
+        if tick is not None:
+            self.tick = tick
+
+
+class DiagnosticsServer:
+    """Keeps vim.diagnostic current for every buffer edited in the given instances"""
+
+    def __init__(self, agents, clients: Dict[str, object], debounce: float = DEBOUNCE,
+                 budget: float = BUFFER_BUDGET):
+        self.agents = agents
+        self.clients = clients
+        self.debounce = debounce
+        self.budget = budget
+        rules = [rule for agent in agents for rule in agent.rules()]
+        self.line_rules = [rule for rule in rules if rule.per_line]
+        self.buffer_rules = [rule for rule in rules if not rule.per_line]
+        self.mirrors: Dict[Tuple[str, int], Mirror] = {}
+        self.memo: 'OrderedDict[str, list]' = OrderedDict()
+        self.analyses = 0
+        self.rechecked = 0
+        self.latency = None
+
+    async def start(self):
+        await asyncio.gather(*[self.subscribe(name, client) for name, client in self.clients.items()])
+
+    async def subscribe(self, name: str, client):
+        client.on_notification(EVENT, lambda args: self.on_event(name, args))
+        client.on_notification('nvim_buf_lines_event', lambda args: self.on_lines(name, args))
+        client.on_notification('nvim_buf_changedtick_event', lambda args: self.on_tick(name, args))
+        client.on_notification('nvim_buf_detach_event', lambda args: self.on_detach(name, args))
+        channel = (await client.request('nvim_get_api_info'))[0]
+        current = await client.request('nvim_exec_lua', AUTOCMD_LUA, [channel, EVENT])
+        await self.attach(name, getattr(current, 'id', current))
+        print(f"✓ {name}: publishing diagnostics")
+
+    async def attach(self, name: str, bufnr: int):
+        if (name, bufnr) in self.mirrors:
+            return
+        self.mirrors[(name, bufnr)] = Mirror(bufnr)
+        # send_buffer: the first lines event carries the whole buffer
+        if not await self.clients[name].request('nvim_buf_attach', bufnr, True, {}):
+            del self.mirrors[(name, bufnr)]
+
+    def on_event(self, name: str, args):
+        bufnr, event, _ = args
+        mirror = self.mirrors.get((name, bufnr))
+        if mirror is None:
+            asyncio.ensure_future(self.attach(name, bufnr))
+            return
+        if event == 'BufEnter' and mirror.published:
+            return
+        self.schedule(name, mirror, 0 if event == 'BufWritePost' else self.debounce)
+
+    def on_lines(self, name: str, args):
+        buf, tick, first, last, data = args[:5]
+        mirror = self.mirrors.get((name, getattr(buf, 'id', buf)))
+        if mirror is None:
+            return
+        first_load = not mirror.ready
+        mirror.apply(tick, first, last, data)
+        if mirror.dirty_since is None:
+            mirror.dirty_since = time.perf_counter()
+        if first_load:
+            self.schedule(name, mirror, 0)
+
+    def on_tick(self, name: str, args):
+        """changedtick moved without a text change (e.g. :w); publishing checks the tick"""
+        buf, tick = args[:2]
+        mirror = self.mirrors.get((name, getattr(buf, 'id', buf)))
+        if mirror is not None and mirror.ready and tick > mirror.tick:
+            mirror.tick = tick
+            # A publish refused for the old tick would otherwise never be retried
+            self.schedule(name, mirror, self.debounce)
+
+    def on_detach(self, name: str, args):
+        mirror = self.mirrors.pop((name, getattr(args[0], 'id', args[0])), None)
+        if mirror is not None and mirror.timer is not None:
+            mirror.timer.cancel()
+
+    def schedule(self, name: str, mirror: Mirror, delay: float):
+        if mirror.timer is not None:
+            mirror.timer.cancel()
+        loop = asyncio.get_running_loop()
+        mirror.timer = loop.call_later(delay, lambda: asyncio.ensure_future(self.analyze(name, mirror)))
+
+    def check_line(self, text: str) -> list:
+        """Per-line rule output for one line of text, cached by content"""
+        cached = self.memo.get(text)
+        if cached is not None:
+            self.memo.move_to_end(text)
+            return cached
+        found = []
+        for rule in self.line_rules:
+            for s in rule.scan([text], {}):
+                if s is not None:
+                    found.append((rule.agent, s))
+        self.memo[text] = found
+        if len(self.memo) > MEMO_SIZE:
+            self.memo.popitem(last=False)
+        return found
+
+    def collect(self, mirror: Mirror) -> Dict[str, List[Diagnostic]]:
+        results = {agent.name: [] for agent in self.agents}
+        for i, cached in enumerate(mirror.line_results):
+            if cached is None:
+                cached = mirror.line_results[i] = self.check_line(mirror.lines[i])
+                self.rechecked += 1
+            for agent, s in cached:
+                lnum, end, severity, message = to_diagnostic(s)
+                results[agent].append((i, i + end - lnum, severity, message))
+
+        tick, by_agent = mirror.buffer_results
+        if tick != mirror.tick:
+            report = swarm_budget.run_rules(self.buffer_rules, mirror.lines, self.budget,
+                                            MAX_DIAGNOSTICS * len(self.agents))
+            by_agent = {}
+            for s in report.top:
+                by_agent.setdefault(s.agent_name, []).append(to_diagnostic(s))
+            mirror.buffer_results = (mirror.tick, by_agent)
+        for agent, diagnostics in by_agent.items():
+            results[agent].extend(diagnostics)
+        return {agent: diagnostics[:MAX_DIAGNOSTICS] for agent, diagnostics in results.items()}
+
+    async def analyze(self, name: str, mirror: Mirror):
+        if mirror.running or not mirror.ready:
+            return
+        mirror.running = True
+        try:
+            tick = mirror.tick
+            results = self.collect(mirror)
+            changed = {agent: [list(d) for d in diagnostics] for agent, diagnostics in results.items()
+                       if diagnostics != mirror.published.get(agent)}
+            self.analyses += 1
+            if changed:
+                if not await self.clients[name].request('nvim_exec_lua', PUBLISH_LUA,
+                                                        [mirror.bufnr, tick, changed]):
+                    return   # edited again meanwhile; that edit schedules a new run
+                mirror.published.update(results)
+            if mirror.dirty_since is not None:
+                elapsed = (time.perf_counter() - mirror.dirty_since) * 1000
+                self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+                mirror.dirty_since = None
+        except (ConnectionError, OSError) as e:
+            print(f"✗ {name}: {e}")
+        finally:
+            mirror.running = False
+            if mirror.tick != tick and (name, mirror.bufnr) in self.mirrors:
+                self.schedule(name, mirror, self.debounce)
+
+    def stats(self) -> Dict:
+        return {'buffers': len(self.mirrors), 'analyses': self.analyses,
+                'lines_rechecked': self.rechecked, 'memo': len(self.memo),
+                'latency_ms': round(self.latency, 1) if self.latency is not None else None}
+
+    async def close(self):
+        for mirror in self.mirrors.values():
+            if mirror.timer is not None:
+                mirror.timer.cancel()
+        agents = [agent.name for agent in self.agents]
+        await asyncio.gather(*[
+            client.request('nvim_exec_lua', CLEAR_LUA, [agents]) for client in self.clients.values()
+        ], return_exceptions=True)
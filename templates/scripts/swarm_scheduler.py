@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Work-stealing scheduler for VimSwarm analysis
+
+Analysis is split into one task per (file, agent) and run on a pool of local
+worker processes. Tasks are dealt out by estimated finish time using each
+worker's measured throughput; a worker that runs dry steals from the tail of
+the most loaded queue, and a worker whose process dies has its queue dealt
+out again, so a run ends at the pace of the whole pool instead of the slowest
+pinned agent.
+"""
+
+import asyncio
+import collections
+import importlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple
+
+# Smoothing for the per-worker throughput estimate (lines per second)
+RATE_ALPHA = 0.3
+
+# Files a worker process keeps so several agents can share one transfer
+_content: 'collections.OrderedDict[str, List[str]]' = collections.OrderedDict()
+CONTENT_CACHE = 32
+
+
+class ContentMissing(Exception):
+    """The worker process does not hold this file (yet)"""
+
+
+def run_agent(module: str, agent: str, key: str, lines):
+    """Runs inside a worker process: one agent over one file's lines"""
+    if lines is None:
+        if key not in _content:
+            raise ContentMissing(key)
+        lines = _content[key]
+        _content.move_to_end(key)
+    else:
+        _content[key] = lines
+        while len(_content) > CONTENT_CACHE:
+            _content.popitem(last=False)
+    import asyncio as _asyncio
+    agent_type = getattr(importlib.import_module(module), 'AGENT_TYPES')[agent]
+    return _asyncio.run(agent_type().analyze(lines))
+
+
+class Task:
+    """One agent over one file"""
+
+    __slots__ = ('key', 'agent', 'cost')
+
+    def __init__(self, key: str, agent: str, cost: int):
+        self.key = key
+        self.agent = agent
+        self.cost = max(cost, 1)
+
+
+class Worker:
+    """A dedicated process with its own deque of tasks"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.queue: 'collections.deque[Task]' = collections.deque()
+        self.executor = ProcessPoolExecutor(max_workers=1)
+        self.seen = set()       # content keys this process already holds
+        self.rate = None        # lines per second, measured
+        self.done = 0
+        self.stolen = 0
+        self.alive = True
+
+    def backlog(self) -> int:
+        return sum(task.cost for task in self.queue)
+
+    def eta(self, default_rate: float) -> float:
+        return self.backlog() / (self.rate or default_rate)
+
+
+class WorkStealingScheduler:
+    """Runs tasks across worker processes, stealing work to stay balanced"""
+
+    def __init__(self, workers: int = None, module: str = 'vim_swarm'):
+        count = workers or os.cpu_count() or 1
+        self.module = module
+        self.workers = [Worker(f'worker{i}') for i in range(1, count + 1)]
+        self.content: Dict[str, List[str]] = {}
+        self.results: Dict[Tuple[str, str], Any] = {}
+        self.failures: Dict[Tuple[str, str], Exception] = {}
+        self.outstanding = 0
+        self.changed = None
+
+    def default_rate(self) -> float:
+        rates = [w.rate for w in self.workers if w.rate]
+        return sum(rates) / len(rates) if rates else 1.0
+
+    def deal(self, tasks: List[Task]):
+        """Give each task, largest first, to the worker that would finish it soonest"""
+        rate = self.default_rate()
+        live = [w for w in self.workers if w.alive]
+        for task in sorted(tasks, key=lambda t: t.cost, reverse=True):
+            worker = min(live, key=lambda w: w.eta(rate) + task.cost / (w.rate or rate))
+            worker.queue.append(task)
+
+    def next_task(self, worker: Worker):
+        """Own work from the front, otherwise steal from the back of the most loaded queue"""
+        if worker.queue:
+            return worker.queue.popleft()
+        rate = self.default_rate()
+        victims = [w for w in self.workers if w is not worker and w.queue]
+        if not victims:
+            return None
+        victim = max(victims, key=lambda w: w.eta(rate))
+        worker.stolen += 1
+        return victim.queue.pop()
+
+    async def execute(self, worker: Worker, task: Task):
+        loop = asyncio.get_running_loop()
+        lines = None if task.key in worker.seen else self.content[task.key]
+        try:
+            return await loop.run_in_executor(worker.executor, run_agent,
+                                              self.module, task.agent, task.key, lines)
+        except ContentMissing:
+            worker.seen.discard(task.key)
+            return await loop.run_in_executor(worker.executor, run_agent, self.module,
+                                              task.agent, task.key, self.content[task.key])
+        finally:
+            worker.seen.add(task.key)
+
+    async def drive(self, worker: Worker):
+        while self.outstanding:
+            task = self.next_task(worker)
+            if task is None:
+                self.changed.clear()
+                await self.changed.wait()
+                continue
+            started = time.perf_counter()
+            try:
+                result = await self.execute(worker, task)
+            except BrokenProcessPool:
+                # The process died: hand its work to the rest of the pool
+                worker.alive = False
+                orphans = [task] + list(worker.queue)
+                worker.queue.clear()
+                if any(w.alive for w in self.workers):
+                    self.deal(orphans)
+                else:
+                    for orphan in orphans:
+                        self.fail(orphan, RuntimeError('all workers died'))
+                self.changed.set()
+                return
+            except Exception as e:
+                self.fail(task, e)
+                continue
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            rate = task.cost / elapsed
+            worker.rate = rate if worker.rate is None else \
+                RATE_ALPHA * rate + (1 - RATE_ALPHA) * worker.rate
+            worker.done += 1
+            self.results[(task.key, task.agent)] = result
+            self.finish()
+
+    def fail(self, task: Task, error: Exception):
+        self.failures[(task.key, task.agent)] = error
+        self.finish()
+
+    def finish(self):
+        self.outstanding -= 1
+        if not self.outstanding:
+            self.changed.set()
+
+    async def run(self, content: Dict[str, List[str]], agents: List[str]):
+        """Analyze every file with every agent; returns {(key, agent): suggestions}"""
+        self.content = content
+        tasks = [Task(key, agent, len(lines)) for key, lines in content.items() for agent in agents]
+        self.outstanding = len(tasks)
+        self.changed = asyncio.Event()
+        self.deal(tasks)
+        try:
+            await asyncio.gather(*[self.drive(w) for w in self.workers])
+        finally:
+            for worker in self.workers:
+                worker.executor.shutdown(wait=False, cancel_futures=True)
+        return self.results
+
+    def stats(self) -> List[Dict]:
+        return [{'worker': w.name, 'tasks': w.done, 'stolen': w.stolen, 'alive': w.alive,
+                 'lines_per_sec': round(w.rate or 0)} for w in self.workers]
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Debounce and coalesce sync requests per (source, target)
+
+Agents trigger syncs as separate script invocations, often several within a
+few milliseconds. The first request for a (source, target) pair becomes the
+leader. A request for a quiet pair transfers at once; one that lands in a
+burst (another request for the pair within the debounce window) waits until
+the pair has been quiet for the window, then performs one transfer of the
+latest state. Requests arriving while a leader is pending just wait for its
+transfer instead of doing their own. State lives in a small flock-guarded
+file so this works across processes as well as within one; a leader whose
+process has exited is noticed by its pid and replaced by a waiting follower.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+ORCHESTRA_DIR = os.path.expanduser('~/.config/nvim/orchestra')
+STATE_FILE = os.path.join(ORCHESTRA_DIR, 'sync_state.json')
+
+WINDOW = 0.05          # quiet period before a leader transfers during a burst
+MAX_WAIT = 0.5         # a steady stream of requests cannot postpone a transfer longer
+POLL = 0.01            # how often followers check for their transfer
+STALE = 30.0           # a live leader this slow is assumed stuck
+
+
+def _alive(pid) -> bool:
+    """Whether the process that took a lead still exists"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SyncCoordinator:
+    """Shared debounce state for sync requests"""
+
+    def __init__(self, path: str = STATE_FILE, window: float = WINDOW):
+        self.path = path
+        self.window = window
+
+    @contextmanager
+    def _state(self):
+        """Read-modify-write the state file under an exclusive lock"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path) as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                yield state
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump(state, f)
+                os.replace(tmp, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _enqueue(self, source_key: str, target_keys: Dict[str, str]) -> Tuple[Dict, Dict, bool]:
+        """Take a ticket per target; returns ({name: ticket} led, {name: ticket} followed, burst)
+
+        burst is true when any of the pairs was requested within the window,
+        the only case where waiting for more requests can pay off.
+        """
+        now = time.time()
+        lead, follow = {}, {}
+        burst = False
+        with self._state() as state:
+            for name, target_key in target_keys.items():
+                entry = state.setdefault(f"{source_key}>{target_key}", {
+                    'requested': 0, 'performed': 0, 'done': 0, 'pending_since': 0, 'error': None,
+                })
+                burst = burst or now - entry.get('last_request', 0) < self.window
+                entry['requested'] += 1
+                entry['last_request'] = now
+                if entry['pending_since'] and _alive(entry.get('leader')):
+                    follow[name] = entry['requested']
+                else:
+                    entry['pending_since'] = now
+                    entry['leader'] = os.getpid()
+                    lead[name] = entry['requested']
+        return lead, follow, burst
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    async def _debounce(self, keys: Dict[str, str], lead: Dict[str, int]):
+        """Wait until the pairs have been quiet for a whole window (at most MAX_WAIT)"""
+        started = time.time()
+        while True:
+            state = self._read()
+            latest = max(state.get(keys[n], {}).get('last_request', 0) for n in lead)
+            remaining = latest + self.window - time.time()
+            if remaining <= 0 or time.time() - started >= MAX_WAIT:
+                return
+            await asyncio.sleep(min(remaining, MAX_WAIT - (time.time() - started)))
+
+    async def _transfer(self, keys: Dict[str, str], names: List[str],
+                        perform: Callable[[List[str]], Awaitable[None]]) -> Dict[str, str]:
+        """Perform one transfer for names, releasing everyone it covers"""
+        # Everything requested up to now is covered by this transfer
+        covered = {}
+        with self._state() as state:
+            for name in names:
+                entry = state[keys[name]]
+                covered[name] = entry['requested']
+                entry['pending_since'] = 0
+        outcome = {}
+        error = 'cancelled'
+        try:
+            await perform(names)
+            error = None
+        except Exception as e:
+            error = str(e)
+        finally:
+            # Release followers even if the transfer failed or was cancelled
+            with self._state() as state:
+                for name in names:
+                    entry = state[keys[name]]
+                    entry['done'] = max(entry['done'], covered[name])
+                    entry['performed'] += 1
+                    entry['error'] = error
+                    outcome[name] = f"error: {error}" if error else 'performed'
+        return outcome
+
+    def _take_over(self, keys: Dict[str, str], orphaned: Dict[str, Tuple[int, int]]) -> List[str]:
+        """Lead the pairs whose leader died or got stuck ({name: (ticket, leader pid)})"""
+        taken = []
+        with self._state() as state:
+            for name, (ticket, leader) in orphaned.items():
+                entry = state[keys[name]]
+                # Another follower may have taken over (or the leader finished) meanwhile
+                if entry['done'] < ticket and entry.get('leader') == leader:
+                    entry['pending_since'] = time.time()
+                    entry['leader'] = os.getpid()
+                    taken.append(name)
+        return taken
+
+    async def sync(self, source_key: str, target_keys: Dict[str, str],
+                   perform: Callable[[List[str]], Awaitable[None]]) -> Dict[str, str]:
+        """Sync source to targets ({name: key}), sharing transfers with concurrent requests
+
+        perform(names) runs the real sync for the targets this call leads.
+        Returns {name: 'performed' | 'coalesced' | 'error: ...'}.
+        """
+        if not self.window:
+            await perform(list(target_keys))
+            return {name: 'performed' for name in target_keys}
+
+        keys = {name: f"{source_key}>{key}" for name, key in target_keys.items()}
+        lead, follow, burst = self._enqueue(source_key, target_keys)
+        outcome = {}
+
+        if lead:
+            if burst:
+                await self._debounce(keys, lead)
+            outcome.update(await self._transfer(keys, list(lead), perform))
+
+        waiting = dict(follow)
+        deadline = time.time() + STALE
+        while waiting:
+            state = self._read()
+            orphaned = {}
+            for name, ticket in list(waiting.items()):
+                entry = state.get(keys[name], {})
+                if entry.get('done', 0) >= ticket:
+                    outcome[name] = f"error: {entry['error']}" if entry.get('error') else 'coalesced'
+                    del waiting[name]
+                elif not _alive(entry.get('leader')) or time.time() >= deadline:
+                    orphaned[name] = (ticket, entry.get('leader'))
+            if orphaned:
+                # The leader vanished; do the work ourselves
+                taken = self._take_over(keys, orphaned)
+                if taken:
+                    outcome.update(await self._transfer(keys, taken, perform))
+                    for name in taken:
+                        del waiting[name]
+                deadline = time.time() + STALE
+            if waiting:
+                await asyncio.sleep(POLL)
+        return outcome
+
+    def stats(self) -> Dict[str, float]:
+        """Requests, transfers and their ratio across every pair"""
+        state = self._read()
+        requested = sum(entry.get('requested', 0) for entry in state.values())
+        performed = sum(entry.get('performed', 0) for entry in state.values())
+        return {'requested': requested, 'performed': performed,
+                'ratio': round(requested / performed, 2) if performed else 0.0}
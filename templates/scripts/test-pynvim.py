@@ -15,10 +15,17 @@ def test_connection(port):
         return False
 
 if __name__ == "__main__":
+    ports = [7777, 7778, 7779]
+    
+    if "--fake" in sys.argv:
+        # Check pynvim itself against in-process fake instances (no editors needed)
+        import fake_nvim
+        fleet = fake_nvim.serve_in_thread(fake_nvim.FakeFleet(len(ports)))
+        ports = [endpoint[2] for endpoint in fleet.endpoints]
+    
     print("Testing pynvim connections...")
     print("-" * 40)
     
-    ports = [7777, 7778, 7779]
     connected = 0
     
     for port in ports:
@@ -31,6 +38,8 @@ if __name__ == "__main__":
     if connected == 0:
         print("\nNo Neovim instances found. Start orchestra first:")
         print("  nvim-orchestra")
+        print("or test against fake instances:")
+        print("  python3 test-pynvim.py --fake")
         sys.exit(1)
     else:
         print("\n✅ pynvim is working correctly!")
\ No newline at end of file
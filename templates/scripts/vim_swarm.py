@@ -4,15 +4,46 @@ VimSwarm - Multiple AI agents collaborating in Neovim
 Each agent runs in a separate Neovim instance for parallel processing
 """
 
-import asyncio
-import pynvim
+import contextlib
+import os
+import re
+import sys
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, Iterator, List, Optional
 import json
-import tempfile
-import subprocess
 from dataclasses import dataclass
 from datetime import datetime
+from orchestra_cli import StartupTimer, lazy_import
+
+TIMER = StartupTimer()
+
+# Deferred until first use so argument errors return instantly
+asyncio = lazy_import('asyncio')
+nvim_rpc = lazy_import('nvim_rpc')
+orchestra_lua = lazy_import('orchestra_lua')
+instance_registry = lazy_import('instance_registry')
+swarm_scheduler = lazy_import('swarm_scheduler')
+loop_index = lazy_import('loop_index')
+swarm_budget = lazy_import('swarm_budget')
+swarm_diagnostics = lazy_import('swarm_diagnostics')
+line_features = lazy_import('line_features')
+swarm_profile = lazy_import('swarm_profile')
+
+RESULTS_FILE = '/tmp/vimswarm_results.txt'
+LAST_RUN_FILE = '/tmp/vimswarm_last.json'
+PROFILE_FILE = '/tmp/vimswarm_profile.json'
+
+# Every listed, loaded, named buffer as {bufnr, name}
+LISTED_BUFFERS_LUA = """
+local out = {}
+for _, b in ipairs(vim.api.nvim_list_bufs()) do
+  local name = vim.api.nvim_buf_get_name(b)
+  if vim.bo[b].buflisted and vim.api.nvim_buf_is_loaded(b) and name ~= '' then
+    out[#out + 1] = {b, name}
+  end
+end
+return out
+"""
 
 
 @dataclass
@@ -28,6 +59,16 @@ class Suggestion:
     confidence: float  # 0.0 to 1.0
 
 
+@dataclass
+class Rule:
+    """One check of an agent; scan() yields a Suggestion or None per unit of work"""
+    agent: str
+    name: str
+    severity: str  # priority when a run is time-budgeted
+    scan: Callable[[List[str], Dict[str, Any]], Iterator[Optional[Suggestion]]]
+    per_line: bool = False  # looks at one line at a time, so results can be cached per line
+
+
 class BaseAgent(ABC):
     """Base class for all VimSwarm agents"""
     
@@ -36,10 +77,10 @@ class BaseAgent(ABC):
         self.nvim_port = nvim_port
         self.nvim = None
         
-    def connect(self):
+    async def connect(self):
         """Connect to Neovim instance"""
         try:
-            self.nvim = pynvim.attach('tcp', address='127.0.0.1', port=self.nvim_port)
+            self.nvim = await nvim_rpc.RpcClient.connect(('tcp', '127.0.0.1', self.nvim_port), self.name)
             print(f"✓ {self.name} connected to port {self.nvim_port}")
             return True
         except Exception as e:
@@ -47,20 +88,36 @@ class BaseAgent(ABC):
             return False
             
     @abstractmethod
-    async def analyze(self, content: List[str]) -> List[Suggestion]:
-        """Analyze content and return suggestions"""
+    def rules(self) -> List[Rule]:
+        """The agent's checks, each tagged with the severity it reports"""
         pass
     
+    async def analyze(self, content: List[str], context: Optional[Dict[str, Any]] = None,
+                      profiler=None) -> List[Suggestion]:
+        """Analyze content and return suggestions
+        
+        context may carry shared line features; a swarm_profile.SwarmProfiler
+        measures every rule.
+        """
+        context = {} if context is None else context
+        rules = self.rules() if profiler is None else profiler.wrap(self.rules())
+        return [s for rule in rules for s in rule.scan(content, context) if s is not None]
+    
+    def suggestion(self, kind: str, line_start: int, line_end: int, original: str,
+                   suggested: str, reason: str, severity: str, confidence: float) -> Suggestion:
+        return Suggestion(self.name, kind, line_start, line_end, original, suggested,
+                          reason, severity, confidence)
+    
     async def highlight_issue(self, suggestion: Suggestion):
         """Highlight issues in Neovim"""
         if self.nvim:
             # Create a custom highlight group
-            self.nvim.command(f'highlight {self.name}Issue ctermbg=red guibg=#ff0000')
+            await self.nvim.request('nvim_command', f'highlight {self.name}Issue ctermbg=red guibg=#ff0000')
             
             # Add virtual text for the issue
-            ns_id = self.nvim.funcs.nvim_create_namespace(self.name)
-            self.nvim.funcs.nvim_buf_set_virtual_text(
-                0, ns_id, suggestion.line_start - 1,
+            ns_id = await self.nvim.request('nvim_create_namespace', self.name)
+            await self.nvim.request(
+                'nvim_buf_set_virtual_text', 0, ns_id, suggestion.line_start - 1,
                 [[f" {self.name}: {suggestion.reason}", f"{self.name}Issue"]], {}
             )
 
@@ -71,9 +128,13 @@ class RefactorAgent(BaseAgent):
     def __init__(self, nvim_port: int = 7777):
         super().__init__("RefactorAgent", nvim_port)
         
-    async def analyze(self, content: List[str]) -> List[Suggestion]:
-        suggestions = []
-        
+    def rules(self) -> List[Rule]:
+        return [
+            Rule(self.name, 'long_function', 'warning', self.long_functions),
+            Rule(self.name, 'duplicate_code', 'info', self.duplicates),
+        ]
+    
+    def long_functions(self, content, context):
         # Check for long functions
         in_function = False
         function_start = 0
@@ -87,38 +148,28 @@ class RefactorAgent(BaseAgent):
             elif in_function:
                 function_lines += 1
                 if function_lines > 20 and (line.strip() == '' or i == len(content) - 1):
-                    suggestions.append(Suggestion(
-                        agent_name=self.name,
-                        type='refactor',
-                        line_start=function_start + 1,
-                        line_end=i + 1,
-                        original="Long function",
-                        suggested="Split into smaller functions",
-                        reason=f"Function is {function_lines} lines long (recommended: <20)",
-                        severity='warning',
-                        confidence=0.8
-                    ))
+                    yield self.suggestion(
+                        'refactor', function_start + 1, i + 1,
+                        "Long function", "Split into smaller functions",
+                        f"Function is {function_lines} lines long (recommended: <20)",
+                        'warning', 0.8)
                     in_function = False
-        
+                    continue
+            yield None
+    
+    def duplicates(self, content, context):
         # Check for duplicate code patterns
         for i in range(len(content) - 3):
             pattern = content[i:i+3]
             for j in range(i + 3, len(content) - 3):
                 if content[j:j+3] == pattern and len(''.join(pattern).strip()) > 30:
-                    suggestions.append(Suggestion(
-                        agent_name=self.name,
-                        type='refactor',
-                        line_start=i + 1,
-                        line_end=i + 3,
-                        original=''.join(pattern),
-                        suggested="Extract to function",
-                        reason="Duplicate code detected",
-                        severity='info',
-                        confidence=0.7
-                    ))
+                    yield self.suggestion(
+                        'refactor', i + 1, i + 3, ''.join(pattern),
+                        "Extract to function", "Duplicate code detected", 'info', 0.7)
                     break
-        
-        return suggestions
+                if not j % 256:
+                    yield None
+            yield None
 
 
 class SecurityAgent(BaseAgent):
@@ -131,113 +182,128 @@ class SecurityAgent(BaseAgent):
             'aws_access_key', 'database_url', 'connection_string'
         ]
         
-    async def analyze(self, content: List[str]) -> List[Suggestion]:
-        suggestions = []
-        
-        for i, line in enumerate(content):
+    def rules(self) -> List[Rule]:
+        return [
+            Rule(self.name, 'hardcoded_secret', 'error', self.secrets, per_line=True),
+            Rule(self.name, 'sql_injection', 'error', self.sql_injection, per_line=True),
+            Rule(self.name, 'eval', 'warning', self.eval_calls, per_line=True),
+        ]
+    
+    def secrets(self, content, context):
+        # Check for hardcoded secrets
+        features = line_features.of(content, context)
+        candidates = (features.contains('=') & (features.contains('"') | features.contains("'"))
+                      & features.any_of(self.sensitive_patterns, ignore_case=True))
+        for i in features.lines_where(candidates):
+            line = content[i]
             line_lower = line.lower()
-            
-            # Check for hardcoded secrets
             for pattern in self.sensitive_patterns:
-                if pattern in line_lower and '=' in line and ('"' in line or "'" in line):
-                    suggestions.append(Suggestion(
-                        agent_name=self.name,
-                        type='security',
-                        line_start=i + 1,
-                        line_end=i + 1,
-                        original=line.strip(),
-                        suggested=f"{pattern.upper()} = os.getenv('{pattern.upper()}')",
-                        reason=f"Possible hardcoded {pattern.replace('_', ' ')}",
-                        severity='error',
-                        confidence=0.9
-                    ))
-            
-            # Check for SQL injection vulnerabilities
-            if 'execute' in line_lower and '%' in line:
-                suggestions.append(Suggestion(
-                    agent_name=self.name,
-                    type='security',
-                    line_start=i + 1,
-                    line_end=i + 1,
-                    original=line.strip(),
-                    suggested="Use parameterized queries",
-                    reason="Potential SQL injection vulnerability",
-                    severity='error',
-                    confidence=0.85
-                ))
-            
-            # Check for eval() usage
-            if 'eval(' in line:
-                suggestions.append(Suggestion(
-                    agent_name=self.name,
-                    type='security',
-                    line_start=i + 1,
-                    line_end=i + 1,
-                    original=line.strip(),
-                    suggested="Use ast.literal_eval() or json.loads()",
-                    reason="eval() is dangerous with untrusted input",
-                    severity='warning',
-                    confidence=0.95
-                ))
-        
-        return suggestions
+                if pattern in line_lower:
+                    yield self.suggestion(
+                        'security', i + 1, i + 1, line.strip(),
+                        f"{pattern.upper()} = os.getenv('{pattern.upper()}')",
+                        f"Possible hardcoded {pattern.replace('_', ' ')}", 'error', 0.9)
+            yield None
+    
+    def sql_injection(self, content, context):
+        # Check for SQL injection vulnerabilities
+        features = line_features.of(content, context)
+        candidates = features.contains('%') & features.contains('execute', ignore_case=True)
+        for i in features.lines_where(candidates):
+            line = content[i]
+            if 'execute' in line.lower():
+                yield self.suggestion(
+                    'security', i + 1, i + 1, line.strip(), "Use parameterized queries",
+                    "Potential SQL injection vulnerability", 'error', 0.85)
+            yield None
+    
+    def eval_calls(self, content, context):
+        # Check for eval() usage
+        features = line_features.of(content, context)
+        for i in features.lines_where(features.contains('eval(')):
+            yield self.suggestion(
+                'security', i + 1, i + 1, content[i].strip(),
+                "Use ast.literal_eval() or json.loads()",
+                "eval() is dangerous with untrusted input", 'warning', 0.95)
 
 
 class PerformanceAgent(BaseAgent):
     """Agent focused on performance optimization"""
     
+    # `x += "..."`, `x += f'...'`, `x += str(...)`
+    STRING_CONCAT = re.compile(r'\+=\s*(?:[rfbu]{0,2}["\']|str\()')
+    
+    # Calls that hit the disk, network or another process
+    IO_CALLS = ('open(', 'urlopen(', 'requests.', 'subprocess.', 'os.system(', 'fetch(')
+    
     def __init__(self, nvim_port: int = 7779):
         super().__init__("PerformanceAgent", nvim_port)
         
-    async def analyze(self, content: List[str]) -> List[Suggestion]:
-        suggestions = []
-        
-        for i, line in enumerate(content):
-            # Check for inefficient list operations in loops
-            if 'for ' in line and i + 1 < len(content):
-                next_line = content[i + 1]
-                if '.append(' in next_line and 'for ' in line:
-                    suggestions.append(Suggestion(
-                        agent_name=self.name,
-                        type='performance',
-                        line_start=i + 1,
-                        line_end=i + 2,
-                        original=line + next_line,
-                        suggested="Consider list comprehension",
-                        reason="List comprehension is more efficient than append in loop",
-                        severity='info',
-                        confidence=0.7
-                    ))
-            
-            # Check for repeated file operations
-            if 'open(' in line and 'for ' in content[max(0, i-3):i]:
-                suggestions.append(Suggestion(
-                    agent_name=self.name,
-                    type='performance',
-                    line_start=i + 1,
-                    line_end=i + 1,
-                    original=line.strip(),
-                    suggested="Move file operation outside loop",
-                    reason="File I/O in loop can be slow",
-                    severity='warning',
-                    confidence=0.8
-                ))
-            
-            # Check for inefficient string concatenation
-            if '+=' in line and ('str(' in line or '""' in line or "''" in line):
-                suggestions.append(Suggestion(
-                    agent_name=self.name,
-                    type='performance',
-                    line_start=i + 1,
-                    line_end=i + 1,
-                    original=line.strip(),
-                    suggested="Use list.append() and ''.join()",
-                    reason="String concatenation in loop is inefficient",
-                    severity='info',
-                    confidence=0.6
-                ))
-        
-        return suggestions
+    def rules(self) -> List[Rule]:
+        return [
+            Rule(self.name, 'io_in_loop', 'warning', self.io_in_loop),
+            Rule(self.name, 'nested_loops', 'warning', self.nested_loops),
+            Rule(self.name, 'append_loop', 'info', self.append_loops),
+            Rule(self.name, 'string_concat', 'info', self.string_concat),
+        ]
+    
+    @staticmethod
+    def loops(content, context):
+        """Build the buffer's loop index into context['loops'] unless a previous rule did"""
+        if 'loops' not in context:
+            index = loop_index.LoopIndex(content, build=False)
+            yield from index.steps()
+            context['loops'] = index
+    
+    def io_in_loop(self, content, context):
+        # Check for repeated file and network operations
+        yield from self.loops(content, context)
+        index = context['loops']
+        features = line_features.of(content, context)
+        in_loops = [i for i, header in enumerate(index.loop) if header >= 0]
+        for i in features.lines_where(features.any_of(self.IO_CALLS), among=in_loops):
+            yield self.suggestion(
+                'performance', i + 1, i + 1, content[i].strip(), "Move file operation outside loop",
+                f"I/O in loop can be slow (loop at line {index.loop[i] + 1})", 'warning', 0.8)
+    
+    def nested_loops(self, content, context):
+        # Check for deeply nested loops, reported once at the innermost loop
+        yield from self.loops(content, context)
+        index = context['loops']
+        for header in index.innermost():
+            depth = index.loop_depth(header)
+            if depth >= 2:
+                yield self.suggestion(
+                    'performance', header + 1, index.end[header] + 1, content[header].strip(),
+                    "Index the inner data (dict/set lookup) or restructure the loops",
+                    f"Loop nested {depth} deep: O(n^{depth}) hot spot",
+                    'warning' if depth >= 3 else 'info', 0.6)
+            yield None
+    
+    def append_loops(self, content, context):
+        # Check for loops that only append: a comprehension does the same faster
+        yield from self.loops(content, context)
+        index = context['loops']
+        for i in sorted(index.end):
+            body = [j for j in index.body(i) if content[j].strip()]
+            if len(body) == 1 and '.append(' in content[body[0]]:
+                yield self.suggestion(
+                    'performance', i + 1, body[0] + 1, content[i] + content[body[0]],
+                    "Consider list comprehension",
+                    "List comprehension is more efficient than append in loop", 'info', 0.7)
+            yield None
+    
+    def string_concat(self, content, context):
+        # Check for inefficient string concatenation
+        yield from self.loops(content, context)
+        index = context['loops']
+        features = line_features.of(content, context)
+        for i in features.lines_where(features.contains('+=')):
+            if index.in_loop(i) and self.STRING_CONCAT.search(content[i]):
+                yield self.suggestion(
+                    'performance', i + 1, i + 1, content[i].strip(), "Use list.append() and ''.join()",
+                    "String concatenation in loop is inefficient", 'info', 0.6)
+            yield None
 
 
 class DocumentationAgent(BaseAgent):
@@ -246,41 +312,38 @@ class DocumentationAgent(BaseAgent):
     def __init__(self, nvim_port: int = 7777):  # Share with RefactorAgent
         super().__init__("DocumentationAgent", nvim_port)
         
-    async def analyze(self, content: List[str]) -> List[Suggestion]:
-        suggestions = []
-        
+    def rules(self) -> List[Rule]:
+        return [
+            Rule(self.name, 'undocumented_function', 'warning', self.undocumented),
+            Rule(self.name, 'uncommented_line', 'info', self.long_lines, per_line=True),
+        ]
+    
+    def undocumented(self, content, context):
         # Check for undocumented functions
-        for i, line in enumerate(content):
-            if ('def ' in line or 'function ' in line) and i + 1 < len(content):
+        features = line_features.of(content, context)
+        for i in features.lines_where(features.any_of(('def ', 'function '))):
+            if i + 1 < len(content):
                 next_line = content[i + 1].strip()
                 if not (next_line.startswith('"""') or next_line.startswith("'''")):
-                    suggestions.append(Suggestion(
-                        agent_name=self.name,
-                        type='docs',
-                        line_start=i + 1,
-                        line_end=i + 1,
-                        original=line.strip(),
-                        suggested="Add docstring",
-                        reason="Function lacks documentation",
-                        severity='warning',
-                        confidence=0.9
-                    ))
-            
-            # Check for complex lines without comments
-            if len(line) > 80 and '#' not in line and not line.strip().startswith('#'):
-                suggestions.append(Suggestion(
-                    agent_name=self.name,
-                    type='docs',
-                    line_start=i + 1,
-                    line_end=i + 1,
-                    original=line.strip()[:50] + "...",
-                    suggested="Add explanatory comment",
-                    reason="Complex line without explanation",
-                    severity='info',
-                    confidence=0.5
-                ))
-        
-        return suggestions
+                    yield self.suggestion(
+                        'docs', i + 1, i + 1, content[i].strip(), "Add docstring",
+                        "Function lacks documentation", 'warning', 0.9)
+            yield None
+    
+    def long_lines(self, content, context):
+        # Check for complex lines without comments
+        features = line_features.of(content, context)
+        for i in features.lines_where(features.longer_than(80)):
+            line = content[i]
+            if len(line) > 80 and '#' not in line:
+                yield self.suggestion(
+                    'docs', i + 1, i + 1, line.strip()[:50] + "...", "Add explanatory comment",
+                    "Complex line without explanation", 'info', 0.5)
+            yield None
+
+
+AGENT_TYPES = {cls.__name__: cls for cls in
+               (RefactorAgent, SecurityAgent, PerformanceAgent, DocumentationAgent)}
 
 
 class VimSwarm:
@@ -294,23 +357,91 @@ class VimSwarm:
             DocumentationAgent(7777)  # Shares instance with RefactorAgent
         ]
         self.results = []
+        self.connections = {}
+        
+    async def initialize(self):
+        """Connect all agents to their Neovim instances, one connection per port"""
+        ports = sorted({agent.nvim_port for agent in self.agents})
+        candidates = [(f'nvim-{port}', ('tcp', '127.0.0.1', port)) for port in ports]
+        found = await instance_registry.discover(
+            instance_registry.InstanceRegistry(), candidates,
+            lambda name, endpoint: nvim_rpc.RpcClient.connect(endpoint, name), fixed=True)
+        self.connections = {endpoint[2]: client for _, endpoint, client in found}
         
-    def initialize(self):
-        """Connect all agents to their Neovim instances"""
         connected = []
         for agent in self.agents:
-            if agent.connect():
+            if agent.nvim_port in self.connections:
+                agent.nvim = self.connections[agent.nvim_port]
+                print(f"✓ {agent.name} connected to port {agent.nvim_port}")
                 connected.append(agent)
+            else:
+                print(f"✗ {agent.name} failed to connect: no Neovim on port {agent.nvim_port}")
         self.agents = connected
         return len(connected)
-        
+    
+    async def close(self):
+        """Close every agent connection"""
+        await asyncio.gather(*[client.close() for client in self.connections.values()])
+        
+    async def collect_workspace(self, paths: List[str] = ()) -> Dict[str, List[str]]:
+        """Lines of every listed buffer on the connected instances, plus files from disk
+        
+        A file open in several instances can be read from any of them, so an
+        instance dying mid-collection only moves its reads to the next holder.
+        """
+        ports = list(self.connections)
+        listed = await asyncio.gather(*[
+            self.connections[port].request('nvim_exec_lua', LISTED_BUFFERS_LUA, [])
+            for port in ports
+        ], return_exceptions=True)
+        holders: Dict[str, List] = {}
+        for port, buffers in zip(ports, listed):
+            if isinstance(buffers, Exception):
+                print(f"✗ nvim-{port}: {buffers}")
+                continue
+            for bufnr, name in buffers:
+                holders.setdefault(name, []).append((port, bufnr))
+        for path in paths:
+            holders.setdefault(os.path.abspath(path), [])
+        
+        async def fetch(path):
+            for port, bufnr in holders[path]:
+                try:
+                    return await self.connections[port].request('nvim_buf_get_lines', bufnr, 0, -1, False)
+                except (ConnectionError, OSError, nvim_rpc.RpcError):
+                    continue
+            with open(path, errors='surrogateescape') as f:
+                return f.read().splitlines()
+        
+        names = list(holders)
+        contents = await asyncio.gather(*[fetch(path) for path in names], return_exceptions=True)
+        workspace = {}
+        for path, lines in zip(names, contents):
+            if isinstance(lines, Exception):
+                print(f"✗ {path}: {lines}")
+            elif lines:
+                workspace[path] = lines
+        return workspace
+    
+    async def analyze_workspace(self, workspace: Dict[str, List[str]], workers: int = None):
+        """Run every agent over every file on a work-stealing process pool"""
+        scheduler = swarm_scheduler.WorkStealingScheduler(workers)
+        results = await scheduler.run(workspace, list(AGENT_TYPES))
+        for (path, agent), error in scheduler.failures.items():
+            print(f"✗ {agent} on {path}: {error}")
+        by_file = {path: [] for path in workspace}
+        for (path, _), suggestions in results.items():
+            by_file[path].extend(suggestions)
+        return by_file, scheduler.stats()
+    
     async def analyze_buffer(self, content: List[str]) -> List[Suggestion]:
         """Run all agents in parallel and collect suggestions"""
         print(f"\n🐝 VimSwarm analyzing {len(content)} lines...")
         
-        # Run all agents in parallel
+        # Run all agents in parallel, over one set of line features
+        features = line_features.LineFeatures(content)
         results = await asyncio.gather(*[
-            agent.analyze(content) for agent in self.agents
+            agent.analyze(content, {'features': features}) for agent in self.agents
         ])
         
         # Flatten results
@@ -326,14 +457,16 @@ class VimSwarm:
     
     async def visualize_results(self, suggestions: List[Suggestion]):
         """Display results in a dedicated Neovim buffer"""
-        nvim = pynvim.attach('tcp', address='127.0.0.1', port=7777)
+        nvim = await nvim_rpc.RpcClient.connect(('tcp', '127.0.0.1', 7777), 'VimSwarm')
         
         # Create results buffer
-        nvim.command('vsplit')
-        nvim.command('enew')
-        nvim.command('setlocal buftype=nofile')
-        nvim.command('setlocal bufhidden=wipe')
-        nvim.command('file VimSwarm-Results')
+        await nvim.pipeline([
+            ('nvim_command', 'vsplit'),
+            ('nvim_command', 'enew'),
+            ('nvim_command', 'setlocal buftype=nofile'),
+            ('nvim_command', 'setlocal bufhidden=wipe'),
+            ('nvim_command', 'file VimSwarm-Results'),
+        ])
         
         # Format results
         lines = ["# VimSwarm Analysis Results", f"Generated at: {datetime.now()}", ""]
@@ -355,11 +488,12 @@ class VimSwarm:
                         ""
                     ])
         
-        # Write to buffer
-        nvim.current.buffer[:] = lines
-        
-        # Apply syntax highlighting
-        nvim.command('setlocal filetype=markdown')
+        # Write to buffer and apply syntax highlighting
+        await nvim.pipeline([
+            ('nvim_buf_set_lines', 0, 0, -1, False, lines),
+            ('nvim_command', 'setlocal filetype=markdown'),
+        ])
+        await nvim.close()
         
     def merge_suggestions(self, suggestions: List[Suggestion]) -> List[Suggestion]:
         """Merge overlapping suggestions from different agents"""
@@ -397,85 +531,281 @@ class VimSwarm:
         return merged
 
 
-def main():
-    """Main entry point for VimSwarm"""
-    swarm = VimSwarm()
+async def run(swarm: VimSwarm, port: int = 7777, budget: float = None, top: int = 5,
+              profiler=None):
+    """Connect, analyze the current buffer of one instance and report
     
+    With a budget (seconds) rules run by priority until the deadline and only
+    the most important suggestions are kept. A profiler breaks the run down
+    by agent and rule into PROFILE_FILE and a scratch buffer.
+    """
     # Initialize agents
-    connected_count = swarm.initialize()
+    connected_count = await swarm.initialize()
+    TIMER.mark('connect')
     print(f"✓ Connected to {connected_count} Neovim instances")
     
     if connected_count == 0:
         print("No Neovim instances available. Start some with nvim-orchestra first.")
         return
     
-    # Get content from the first Neovim instance
+    # Get content from the first Neovim instance, reusing an agent connection
+    nvim = None
     try:
-        nvim = pynvim.attach('tcp', address='127.0.0.1', port=7777)
-        content = nvim.current.buffer[:]
-        filename = nvim.current.buffer.name or "[No Name]"
+        if port in swarm.connections:
+            source = swarm.connections[port]
+        else:
+            source = nvim = await nvim_rpc.RpcClient.connect(('tcp', '127.0.0.1', port), f'nvim-{port}')
+        summary = await orchestra_lua.LuaHelpers().call(f'nvim-{port}', source, 'summary', 0)
+        filename = summary['name'] or "[No Name]"
         print(f"Analyzing file: {filename}")
+        
+        # Decide from the checksum whether the buffer is worth downloading
+        if summary['blank']:
+            print("Buffer is empty. Open a file first.")
+            return
+        try:
+            with open(LAST_RUN_FILE) as f:
+                last_run = json.load(f)
+        except (OSError, ValueError):
+            last_run = {}
+        if last_run.get('file') == filename and last_run.get('checksum') == summary['checksum'] \
+                and last_run.get('complete', True) and profiler is None:
+            print(f"Buffer unchanged since last analysis. Results in {RESULTS_FILE}")
+            return
+        
+        content = await source.request('nvim_buf_get_lines', 0, 0, -1, False)
     except Exception as e:
         print(f"Failed to get buffer content: {e}")
         return
+    finally:
+        if nvim:
+            await nvim.close()
     
-    if not content or all(not line.strip() for line in content):
-        print("Buffer is empty. Open a file first.")
-        return
-    
-    # Run analysis synchronously for now (simpler approach)
     print(f"\n🐝 VimSwarm analyzing {len(content)} lines...")
     
-    all_suggestions = []
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    try:
+    report = None
+    if budget:
+        with profiler or contextlib.nullcontext():
+            report = swarm_budget.run_budgeted(swarm.agents, content, budget,
+                                               max(top, swarm_budget.TOP_K), profiler)
+        all_suggestions = report.top
+        found = report.found
+        print(f"  ⏱ Budget {budget * 1000:.0f}ms: {report.marker()}")
+    else:
+        all_suggestions = []
         # Analyze with each agent
-        for agent in swarm.agents:
-            suggestions = loop.run_until_complete(agent.analyze(content))
+        features = line_features.LineFeatures(content)
+        with profiler or contextlib.nullcontext():
+            results = await asyncio.gather(*[agent.analyze(content, {'features': features}, profiler)
+                                             for agent in swarm.agents])
+        for agent, suggestions in zip(swarm.agents, results):
             all_suggestions.extend(suggestions)
             print(f"  ✓ {agent.name}: {len(suggestions)} suggestions")
         
         # Sort by severity and line number
         severity_order = {'error': 0, 'warning': 1, 'info': 2}
         all_suggestions.sort(key=lambda s: (severity_order.get(s.severity, 3), s.line_start))
+        found = {severity: len([s for s in all_suggestions if s.severity == severity])
+                 for severity in ('error', 'warning', 'info')}
+    
+    # Display results
+    print(f"\n📊 Found {sum(found.values())} suggestions:")
+    print(f"  - Errors: {found['error']}")
+    print(f"  - Warnings: {found['warning']}")
+    print(f"  - Info: {found['info']}")
+    if report is not None and len(all_suggestions) < sum(found.values()):
+        print(f"  (kept the {len(all_suggestions)} most important)")
+    
+    # Show the most critical issues
+    if all_suggestions:
+        print("\n🔥 Top Critical Issues:")
+        for i, s in enumerate(all_suggestions[:top]):
+            print(f"  {i+1}. Line {s.line_start}: {s.reason} ({s.agent_name})")
+    
+    # Create a simple results file
+    with open(RESULTS_FILE, 'w') as f:
+        f.write(f"VimSwarm Analysis Results\n")
+        f.write(f"File: {filename}\n")
+        f.write(f"Generated: {datetime.now()}\n")
+        if report is not None:
+            f.write(f"Completeness: {report.marker()}\n")
+        f.write("\n")
         
-        # Display results
-        print(f"\n📊 Found {len(all_suggestions)} suggestions:")
-        print(f"  - Errors: {len([s for s in all_suggestions if s.severity == 'error'])}")
-        print(f"  - Warnings: {len([s for s in all_suggestions if s.severity == 'warning'])}")
-        print(f"  - Info: {len([s for s in all_suggestions if s.severity == 'info'])}")
-        
-        # Show top 5 most critical issues
-        if all_suggestions:
-            print("\n🔥 Top Critical Issues:")
-            for i, s in enumerate(all_suggestions[:5]):
-                print(f"  {i+1}. Line {s.line_start}: {s.reason} ({s.agent_name})")
-        
-        # Create a simple results file
-        with open('/tmp/vimswarm_results.txt', 'w') as f:
-            f.write(f"VimSwarm Analysis Results\n")
-            f.write(f"File: {filename}\n")
-            f.write(f"Generated: {datetime.now()}\n\n")
-            
-            for severity in ['error', 'warning', 'info']:
-                severity_suggestions = [s for s in all_suggestions if s.severity == severity]
-                if severity_suggestions:
-                    f.write(f"\n{severity.upper()}S ({len(severity_suggestions)})\n")
-                    f.write("=" * 50 + "\n")
-                    
-                    for s in severity_suggestions:
-                        f.write(f"\n{s.agent_name} - Line {s.line_start}-{s.line_end}\n")
-                        f.write(f"Issue: {s.reason}\n")
-                        f.write(f"Current: {s.original[:80]}...\n" if len(s.original) > 80 else f"Current: {s.original}\n")
-                        f.write(f"Suggestion: {s.suggested}\n")
-                        f.write(f"Confidence: {s.confidence:.0%}\n")
-        
-        print(f"\n✅ Analysis complete! Results saved to /tmp/vimswarm_results.txt")
-        
+        for severity in ['error', 'warning', 'info']:
+            severity_suggestions = [s for s in all_suggestions if s.severity == severity]
+            if severity_suggestions:
+                f.write(f"\n{severity.upper()}S ({len(severity_suggestions)})\n")
+                f.write("=" * 50 + "\n")
+                
+                for s in severity_suggestions:
+                    f.write(f"\n{s.agent_name} - Line {s.line_start}-{s.line_end}\n")
+                    f.write(f"Issue: {s.reason}\n")
+                    f.write(f"Current: {s.original[:80]}...\n" if len(s.original) > 80 else f"Current: {s.original}\n")
+                    f.write(f"Suggestion: {s.suggested}\n")
+                    f.write(f"Confidence: {s.confidence:.0%}\n")
+    
+    with open(LAST_RUN_FILE, 'w') as f:
+        json.dump({'file': filename, 'checksum': summary['checksum'],
+                   'complete': report is None or report.complete}, f)
+    
+    print(f"\n✅ Analysis complete! Results saved to {RESULTS_FILE}")
+    
+    if profiler is not None:
+        await show_profile(swarm, port, profiler.report(file=filename, lines=len(content)))
+
+
+async def show_profile(swarm: VimSwarm, port: int, profile: Dict):
+    """Save a profile report, summarize it and open it in a scratch buffer"""
+    swarm_profile.save(profile, PROFILE_FILE)
+    print(f"\n⏱ Profile ({profile['elapsed_ms']:.0f}ms):")
+    for agent, data in sorted(profile['agents'].items(), key=lambda item: -item[1]['time_ms']):
+        extra = ''.join([f", {data['calls']} calls" if data['calls'] is not None else '',
+                         f", peak {data['peak_kb']} KiB" if data['peak_kb'] is not None else ''])
+        print(f"  {agent}: {data['time_ms']:.1f}ms, {data['suggestions']} suggestions{extra}")
+    for agent, name, rule in swarm_profile.slowest(profile):
+        print(f"  … slowest: {agent}.{name} {rule['time_ms']:.1f}ms over {rule['steps']} steps")
+    
+    client = swarm.connections.get(port) or next(iter(swarm.connections.values()), None)
+    if client is not None:
+        try:
+            await client.request('nvim_exec_lua', swarm_profile.PROFILE_BUFFER_LUA,
+                                 [swarm_profile.render(profile)])
+        except (ConnectionError, OSError, nvim_rpc.RpcError) as e:
+            print(f"✗ Could not open the profile buffer: {e}")
+    print(f"✅ Profile saved to {PROFILE_FILE}")
+
+
+async def run_workspace(swarm: VimSwarm, paths: List[str] = (), workers: int = None):
+    """Analyze every open buffer (and any given files) across the worker pool"""
+    connected_count = await swarm.initialize()
+    TIMER.mark('connect')
+    print(f"✓ Connected to {connected_count} Neovim instances")
+    
+    workspace = await swarm.collect_workspace(paths)
+    if not workspace:
+        print("No buffers or files to analyze.")
+        return
+    total = sum(len(lines) for lines in workspace.values())
+    print(f"\n🐝 VimSwarm analyzing {len(workspace)} files ({total} lines)...")
+    
+    by_file, stats = await swarm.analyze_workspace(workspace, workers)
+    severity_order = {'error': 0, 'warning': 1, 'info': 2}
+    for path, suggestions in sorted(by_file.items()):
+        suggestions.sort(key=lambda s: (severity_order.get(s.severity, 3), s.line_start))
+        errors = len([s for s in suggestions if s.severity == 'error'])
+        print(f"  {path}: {len(suggestions)} suggestions ({errors} errors)")
+    
+    print("\n⚙️  Worker pool:")
+    for worker in stats:
+        state = '' if worker['alive'] else ' (died)'
+        print(f"  {worker['worker']}: {worker['tasks']} tasks, {worker['stolen']} stolen, "
+              f"{worker['lines_per_sec']} lines/s{state}")
+    
+    with open(RESULTS_FILE, 'w') as f:
+        f.write(f"VimSwarm Workspace Analysis\n")
+        f.write(f"Generated: {datetime.now()}\n")
+        for path, suggestions in sorted(by_file.items()):
+            if not suggestions:
+                continue
+            f.write(f"\n{path} ({len(suggestions)})\n")
+            f.write("=" * 50 + "\n")
+            for s in suggestions:
+                f.write(f"{s.severity.upper():8} {s.agent_name} - Line {s.line_start}-{s.line_end}: {s.reason}\n")
+    
+    print(f"\n✅ Analysis complete! Results saved to {RESULTS_FILE}")
+
+
+async def serve(swarm: VimSwarm, debounce: float, budget: float = None):
+    """Stay connected and keep vim.diagnostic current in every instance until interrupted"""
+    connected_count = await swarm.initialize()
+    TIMER.mark('connect')
+    if not swarm.connections:
+        print("No Neovim instances available. Start some with nvim-orchestra first.")
+        return
+    server = swarm_diagnostics.DiagnosticsServer(
+        [agent_type() for agent_type in AGENT_TYPES.values()],
+        {f'nvim-{port}': client for port, client in swarm.connections.items()},
+        debounce, budget or swarm_diagnostics.BUFFER_BUDGET)
+    await server.start()
+    print(f"🐝 VimSwarm diagnostics running on {len(swarm.connections)} instances (Ctrl-C to stop)")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            stats = server.stats()
+            print(f"  {stats['buffers']} buffers, {stats['analyses']} analyses, "
+                  f"{stats['lines_rechecked']} lines rechecked, edit to diagnostics "
+                  f"{stats['latency_ms']}ms")
     finally:
-        loop.close()
+        await server.close()
+
+
+def budget_arg(text):
+    import argparse
+    try:
+        return swarm_budget.parse_duration(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='vim_swarm.py',
+                                     description='Multi-agent code analysis in Neovim')
+    parser.add_argument('action', nargs='?', default='analyze', choices=['analyze', 'workspace', 'serve'],
+                        help='analyze: current buffer; workspace: every open buffer on a process pool; '
+                             'serve: publish diagnostics as you edit')
+    parser.add_argument('--port', type=int, default=7777,
+                        help='Instance whose current buffer is analyzed')
+    parser.add_argument('--files', nargs='*', default=[],
+                        help='Extra files to include in a workspace analysis')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes for workspace analysis (default: CPU count)')
+    parser.add_argument('--budget', type=budget_arg, metavar='DURATION',
+                        help='Stop analyze after e.g. 200ms, keeping the most important results '
+                             '(serve: per-edit budget for whole-buffer rules, default 20ms)')
+    parser.add_argument('--debounce', type=budget_arg, default=0.03,
+                        metavar='DURATION', help='serve: quiet time after an edit before analyzing '
+                                                 '(default: 30ms)')
+    parser.add_argument('--top', type=int, default=5,
+                        help='Critical issues to show (default: 5)')
+    parser.add_argument('--profile', action='store_true',
+                        help='analyze: run each rule under cProfile and report time and calls '
+                             f'per agent and rule ({PROFILE_FILE} and a scratch buffer)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='analyze: add peak allocations per rule (tracemalloc) to the profile')
+    parser.add_argument('--data', help='JSON payload from the MCP server (unused by analyze)')
+    parser.add_argument('--timing', action='store_true',
+                        help='Report import and startup time on stderr')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Main entry point for VimSwarm"""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    TIMER.mark('startup')
+    swarm = VimSwarm()
+    profiler = None
+    if args.profile or args.trace_memory:
+        profiler = swarm_profile.SwarmProfiler(cpu=args.profile, memory=args.trace_memory)
+    
+    async def run_and_close():
+        try:
+            if args.action == 'workspace':
+                await run_workspace(swarm, args.files, args.workers)
+            elif args.action == 'serve':
+                await serve(swarm, args.debounce, args.budget)
+            else:
+                await run(swarm, args.port, args.budget, args.top, profiler)
+        finally:
+            await swarm.close()
+    
+    try:
+        asyncio.run(run_and_close())
+    except KeyboardInterrupt:
+        pass   # serve runs until Ctrl-C; run_and_close has already cleaned up
+    TIMER.mark('analysis')
+    if args.timing:
+        TIMER.report()
 
 
 if __name__ == "__main__":
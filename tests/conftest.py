@@ -0,0 +1,7 @@
+"""Tests run against the scripts in place, as the scripts import each other"""
+
+import os
+import sys
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+sys.path.insert(0, SCRIPTS)
@@ -0,0 +1,64 @@
+"""Agent names and @group resolution"""
+
+import json
+
+import pytest
+
+from agent_roster import AgentRoster, RosterError, agent_name
+
+
+def local(port):
+    return ('tcp', '127.0.0.1', port)
+
+
+@pytest.fixture
+def roster(tmp_path):
+    path = tmp_path / 'roster.json'
+    path.write_text(json.dumps({'roles': {'claude1': ['reviewers'], 'claude12': ['reviewers'],
+                                          'claude40': ['reviewers']}}))
+    roster = AgentRoster(str(path))
+    for port in (7777, 7778, 7779, 7788):
+        roster.add(agent_name(local(port)), None, local(port))
+    roster.add(agent_name(('socket', '/tmp/nvim.sock')), None, ('socket', '/tmp/nvim.sock'),
+               roles=['writers'])
+    roster.sort()
+    return roster
+
+
+def test_local_ports_are_named_after_claude1(roster):
+    assert agent_name(local(7777)) == 'claude1'
+    assert agent_name(local(7790)) == 'claude14'
+    assert agent_name(('tcp', 'build-box', 7777)) == 'build-box:7777'
+    assert list(roster.agents) == ['/tmp/nvim.sock', 'claude1', 'claude2', 'claude3', 'claude12']
+
+
+def test_groups_resolve_to_connected_members_in_name_order(roster):
+    # claude40 has the role saved but is not connected
+    assert roster.resolve('@reviewers') == ['claude1', 'claude12']
+    assert roster.resolve('claude3, @reviewers,@writers') == ['/tmp/nvim.sock', 'claude1',
+                                                              'claude3', 'claude12']
+    assert roster.resolve('@all', exclude=['claude2']) == ['/tmp/nvim.sock', 'claude1',
+                                                           'claude3', 'claude12']
+
+
+def test_unknown_names_are_errors_not_empty_answers(roster):
+    with pytest.raises(RosterError, match='@testers'):
+        roster.resolve('@testers')
+    with pytest.raises(RosterError, match='claude9'):
+        roster.resolve('claude1,claude9')
+    assert roster.is_target('claude1,@writers')
+    assert not roster.is_target('write')
+
+
+def test_assignments_persist_and_follow_disconnects(roster, tmp_path):
+    roster.assign('testers', ['claude2', 'claude3'])
+    roster.unassign('reviewers', ['claude12'])
+    roster.remove('claude3')
+    assert roster.resolve('@testers') == ['claude2']
+    assert roster.resolve('@reviewers') == ['claude1']
+
+    again = AgentRoster(roster.path)
+    again.add('claude3', None, local(7779))
+    assert again.resolve('@testers') == ['claude3']
+    assert again.roles('claude3') == ['testers']
+    assert 'claude12' not in json.loads((tmp_path / 'roster.json').read_text())['roles']
@@ -0,0 +1,133 @@
+"""Block diff planning and the fingerprint cache"""
+
+import asyncio
+import random
+
+import fake_nvim
+import nvim_rpc
+from block_sync import Fingerprint, FingerprintCache, block_hashes, plan_edits
+from orchestra_lua import install_call
+
+SIZE = 4
+
+
+def fingerprint(lines, size=SIZE):
+    return Fingerprint(1, 0, len(lines), block_hashes(lines, size))
+
+
+def plan(source, target, size=SIZE):
+    return plan_edits(fingerprint(source, size), fingerprint(target, size), size)
+
+
+def apply(source, target, edits):
+    """What the target holds after copying the planned ranges, in order"""
+    result = list(target)
+    for t0, t1, s0, s1 in edits:
+        result[t0:t1] = source[s0:s1]
+    return result
+
+
+LINES = [f"line {i}" for i in range(16)]     # four full blocks
+
+
+def test_identical_buffers_need_no_edits():
+    assert plan(LINES, list(LINES)) == []
+    assert plan([], []) == []
+
+
+def test_single_block_edit_is_replaced_in_place():
+    source = list(LINES)
+    source[5] = 'changed'
+    assert plan(source, LINES) == [(4, 8, 4, 8)]
+
+
+def test_adjacent_changed_blocks_merge():
+    source = list(LINES)
+    source[1] = source[6] = 'changed'
+    assert plan(source, LINES) == [(0, 8, 0, 8)]
+
+
+def test_change_in_last_block_is_a_tail_edit():
+    source = list(LINES)
+    source[-1] = 'changed'
+    assert plan(source, LINES) == [(12, 16, 12, 16)]
+
+
+def test_insert_across_block_boundary_rewrites_from_that_block():
+    source = LINES[:4] + ['new a', 'new b'] + LINES[4:]
+    edits = plan(source, LINES)
+    assert edits == [(4, 16, 4, 18)]
+    assert apply(source, LINES, edits) == source
+
+
+def test_delete_across_block_boundary_rewrites_from_that_block():
+    source = LINES[:3] + LINES[6:]
+    edits = plan(source, LINES)
+    assert edits == [(0, 16, 0, 13)]
+    assert apply(source, LINES, edits) == source
+
+
+def test_changed_block_before_growth_stays_separate():
+    source = list(LINES)
+    source[0] = 'changed'
+    source += ['appended']
+    edits = plan(source, LINES)
+    assert edits == [(0, 4, 0, 4), (12, 16, 12, 17)]
+    assert apply(source, LINES, edits) == source
+
+
+def test_random_edits_always_reproduce_the_source():
+    rnd = random.Random(7)
+    for _ in range(300):
+        target = [f"t{rnd.randrange(6)}" for _ in range(rnd.randrange(30))]
+        source = list(target)
+        for _ in range(rnd.randrange(1, 4)):
+            at = rnd.randrange(len(source) + 1)
+            cut = rnd.randrange(3)
+            source[at:at + cut] = [f"s{rnd.randrange(6)}" for _ in range(rnd.randrange(3))]
+        assert apply(source, target, plan(source, target)) == source
+
+
+def test_stale_cache_entry_is_refreshed_when_the_buffer_changes():
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            nvim = fleet.instances[0]
+            nvim.edit(0, 0, -1, list(LINES))
+            client = await nvim_rpc.RpcClient.connect(fleet.endpoints[0], 'nvim')
+            try:
+                await client.request(*install_call())
+                cache = FingerprintCache(SIZE)
+                first = cache.update('nvim', await client.request(*cache.request('nvim')))
+                assert first.hashes == block_hashes(LINES, SIZE)
+
+                # Unchanged: the helper answers from the cache (no hashes sent)
+                reply = await client.request(*cache.request('nvim'))
+                assert reply[3] is None
+                assert cache.update('nvim', reply) is first
+
+                # Edited after caching: the changedtick moved, so hashes come back
+                nvim.edit(0, 5, 6, ['edited'])
+                reply = await client.request(*cache.request('nvim'))
+                assert reply[3] is not None
+                fresh = cache.update('nvim', reply)
+                assert fresh.tick > first.tick
+                assert plan_edits(fresh, first, SIZE) == [(4, 8, 4, 8)]
+
+                cache.forget('nvim')
+                assert cache.args('nvim')[2] == {}
+            finally:
+                await client.close()
+    asyncio.run(scenario())
+
+
+def test_args_send_only_the_requested_buffers_tick():
+    cache = FingerprintCache(SIZE)
+    for bufnr in (1, 2, 3):
+        cache.update('a', [bufnr, 10 + bufnr, 4, block_hashes(LINES[:4], SIZE)])
+    cache.update('b', [2, 99, 4, block_hashes(LINES[:4], SIZE)])
+
+    assert cache.args('a', 2) == (2, SIZE, {'2': 12})
+    assert cache.args('a', nvim_rpc.Handle('Buffer', 3)) == (3, SIZE, {'3': 13})
+    assert cache.args('a', 7) == (7, SIZE, {})
+    # The current buffer could be any of them
+    assert cache.args('a') == (0, SIZE, {'1': 11, '2': 12, '3': 13})
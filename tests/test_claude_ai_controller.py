@@ -0,0 +1,37 @@
+"""The controller CLI as the MCP server invokes it"""
+
+import json
+import os
+import subprocess
+import sys
+
+from conftest import SCRIPTS
+
+CONTROLLER = os.path.join(SCRIPTS, 'claude_ai_controller.py')
+
+
+def run(command, **kwargs):
+    return subprocess.run(command, capture_output=True, text=True, timeout=30, **kwargs)
+
+
+def test_context_through_a_shell_string_still_runs():
+    # What older handlers did: python3 "script" help --context {"task":"x"}, unquoted
+    context = json.dumps({'task': 'x'}, separators=(',', ':'))  # as JSON.stringify
+    result = run(['bash', '-c', f'{sys.executable} "{CONTROLLER}" help --context {context}'])
+    assert result.returncode == 0, result.stderr
+    assert 'Available commands' in result.stdout
+    assert 'Ignoring --context' in result.stderr
+
+
+def test_context_as_an_argv_array_is_parsed():
+    # What the handler does now: execFile('python3', [script, ...command, '--context', json])
+    result = run([sys.executable, CONTROLLER, 'help', '--context', json.dumps({'task': 'x'})])
+    assert result.returncode == 0, result.stderr
+    assert result.stderr == ''
+
+
+def test_parse_args_keeps_a_json_object():
+    sys.path.insert(0, SCRIPTS)
+    from claude_ai_controller import parse_args
+    assert parse_args(['status', '--context', '{"task": "ship it"}']).context == {'task': 'ship it'}
+    assert parse_args(['status', '--context', '[1, 2]']).context == {}
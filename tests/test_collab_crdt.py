@@ -0,0 +1,133 @@
+"""Collaborative editing across fake instances"""
+
+import asyncio
+
+import fake_nvim
+import nvim_rpc
+from collab_crdt import CollabSession, LineRGA, Replica
+
+LINES = ['one', 'two', 'three', 'four']
+
+
+def current(nvim):
+    return nvim.buffers[nvim.current]
+
+
+async def settle(session, timeout=2.0):
+    """Wait until no flush is queued, running or holding operations"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    quiet = 0
+    while quiet < 3:
+        assert loop.time() < deadline, session.status()
+        await asyncio.sleep(0.01)
+        busy = session.tasks or any(r.outbox or r.flushing for r in session.replicas.values())
+        quiet = 0 if busy else quiet + 1
+
+
+def assert_converged(session, fleet):
+    text = session.doc.text()
+    for nvim in fleet.instances:
+        assert current(nvim).lines == text
+
+
+async def collaborate(fleet):
+    fleet.instances[0].edit(fleet.instances[0].current, 0, -1, list(LINES))
+    clients = {name: await nvim_rpc.RpcClient.connect(endpoint, name)
+               for name, endpoint in zip(fleet.names, fleet.endpoints)}
+    session = CollabSession()
+    await session.start(fleet.names[0], fleet.names[1:], clients)
+    await settle(session)
+    return session, clients
+
+
+async def close(session, clients):
+    await session.stop()
+    for client in clients.values():
+        await client.close()
+
+
+def test_edits_reach_every_replica_without_echoes():
+    async def scenario():
+        async with fake_nvim.FakeFleet(3) as fleet:
+            session, clients = await collaborate(fleet)
+            try:
+                assert_converged(session, fleet)
+                first, second, third = fleet.instances
+                resets = session.ops_out
+                second.edit(second.current, 1, 2, ['TWO'])
+                await settle(session)
+                third.edit(third.current, 4, 4, ['five'])
+                await settle(session)
+
+                assert session.doc.text() == ['one', 'TWO', 'three', 'four', 'five']
+                assert_converged(session, fleet)
+                # Only the two typed edits became operations: a del+ins and an ins.
+                # The line events of applying them elsewhere were recognised as echoes
+                assert session.ops_in == 3
+                assert session.ops_out - resets == 6
+            finally:
+                await close(session, clients)
+    asyncio.run(scenario())
+
+
+def test_apply_refused_on_tick_mismatch_is_retried():
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            session, clients = await collaborate(fleet)
+            try:
+                first, second = fleet.instances
+                # second's own edit reaches the session only after the apply is sent,
+                # so the apply carries a stale changedtick
+                second.latency = 0.05
+                first.edit(first.current, 0, 1, ['ONE'])
+                second.edit(second.current, 3, 4, ['FOUR'])
+                await settle(session)
+
+                assert session.replicas[fleet.names[1]].refused >= 1
+                assert session.doc.text() == ['ONE', 'two', 'three', 'FOUR']
+                assert_converged(session, fleet)
+            finally:
+                await close(session, clients)
+    asyncio.run(scenario())
+
+
+def test_concurrent_edits_of_one_line_keep_both_versions():
+    async def scenario():
+        async with fake_nvim.FakeFleet(3) as fleet:
+            session, clients = await collaborate(fleet)
+            try:
+                first, second, third = fleet.instances
+                first.edit(first.current, 1, 2, ['two by first'])
+                second.edit(second.current, 1, 2, ['two by second'])
+                await settle(session)
+
+                text = session.doc.text()
+                assert 'two' not in text
+                assert {'two by first', 'two by second'} <= set(text)
+                assert len(text) == 5
+                assert_converged(session, fleet)
+            finally:
+                await close(session, clients)
+    asyncio.run(scenario())
+
+
+def test_plan_edits_apply_top_to_bottom():
+    session = CollabSession()
+    doc = session.doc = LineRGA()
+    ids = doc.insert_run(None, 'a', ['a', 'b', 'c', 'd', 'e'])
+    replica = Replica('r', None)
+    replica.view = list(ids)
+
+    doc.delete(ids[1])
+    added = doc.insert_run(ids[2], 'b', ['x', 'y'])
+    doc.delete(ids[4])
+    replica.outbox = [('del', ids[1]), *[('ins', id) for id in added], ('del', ids[4])]
+
+    edits, view = session.plan(replica)
+    assert edits == [(1, 2, []), (2, 2, ['x', 'y']), (5, 6, [])]
+    lines = ['a', 'b', 'c', 'd', 'e']
+    for start, end, replacement in edits:
+        lines[start:end] = replacement
+    assert lines == doc.text() == ['a', 'c', 'x', 'y', 'd']
+    assert view == [ids[0], ids[2], *added, ids[3]]
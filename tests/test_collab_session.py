@@ -0,0 +1,72 @@
+"""Collaboration templates: the cache and the session buffers they fill"""
+
+import asyncio
+
+import collab_session
+import fake_nvim
+import nvim_rpc
+from agent_roster import AgentRoster
+from claude_ai_controller import ClaudeAIController
+from collab_session import TemplateCache
+
+AGENTS = [('claude1', ['reviewers']), ('claude2', [])]
+
+
+def test_same_task_and_roster_hit_the_cache(tmp_path):
+    path = str(tmp_path / 'collab_templates.json')
+    lines, cached = TemplateCache(path).get('refactor', AGENTS)
+    assert not cached
+    assert '# claude1 @reviewers: [Your role here]' in lines
+
+    # A fresh cache (another process) reads the same entry back
+    again, cached = TemplateCache(path).get('refactor', AGENTS)
+    assert cached and again == lines
+
+
+def test_changed_roster_rerenders_but_keeps_the_start_time(tmp_path):
+    cache = TemplateCache(str(tmp_path / 'collab_templates.json'))
+    lines, _ = cache.get('refactor', AGENTS)
+    grown, cached = cache.get('refactor', AGENTS + [('claude3', ['writers'])])
+    assert not cached
+    assert '# claude3 @writers: [Your role here]' in grown
+    started = [line for line in lines if line.startswith('# Started:')]
+    assert started == [line for line in grown if line.startswith('# Started:')]
+
+
+def test_least_recently_used_task_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(collab_session, 'MAX_TEMPLATES', 2)
+    cache = TemplateCache(str(tmp_path / 'collab_templates.json'))
+    cache.get('a', AGENTS)
+    cache.get('b', AGENTS)
+    assert cache.get('a', AGENTS)[1]      # a is now the most recent
+    cache.get('c', AGENTS)
+    assert list(cache.entries) == ['a', 'c']
+    assert not cache.get('b', AGENTS)[1]
+
+
+def test_session_buffers_are_filled_once(tmp_path, capsys):
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            roster = AgentRoster(str(tmp_path / 'roster.json'))
+            for i, endpoint in enumerate(fleet.endpoints):
+                client = await nvim_rpc.RpcClient.connect(endpoint, fleet.names[i])
+                roster.add(f"claude{i + 1}", client, endpoint)
+            controller = ClaudeAIController(roster=roster)
+            controller.templates = TemplateCache(str(tmp_path / 'collab_templates.json'))
+            try:
+                await controller.create_collaboration_session('refactor')
+                first = capsys.readouterr().out
+                await controller.create_collaboration_session('refactor')
+                second = capsys.readouterr().out
+            finally:
+                for info in roster.agents.values():
+                    await info['nvim'].close()
+
+            assert '2 updated, template rendered' in first
+            assert '0 updated, template cached' in second
+            lines, _ = controller.templates.get('refactor', [('claude1', []), ('claude2', [])])
+            for nvim in fleet.instances:
+                buf = nvim.buffers[nvim.current]
+                assert buf.name == collab_session.buffer_name('refactor')
+                assert buf.lines == lines
+    asyncio.run(scenario())
@@ -0,0 +1,98 @@
+"""The shared registry: concurrent writers and pruning of dead instances"""
+
+import asyncio
+import multiprocessing
+import socket
+
+import fake_nvim
+import nvim_rpc
+from instance_registry import InstanceRegistry, discover, endpoint_key
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def connect(name, endpoint):
+    return await nvim_rpc.RpcClient.connect(endpoint, name)
+
+
+def register(path, worker, rounds):
+    registry = InstanceRegistry(path)
+    for i in range(rounds):
+        registry.update({f"host:{worker}-{i}": {'endpoint': ['tcp', 'host', i]}})
+
+
+def test_concurrent_writers_lose_no_entries(tmp_path):
+    path = str(tmp_path / 'instances.json')
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=register, args=(path, w, 25)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(30)
+        assert p.exitcode == 0
+    instances = InstanceRegistry(path).load()['instances']
+    assert len(instances) == 100
+
+
+def test_heartbeat_does_not_resurrect_a_removed_entry(tmp_path):
+    registry = InstanceRegistry(str(tmp_path / 'instances.json'))
+    registry.update({'host:1': {'endpoint': ['tcp', 'host', 1]}})
+    registry.update(gone=['host:1'])
+    registry.heartbeat(['host:1'])
+    assert registry.load()['instances'] == {}
+
+
+def test_discover_prunes_instances_that_stopped_answering(tmp_path):
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            registry = InstanceRegistry(str(tmp_path / 'instances.json'))
+            dead = ('tcp', '127.0.0.1', free_port())
+            registry.update({endpoint_key(dead): {'name': 'gone', 'endpoint': list(dead), 'pid': 1}},
+                            scanned=True)
+            candidates = list(zip(fleet.names, fleet.endpoints))
+
+            # The registry is fresh, but none of its entries answer: it falls back to a
+            # full scan, registers what it finds and drops the dead entry
+            found = await discover(registry, candidates, connect)
+            try:
+                assert sorted(name for name, _, _ in found) == sorted(fleet.names)
+                instances = registry.load()['instances']
+                assert set(instances) == {endpoint_key(ep) for ep in fleet.endpoints}
+                assert all(entry['version'] == '0.10.0' for entry in instances.values())
+            finally:
+                for _, _, client in found:
+                    await client.close()
+    asyncio.run(scenario())
+
+
+def test_fixed_candidates_do_not_count_as_a_scan(tmp_path):
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            registry = InstanceRegistry(str(tmp_path / 'instances.json'))
+            found = await discover(registry, list(zip(fleet.names, fleet.endpoints)),
+                                   connect, fixed=True)
+            for _, _, client in found:
+                await client.close()
+            data = registry.load()
+            assert len(found) == 1 and len(data['instances']) == 1
+            assert data['scanned_at'] == 0
+    asyncio.run(scenario())
+
+
+def test_fresh_registry_is_trusted_without_a_scan(tmp_path):
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            registry = InstanceRegistry(str(tmp_path / 'instances.json'))
+            known = fleet.endpoints[0]
+            registry.update({endpoint_key(known): {'name': fleet.names[0], 'endpoint': list(known)}},
+                            scanned=True)
+            found = await discover(registry, list(zip(fleet.names, fleet.endpoints)), connect)
+            for _, _, client in found:
+                await client.close()
+            assert [name for name, _, _ in found] == [fleet.names[0]]
+            assert registry.load()['instances'][endpoint_key(known)]['pid'] > 0
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+"""Instance discovery from port sweeps and socket events"""
+
+import asyncio
+import os
+
+import fake_nvim
+from instance_registry import InstanceRegistry, endpoint_key
+from instance_watcher import InstanceWatcher
+
+
+class Events:
+    def __init__(self):
+        self.added, self.removed = [], []
+
+    def on_add(self, name, endpoint):
+        self.added.append(name)
+
+    def on_remove(self, name):
+        self.removed.append(name)
+
+
+def watcher(registry, ports, events, **options):
+    return InstanceWatcher(registry, ports, on_add=events.on_add, on_remove=events.on_remove,
+                           **options)
+
+
+def test_sweep_registers_new_ports_and_prunes_closed_ones(tmp_path):
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            registry = InstanceRegistry(str(tmp_path / 'instances.json'))
+            events = Events()
+            ports = [ep[2] for ep in fleet.endpoints]
+            await watcher(registry, ports, events).sweep(sockets=False)
+            assert sorted(events.added) == sorted(fleet.names)
+            assert set(registry.load()['instances']) == {endpoint_key(ep) for ep in fleet.endpoints}
+
+            # Already registered: not reported again
+            await watcher(registry, ports, events).sweep(sockets=False)
+            assert len(events.added) == 2
+
+            await fleet.instances[1].close()
+            await watcher(registry, ports, events).sweep(sockets=False)
+            assert events.removed == [fleet.names[1]]
+            assert set(registry.load()['instances']) == {endpoint_key(fleet.endpoints[0])}
+    asyncio.run(scenario())
+
+
+def test_live_consumer_hears_of_instances_someone_else_registered(tmp_path):
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            registry = InstanceRegistry(str(tmp_path / 'instances.json'))
+            registry.update({endpoint_key(ep): {'name': name, 'endpoint': list(ep)}
+                             for name, ep in zip(fleet.names, fleet.endpoints)})
+            ports = [ep[2] for ep in fleet.endpoints]
+            holding = {endpoint_key(fleet.endpoints[0])}
+
+            events = Events()
+            await watcher(registry, ports, events).sweep(sockets=False)
+            assert events.added == []
+
+            events = Events()
+            await watcher(registry, ports, events, connected=lambda: holding).sweep(sockets=False)
+            assert events.added == [fleet.names[1]]
+    asyncio.run(scenario())
+
+
+def test_socket_events_add_and_remove_instances(tmp_path):
+    async def scenario():
+        registry = InstanceRegistry(str(tmp_path / 'instances.json'))
+        events = Events()
+        path = str(tmp_path / 'nvim.sock')
+        task = asyncio.ensure_future(
+            watcher(registry, [], events, socket_paths=[path], interval=3600).run())
+        nvim = fake_nvim.FakeNvim()
+        try:
+            await asyncio.sleep(0.1)    # first sweep done, inotify armed
+            await nvim.listen(path=path)
+            for _ in range(100):
+                if path in events.added:
+                    break
+                await asyncio.sleep(0.02)
+            # The first sweep may also report real editors' sockets in /tmp
+            assert events.added.count(path) == 1
+            assert path in registry.load()['instances']
+
+            await nvim.close()
+            if os.path.exists(path):
+                os.unlink(path)
+            for _ in range(100):
+                if events.removed:
+                    break
+                await asyncio.sleep(0.02)
+            assert events.removed == [path]
+            assert path not in registry.load()['instances']
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await nvim.close()
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+"""Loop nesting from LoopIndex"""
+
+from loop_index import LoopIndex
+
+
+def test_nested_loops():
+    index = LoopIndex([
+        "for a in rows:",           # 0
+        "    for b in a:",          # 1
+        "        use(b)",           # 2
+        "    after(a)",             # 3
+        "done()",                   # 4
+    ])
+    assert index.depth == [0, 1, 2, 1, 0]
+    assert index.loop == [-1, 0, 1, 0, -1]
+    assert index.end == {0: 3, 1: 2}
+    assert index.inner == {0}
+    assert index.innermost() == [1]
+    assert index.loop_depth(0) == 1 and index.loop_depth(1) == 2
+    assert list(index.body(1)) == [2]
+
+
+def test_def_inside_loop_starts_a_fresh_scope():
+    index = LoopIndex([
+        "for a in rows:",           # 0
+        "    def handle(x):",       # 1
+        "        send(x)",          # 2
+        "        while x:",         # 3
+        "            x = x.next",   # 4
+        "    handle(a)",            # 5
+    ])
+    assert index.in_loop(1)
+    # The function body runs when called, not once per outer iteration
+    assert (index.depth[2], index.loop[2]) == (0, -1)
+    assert (index.depth[4], index.loop[4]) == (1, 3)
+    assert (index.depth[5], index.loop[5]) == (1, 0)
+    # The while does not make the outer for a nested loop
+    assert index.inner == set()
+    assert sorted(index.end) == [0, 3]
+    assert index.end[0] == 5
+
+
+def test_bracket_continuations_neither_close_nor_open_loops():
+    index = LoopIndex([
+        "for a in items:",          # 0
+        "    total = sum(",         # 1
+        "x * 2",                    # 2  dedented, but still inside sum(
+        "for x in a)",              # 3  a generator, not a loop header
+        "    emit(total)",          # 4
+        "emit(done)",               # 5
+    ])
+    assert index.loop[1:5] == [0, 0, 0, 0]
+    assert not index.is_header(3)
+    assert index.end == {0: 4}
+    assert not index.in_loop(5)
+
+
+def test_triple_quoted_strings_are_not_code():
+    index = LoopIndex([
+        'HELP = """',               # 0
+        'for each file:',           # 1
+        '"""',                      # 2
+        'while busy():',            # 3
+        '    wait()',               # 4
+    ])
+    assert not index.is_header(1)
+    assert index.end == {3: 4}
+    assert index.loop == [-1, -1, -1, -1, 3]
+
+
+def test_brace_language_blocks():
+    index = LoopIndex([
+        "items.forEach((item) => {",    # 0
+        "  for (const x of item) {",    # 1
+        "    log(x);",                  # 2
+        "  }",                          # 3
+        "});",                          # 4
+        "done();",                      # 5
+    ])
+    assert index.loop[2] == 1 and index.depth[2] == 2
+    assert index.inner == {0}
+    assert not index.in_loop(5)
@@ -0,0 +1,83 @@
+"""Workspace sync against in-process fake instances"""
+
+import asyncio
+
+import fake_nvim
+from nvim_orchestrator import NeovimOrchestrator
+
+FILES = {'/work/a.py': ['import os', 'print(os.name)'], '/work/b.py': ['x = 1']}
+
+
+def buffers(nvim):
+    return {buf.name: buf.lines for buf in nvim.buffers.values() if buf.listed and buf.name}
+
+
+async def fleet_orchestrator(fleet):
+    orch = NeovimOrchestrator()
+    for name, endpoint in zip(fleet.names, fleet.endpoints):
+        await orch.connect(name, endpoint)
+    return orch
+
+
+def test_same_source_to_two_targets_one_after_the_other():
+    async def scenario():
+        async with fake_nvim.FakeFleet(3) as fleet:
+            source, first, second = fleet.instances
+            created = {path: source.create_buffer(path, list(lines)) for path, lines in FILES.items()}
+            orch = await fleet_orchestrator(fleet)
+            try:
+                await orch.sync_workspace(fleet.names[0], [fleet.names[1]])
+                await orch.sync_workspace(fleet.names[0], [fleet.names[2]])
+                assert buffers(first) == FILES
+                assert buffers(second) == FILES
+
+                # Only the buffer that changed goes out again, to both
+                source.edit(created['/work/a.py'].id, 1, 2, ['print(os.sep)'])
+                await orch.sync_workspace(fleet.names[0], fleet.names[1:])
+                expected = dict(FILES, **{'/work/a.py': ['import os', 'print(os.sep)']})
+                assert buffers(first) == expected
+                assert buffers(second) == expected
+            finally:
+                await orch.close()
+    asyncio.run(scenario())
+
+
+def test_unchanged_workspace_is_not_resent():
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            source, target = fleet.instances
+            for path, lines in FILES.items():
+                source.create_buffer(path, list(lines))
+            orch = await fleet_orchestrator(fleet)
+            try:
+                await orch.sync_workspace(fleet.names[0], [fleet.names[1]])
+                ticks = {buf.name: buf.tick for buf in target.buffers.values()}
+                await orch.sync_workspace(fleet.names[0], [fleet.names[1]])
+                assert {buf.name: buf.tick for buf in target.buffers.values()} == ticks
+            finally:
+                await orch.close()
+    asyncio.run(scenario())
+
+
+def test_failed_macro_rolls_back_every_buffer_it_changed(capsys):
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            nvim = fleet.instances[0]
+            first = nvim.create_buffer('/work/a.py', ['x = 1'])
+            second = nvim.create_buffer('/work/b.py', ['x = 2'])
+            nvim.enter(first.id)
+            orch = await fleet_orchestrator(fleet)
+            orch.macros['rename'] = ['%s/x/y/g', 'buffer /work/b.py', '%s/x/y/g', '${then}']
+            try:
+                await orch.play_macro('rename', fleet.names[0], {'then': 'echoerr "E1: stop"'})
+                assert first.lines == ['x = 1'] and second.lines == ['x = 2']
+                assert nvim.current == first.id
+
+                await orch.play_macro('rename', fleet.names[0], {'then': 'w'})
+                assert first.lines == ['y = 1'] and second.lines == ['y = 2']
+            finally:
+                await orch.close()
+    asyncio.run(scenario())
+    out = capsys.readouterr().out
+    assert 'command 4 (echoerr "E1: stop") failed, rolled back' in out
+    assert "macro 'rename' applied (4 commands)" in out
@@ -0,0 +1,140 @@
+"""The relay's handshake, frame limits and forwarding against fake instances"""
+
+import asyncio
+import zlib
+
+import pytest
+
+import fake_nvim
+import nvim_relay
+import nvim_rpc
+from nvim_orchestrator import NeovimOrchestrator
+from nvim_relay import AUTH, COMPRESSED, HEADER, RelayClient, RelayServer
+
+TOKEN = 'relay-secret'
+
+
+async def relay_for(fleet):
+    """Relay over an orchestrator connected to the fleet; returns (orch, server, endpoint)"""
+    orch = NeovimOrchestrator()
+    for name, endpoint in zip(fleet.names, fleet.endpoints):
+        await orch.connect(name, endpoint)
+    relay = RelayServer(orch, 'testhost', TOKEN)
+    server = await asyncio.start_server(relay.handle, '127.0.0.1', 0)
+    return orch, server, ('tcp', '127.0.0.1', server.sockets[0].getsockname()[1])
+
+
+async def shutdown(orch, server):
+    server.close()
+    await server.wait_closed()
+    await orch.close()
+
+
+async def raw_peer(endpoint):
+    """A connection that has read the challenge and not answered it"""
+    reader, writer = await asyncio.open_connection(endpoint[1], endpoint[2])
+    stream = nvim_relay.FrameStream(reader, writer)
+    (kind, nonce), = await stream.read()
+    assert kind == AUTH
+    return stream, nonce
+
+
+async def refused(stream):
+    """True once the relay has closed the connection without serving it"""
+    try:
+        while True:
+            for message in await asyncio.wait_for(stream.read(), 2):
+                if message == [AUTH, True]:
+                    return False
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return True
+
+
+def test_token_holder_is_served_and_others_are_refused(capsys):
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            orch, server, endpoint = await relay_for(fleet)
+            try:
+                with pytest.raises(ConnectionError, match='did not accept'):
+                    await RelayClient.connect(endpoint, token='wrong')
+
+                relay = await RelayClient.connect(endpoint, token=TOKEN)
+                try:
+                    assert relay.host == 'testhost'
+                    remote = relay.proxy(fleet.names[0])
+                    assert await remote.request('nvim_buf_get_lines', 0, 0, -1, False) == ['']
+                    with pytest.raises(nvim_rpc.RpcError, match='not forwarded'):
+                        await remote.request('nvim_input', 'ZZ')
+                finally:
+                    await relay.close()
+            finally:
+                await shutdown(orch, server)
+    asyncio.run(scenario())
+    assert 'bad or missing token' in capsys.readouterr().out
+
+
+def test_frames_before_the_handshake_are_small_and_uncompressed():
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            orch, server, endpoint = await relay_for(fleet)
+            try:
+                # A compressed answer is refused before it is inflated
+                stream, nonce = await raw_peer(endpoint)
+                payload = zlib.compress(nvim_rpc.make_packer().pack(
+                    [[AUTH, nvim_relay.proof(TOKEN, nonce)]]))
+                stream.writer.write(HEADER.pack(len(payload), COMPRESSED) + payload)
+                assert await refused(stream)
+
+                # A huge length is refused from the header alone
+                stream, _ = await raw_peer(endpoint)
+                stream.writer.write(HEADER.pack(1 << 30, 0))
+                assert await refused(stream)
+            finally:
+                await shutdown(orch, server)
+    asyncio.run(scenario())
+
+
+def test_frame_inflating_past_the_limit_drops_the_connection(monkeypatch, capsys):
+    monkeypatch.setattr(nvim_relay, 'MAX_FRAME', 1 << 16)
+
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            orch, server, endpoint = await relay_for(fleet)
+            try:
+                relay = await RelayClient.connect(endpoint, token=TOKEN)
+                bomb = zlib.compress(b'\0' * (1 << 20))
+                relay.stream.writer.write(HEADER.pack(len(bomb), COMPRESSED) + bomb)
+                with pytest.raises(ConnectionError):
+                    await asyncio.wait_for(relay.hello(), 2)
+                await relay.close()
+            finally:
+                await shutdown(orch, server)
+    asyncio.run(scenario())
+    assert 'inflates beyond' in capsys.readouterr().out
+
+
+def test_subscriptions_end_with_the_stream():
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            orch, server, endpoint = await relay_for(fleet)
+            nvim, name = fleet.instances[0], fleet.names[0]
+            local = orch.instances[name]
+            try:
+                relay = await RelayClient.connect(endpoint, token=TOKEN)
+                remote = relay.proxy(name)
+                seen = asyncio.Queue()
+                remote.on_notification('nvim_buf_lines_event', seen.put_nowait)
+                await remote.request('nvim_buf_attach', nvim.current, False, {})
+                nvim.edit(nvim.current, 0, 1, ['typed'])
+                assert (await asyncio.wait_for(seen.get(), 2))[4] == ['typed']
+                assert len(local._handlers['nvim_buf_lines_event']) == 1
+
+                await relay.close()
+                for _ in range(100):
+                    if not local._handlers['nvim_buf_lines_event']:
+                        break
+                    await asyncio.sleep(0.01)
+                assert local._handlers['nvim_buf_lines_event'] == []
+            finally:
+                await shutdown(orch, server)
+    asyncio.run(scenario())
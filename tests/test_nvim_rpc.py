@@ -0,0 +1,30 @@
+"""The pipelined RPC client against a fake instance"""
+
+import asyncio
+
+import fake_nvim
+import nvim_rpc
+
+
+def test_failing_notification_handler_does_not_stop_the_reader(capsys):
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            nvim = fleet.instances[0]
+            client = await nvim_rpc.RpcClient.connect(fleet.endpoints[0], fleet.names[0])
+            seen = []
+
+            def broken(args):
+                raise ValueError('boom')
+
+            client.on_notification('nvim_buf_lines_event', broken)
+            client.on_notification('nvim_buf_lines_event', lambda args: seen.append(args[4]))
+            try:
+                assert await client.request('nvim_buf_attach', nvim.current, False, {})
+                nvim.edit(nvim.current, 0, 1, ['first'])
+                nvim.edit(nvim.current, 0, 1, ['second'])
+                assert await client.request('nvim_buf_get_lines', nvim.current, 0, -1, False) == ['second']
+                assert seen == [['first'], ['second']]
+            finally:
+                await client.close()
+    asyncio.run(scenario())
+    assert capsys.readouterr().out.count('nvim_buf_lines_event handler failed: ValueError: boom') == 2
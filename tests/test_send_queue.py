@@ -0,0 +1,100 @@
+"""Per-instance send queues against fake instances"""
+
+import asyncio
+import time
+
+import pytest
+
+import fake_nvim
+import nvim_rpc
+import send_queue
+from nvim_orchestrator import NeovimOrchestrator
+from send_queue import Overloaded, SendQueue, TokenBucket
+
+
+async def connected(fleet):
+    return await nvim_rpc.RpcClient.connect(fleet.endpoints[0], fleet.names[0])
+
+
+def test_token_bucket_paces_after_the_burst():
+    async def scenario():
+        bucket = TokenBucket(rate=50, burst=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.take()
+        assert time.monotonic() - started < 0.02
+        for _ in range(10):
+            await bucket.take()
+        # Ten more tokens at 50/s take about 0.2s
+        assert 0.18 <= time.monotonic() - started < 0.5
+    asyncio.run(scenario())
+
+
+def test_rate_limited_queue_spaces_requests():
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            client = await connected(fleet)
+            queue = SendQueue(fleet.names[0], client, rate=100, burst=1)
+            try:
+                started = time.monotonic()
+                futures = [await queue.put('nvim_get_current_buf') for _ in range(11)]
+                await asyncio.gather(*futures)
+                assert time.monotonic() - started >= 0.09
+                assert queue.stats()['sent'] == 11
+            finally:
+                await queue.close()
+                await client.close()
+    asyncio.run(scenario())
+
+
+def test_only_answered_requests_count_as_sent():
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            client = await connected(fleet)
+            queue = SendQueue(fleet.names[0], client)
+            try:
+                ok = await queue.put('nvim_get_current_buf')
+                bad = await queue.put('nvim_no_such_method')
+                assert await ok
+                with pytest.raises(nvim_rpc.RpcError):
+                    await bad
+                stats = queue.stats()
+                assert (stats['sent'], stats['failed']) == (1, 1)
+            finally:
+                await queue.close()
+                await client.close()
+    asyncio.run(scenario())
+
+
+def test_full_queue_drops_under_the_drop_policy():
+    async def scenario():
+        async with fake_nvim.FakeFleet(1, service=0.05) as fleet:
+            client = await connected(fleet)
+            queue = SendQueue(fleet.names[0], client, maxsize=2, policy='drop')
+            try:
+                futures = [await queue.put('nvim_command', f'echo {i}') for i in range(4)]
+                results = await asyncio.gather(*futures, return_exceptions=True)
+                assert any(isinstance(r, Overloaded) for r in results)
+                assert queue.stats()['dropped'] >= 1
+            finally:
+                await queue.close()
+                await client.close()
+    asyncio.run(scenario())
+
+
+def test_close_stops_waiting_for_slow_instances(monkeypatch, capsys):
+    monkeypatch.setattr(send_queue, 'FLUSH_TIMEOUT', 0.1)
+
+    async def scenario():
+        async with fake_nvim.FakeFleet(1, latency=5.0) as fleet:
+            orch = NeovimOrchestrator()
+            await orch.connect(fleet.names[0], fleet.endpoints[0])
+            queue = orch.queues.get(fleet.names[0], orch.instances[fleet.names[0]])
+            future = await queue.put('nvim_command', 'echo 1')
+            started = time.monotonic()
+            await orch.close()
+            assert time.monotonic() - started < 1
+            # In flight when the queue closed, so cancelled rather than left waiting
+            assert future.cancelled()
+    asyncio.run(scenario())
+    assert 'Dropping 1 commands' in capsys.readouterr().out
@@ -0,0 +1,94 @@
+"""Snapshots captured from and restored into fake instances"""
+
+import asyncio
+
+import pytest
+
+import fake_nvim
+import nvim_rpc
+import snapshot
+from orchestra_lua import LuaHelpers
+
+SIZE = 2
+LICENSE = ['# Copyright', '# MIT']
+FILES = {'/work/a.py': LICENSE + ['import os', 'print(os.name)', 'x = 1'],
+         '/work/b.py': LICENSE + ['y = 2']}
+
+
+def buffers(nvim):
+    return {buf.name: buf.lines for buf in nvim.buffers.values() if buf.listed and buf.name}
+
+
+async def connect(fleet):
+    return [await nvim_rpc.RpcClient.connect(endpoint, name)
+            for name, endpoint in zip(fleet.names, fleet.endpoints)]
+
+
+def test_save_load_restore_round_trip(tmp_path):
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            source, target = fleet.instances
+            for path, lines in FILES.items():
+                source.create_buffer(path, list(lines))
+            clients = await connect(fleet)
+            helpers = LuaHelpers()
+            try:
+                snap = await snapshot.capture(helpers, fleet.names[0], clients[0], size=SIZE)
+                path = str(tmp_path / 'work.nvsnap')
+                snap.save(path)
+                loaded = snapshot.Snapshot.load(path)
+                assert loaded.files == snap.files and loaded.blocks == snap.blocks
+                # The license block is stored once for both files
+                assert len(loaded.blocks) == len(loaded.hashes()) == 4
+
+                stats = await snapshot.restore(helpers, fleet.names[1], clients[1], loaded)
+                assert buffers(target) == FILES
+                assert stats['changed'] == 2 and stats['blocks_sent'] == 4
+
+                again = await snapshot.restore(helpers, fleet.names[1], clients[1], loaded)
+                assert again['changed'] == 0 and again['blocks_sent'] == 0
+            finally:
+                for client in clients:
+                    await client.close()
+    asyncio.run(scenario())
+
+
+def test_block_lost_after_inventory_is_fetched_and_resent():
+    async def scenario():
+        async with fake_nvim.FakeFleet(2) as fleet:
+            source, target = fleet.instances
+            for path, lines in FILES.items():
+                source.create_buffer(path, list(lines))
+            held = target.create_buffer('/work/license.txt', list(LICENSE))
+            clients = await connect(fleet)
+            helpers = LuaHelpers()
+            try:
+                have = await snapshot.inventory(helpers, fleet.names[1], clients[1], SIZE)
+                snap = await snapshot.capture(helpers, fleet.names[0], clients[0], have=have, size=SIZE)
+                shared = snapshot.Snapshot.from_lines({'': LICENSE}, SIZE).hashes()
+                assert shared <= have and not shared & set(snap.blocks)
+
+                # The target drops the only copy of the license between inventory and import
+                target.edit(held.id, 0, -1, ['rewritten'])
+                with pytest.raises(snapshot.SnapshotError, match='does not carry'):
+                    await snapshot.restore(helpers, fleet.names[1], clients[1], snap, have)
+
+                fetched = []
+
+                async def fetch(hashes):
+                    fetched.extend(hashes)
+                    again = await snapshot.capture(helpers, fleet.names[0], clients[0],
+                                                   list(snap.files), size=SIZE)
+                    return {h: again.blocks[h] for h in hashes}
+
+                target.edit(held.id, 0, -1, list(LICENSE))
+                have = await snapshot.inventory(helpers, fleet.names[1], clients[1], SIZE)
+                target.edit(held.id, 0, -1, ['rewritten'])
+                await snapshot.restore(helpers, fleet.names[1], clients[1], snap, have, fetch)
+                assert set(fetched) == shared
+                assert {p: lines for p, lines in buffers(target).items() if p in FILES} == FILES
+                assert shared <= set(snap.blocks)
+            finally:
+                for client in clients:
+                    await client.close()
+    asyncio.run(scenario())
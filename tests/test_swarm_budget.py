@@ -0,0 +1,86 @@
+"""Top-k selection and deadline-bounded rule runs"""
+
+import itertools
+
+import pytest
+
+from swarm_budget import CHECK_EVERY, TopK, parse_duration, run_rules
+from vim_swarm import Rule, Suggestion
+
+
+def suggestion(severity, confidence, reason=''):
+    return Suggestion('test', 'performance', 1, 1, '', '', reason, severity, confidence)
+
+
+def test_topk_orders_by_severity_then_confidence():
+    top = TopK(10)
+    for s in [suggestion('info', 0.9), suggestion('error', 0.5), suggestion('warning', 0.99),
+              suggestion('error', 0.8)]:
+        top.push(s)
+    assert [(s.severity, s.confidence) for s in top.best()] == [
+        ('error', 0.8), ('error', 0.5), ('warning', 0.99), ('info', 0.9)]
+
+
+def test_topk_ties_keep_the_earlier_suggestion():
+    top = TopK(2)
+    for name in 'abc':
+        top.push(suggestion('warning', 0.7, name))
+    assert [s.reason for s in top.best()] == ['a', 'b']
+    assert top.seen == 3
+
+
+def test_topk_evicts_the_least_important():
+    top = TopK(2)
+    top.push(suggestion('info', 0.9, 'info'))
+    top.push(suggestion('warning', 0.1, 'weak warning'))
+    top.push(suggestion('error', 0.2, 'error'))
+    top.push(suggestion('info', 1.0, 'late info'))
+    assert [s.reason for s in top.best()] == ['error', 'weak warning']
+
+
+def test_parse_duration():
+    assert parse_duration('200ms') == 0.2
+    assert parse_duration('1.5s') == 1.5
+    assert parse_duration('50') == 0.05
+    with pytest.raises(ValueError):
+        parse_duration('soon')
+
+
+def rule(name, severity, scan):
+    return Rule('test', name, severity, scan)
+
+
+def test_complete_run_reports_every_rule():
+    def finds(severity, count):
+        return lambda content, context: (suggestion(severity, 0.5) for _ in range(count))
+
+    report = run_rules([rule('notes', 'info', finds('info', 2)),
+                        rule('bugs', 'error', finds('error', 1))], ['x = 1'], budget=10.0, k=2)
+    assert report.complete
+    assert report.rules_done == ['test.bugs', 'test.notes']   # errors run first
+    assert report.found == {'error': 1, 'warning': 0, 'info': 2}
+    assert [s.severity for s in report.top] == ['error', 'info']
+    assert report.marker().startswith('complete (2 rules')
+
+
+def test_deadline_stops_the_run_with_a_partial_report():
+    def quick(content, context):
+        yield suggestion('error', 0.9, 'found early')
+
+    def endless(content, context):
+        for _ in itertools.count():
+            yield None
+
+    def never(content, context):
+        raise AssertionError("runs after the deadline")
+        yield
+
+    report = run_rules([rule('never', 'info', never), rule('endless', 'warning', endless),
+                        rule('quick', 'error', quick)], ['x = 1'], budget=0.01)
+    assert not report.complete
+    assert report.rules_done == ['test.quick']
+    assert report.stopped['rule'] == 'test.endless'
+    assert report.stopped['steps'] % CHECK_EVERY == 0
+    assert [s.reason for s in report.top] == ['found early']
+    assert report.marker().startswith('partial (1/3 rules')
+    assert 'test.endless stopped after' in report.marker()
@@ -0,0 +1,43 @@
+"""Resident diagnostics against a fake instance"""
+
+import asyncio
+
+import fake_nvim
+import nvim_rpc
+from swarm_diagnostics import DiagnosticsServer
+from vim_swarm import SecurityAgent
+
+
+async def published(nvim, buf, predicate, timeout=2.0):
+    """Wait until SecurityAgent's diagnostics for buf satisfy predicate"""
+    for _ in range(int(timeout / 0.01)):
+        items = nvim.diagnostics.get('SecurityAgent', {}).get(buf)
+        if items is not None and predicate(items):
+            return items
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"diagnostics never matched: {nvim.diagnostics}")
+
+
+def test_edits_are_diagnosed_even_when_the_tick_moves_on_its_own():
+    async def scenario():
+        async with fake_nvim.FakeFleet(1) as fleet:
+            nvim = fleet.instances[0]
+            buf = nvim.create_buffer('/work/app.py', ['x = 1'])
+            nvim.enter(buf.id)
+            client = await nvim_rpc.RpcClient.connect(fleet.endpoints[0], fleet.names[0])
+            server = DiagnosticsServer([SecurityAgent()], {fleet.names[0]: client}, debounce=0.01)
+            try:
+                await server.start()
+                await published(nvim, buf.id, lambda items: items == [])
+
+                # The tick moves again right after the edit, so a publish computed
+                # for the edit's tick is refused; the changedtick event retries it
+                nvim.edit(buf.id, 0, 1, ['password = "hunter2"'])
+                nvim.touch(buf.id)
+                items = await published(nvim, buf.id, lambda items: len(items) == 1)
+                assert 'password' in items[0][3].lower()
+                assert server.mirrors[(fleet.names[0], buf.id)].tick == buf.tick
+            finally:
+                await server.close()
+                await client.close()
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+"""Debouncing and coalescing of sync requests, within and across processes"""
+
+import asyncio
+import multiprocessing
+import time
+
+from sync_coordinator import SyncCoordinator
+
+TARGETS = {'nvim-2': 'host:2'}
+
+
+def test_lone_request_transfers_without_waiting(tmp_path):
+    coordinator = SyncCoordinator(str(tmp_path / 'sync_state.json'), window=0.2)
+    performed = []
+
+    async def perform(names):
+        performed.append(list(names))
+
+    started = time.monotonic()
+    outcome = asyncio.run(coordinator.sync('host:1', TARGETS, perform))
+    assert time.monotonic() - started < 0.1
+    assert outcome == {'nvim-2': 'performed'}
+    assert performed == [['nvim-2']]
+
+
+def test_burst_is_coalesced_into_a_trailing_transfer(tmp_path):
+    coordinator = SyncCoordinator(str(tmp_path / 'sync_state.json'), window=0.05)
+    performed = []
+
+    async def perform(names):
+        performed.append(list(names))
+        await asyncio.sleep(0.01)
+
+    async def scenario():
+        return await asyncio.gather(*[coordinator.sync('host:1', TARGETS, perform)
+                                      for _ in range(6)])
+
+    outcomes = [o['nvim-2'] for o in asyncio.run(scenario())]
+    # The first transfers at once; the rest land in a burst and share one more
+    assert len(performed) == 2
+    assert outcomes.count('performed') == 2 and outcomes.count('coalesced') == 4
+    stats = coordinator.stats()
+    assert (stats['requested'], stats['performed'], stats['ratio']) == (6, 2, 3.0)
+
+
+def lead_forever(path):
+    async def perform(names):
+        await asyncio.sleep(3600)
+    asyncio.run(SyncCoordinator(path, window=0.05).sync('host:1', TARGETS, perform))
+
+
+def test_follower_takes_over_from_a_dead_leader(tmp_path):
+    path = str(tmp_path / 'sync_state.json')
+    coordinator = SyncCoordinator(path, window=0.05)
+    leader = multiprocessing.get_context('fork').Process(target=lead_forever, args=(path,))
+    leader.start()
+    try:
+        for _ in range(200):
+            if coordinator._read().get('host:1>host:2', {}).get('leader') == leader.pid:
+                break
+            time.sleep(0.01)
+        else:
+            raise AssertionError('leader never took the lead')
+
+        performed = []
+
+        async def perform(names):
+            performed.append(list(names))
+
+        async def scenario():
+            follower = asyncio.ensure_future(coordinator.sync('host:1', TARGETS, perform))
+            await asyncio.sleep(0.05)
+            assert not follower.done() and performed == []
+            leader.kill()
+            leader.join()
+            return await asyncio.wait_for(follower, 2)
+
+        assert asyncio.run(scenario()) == {'nvim-2': 'performed'}
+        assert performed == [['nvim-2']]
+    finally:
+        leader.kill()
+        leader.join()